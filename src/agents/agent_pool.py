@@ -0,0 +1,319 @@
+"""
+agents/agent_pool.py
+
+This module holds a supervisor which runs a dynamic pool of agents, so that the number of agents
+can change while the system is running and no queued message is lost on shutdown.
+
+1. Bulk Startup:
+   - add() builds any number of agents at once. Agents are built quietly and the pool logs once
+     per call, and their behaviors all run on one shared BehaviorScheduler task instead of one
+     task per agent. Every agent resolves the execution mode of its handlers once, when they are
+     registered, and not on every call.
+
+2. Hot Add and Remove:
+   - Agents added to a running pool start consuming right away, remove() stops agents while the
+     others keep running. Removed agents stop receiving from the bus, are drained, detached from
+     the bus and closed, which releases their agent ids. Messages emitted while draining are
+     still published.
+
+3. Graceful Drain:
+   - On remove() and shutdown() behaviors are stopped first, then every agent keeps consuming
+     until its inbox is empty and its handlers are done, or until 'drain_timeout' sec have
+     passed. Only then are the consume loops cancelled, messages still queued are counted as
+     lost. While draining an agent takes one message at a time from its inbox, so a deadline
+     cuts short the handling of at most one message which is not counted.
+
+4. Supervision:
+   - A consume loop, behavior loop or scheduler task which ends while its agent is still part
+     of the pool, e.g. because it raised, is restarted after 'restart_delay' sec.
+"""
+
+import asyncio
+import logging
+
+from configs.config import POOL_DRAIN_POLL, POOL_DRAIN_TIMEOUT, POOL_RESTART_DELAY
+
+from .autonomous_agent import AutonomousAgent
+from .behavior_scheduler import BehaviorScheduler
+from .concrete_agent import ConcreteAgent
+
+CONSUME = "consume"
+BEHAVIORS = "behaviors"
+
+
+def quiet_concrete_agent(**kwargs):
+    """
+    Default agent factory of the pool, a ConcreteAgent which does not log its own start.
+    """
+    return ConcreteAgent(announce=False, **kwargs)
+
+
+class _Member:
+    """
+    An agent of the pool along with its running loops.
+    """
+
+    __slots__ = ("agent", "tasks", "stopping")
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.tasks = {}
+        self.stopping = False
+
+
+class AgentPool:
+    """
+    Starts, supervises and stops a dynamic set of agents.
+
+    Attributes:
+        factory (callable): Builds an agent from keyword arguments.
+        scheduler (BehaviorScheduler): Runs the behaviors of all agents, None for one
+            run_behaviors() task per agent.
+        bus (MessageBus): Bus the agents are wired to, they are disconnected from it on removal.
+        drain_timeout (float): Max time in sec spent draining inboxes on remove() and shutdown().
+        restart_delay (float): Time in sec before a loop which ended unexpectedly is restarted.
+        restarts (int): Number of loops restarted.
+        lost (int): Number of messages left in the inboxes of removed agents.
+
+    Methods:
+        add(count, **kwargs): Builds and adds agents.
+        start(): Starts the loops of all agents.
+        remove(agents, drain_timeout): Drains and removes agents.
+        shutdown(drain_timeout): Drains and removes all agents.
+        run(): Runs the pool until cancelled, then shuts it down.
+        stats(): Returns the pool counters.
+    """
+
+    def __init__(
+        self,
+        factory=quiet_concrete_agent,
+        scheduler=None,
+        shared_scheduler=True,
+        bus=None,
+        drain_timeout=POOL_DRAIN_TIMEOUT,
+        restart_delay=POOL_RESTART_DELAY,
+    ):
+        """
+        Args:
+            factory (callable): Builds an agent from keyword arguments.
+            scheduler (BehaviorScheduler): Scheduler of the behaviors, created if None.
+            shared_scheduler (bool): False to run one run_behaviors() task per agent instead.
+            bus (MessageBus): Bus the agents are wired to.
+            drain_timeout (float): Max time in sec spent draining inboxes.
+            restart_delay (float): Time in sec before a loop which ended is restarted.
+        """
+        self.factory = factory
+        if shared_scheduler:
+            self.scheduler = scheduler if scheduler is not None else BehaviorScheduler()
+        else:
+            self.scheduler = None
+        self.bus = bus
+        self.drain_timeout = drain_timeout
+        self.restart_delay = restart_delay
+        self.restarts = 0
+        self.lost = 0
+        self._members = {}
+        self._scheduler_task = None
+        self._running = False
+
+    def __len__(self):
+        return len(self._members)
+
+    def __iter__(self):
+        return iter(list(self._members))
+
+    def __contains__(self, agent):
+        return agent in self._members
+
+    def add(self, count=1, **kwargs):
+        """
+        Builds agents with the factory and adds them, they start right away if the pool runs.
+
+        Args:
+            count (int): Number of agents.
+            **kwargs: Passed on to the factory, e.g. 'mailbox_size'.
+
+        Returns:
+            list: The new agents, to be wired by the caller.
+        """
+        agents = [self.factory(**kwargs) for _ in range(count)]
+        for agent in agents:
+            self.adopt(agent)
+        logging.info("Added %d agents to the pool, %d agents in total.", count, len(self))
+        return agents
+
+    def adopt(self, agent):
+        """
+        Adds an agent built elsewhere, it starts right away if the pool runs.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+
+        Returns:
+            AutonomousAgent: The agent.
+        """
+        member = self._members[agent] = _Member(agent)
+        if self._running:
+            self._start_member(member)
+        return agent
+
+    def start(self):
+        """
+        Starts the loops of all agents, must be called from a running event loop.
+
+        Returns:
+            None
+        """
+        if self._running:
+            return
+        self._running = True
+        if self.scheduler is not None:
+            self._start_scheduler()
+        for member in self._members.values():
+            self._start_member(member)
+
+    def _start_scheduler(self):
+        self._scheduler_task = asyncio.create_task(self.scheduler.run())
+        self._scheduler_task.add_done_callback(self._scheduler_done)
+
+    def _scheduler_done(self, task):
+        if self._running and not task.cancelling() and task is self._scheduler_task:
+            self.restarts += 1
+            logging.error("Behavior scheduler of the pool stopped, restarting it.")
+            asyncio.get_running_loop().call_later(self.restart_delay, self._restart_scheduler)
+
+    def _restart_scheduler(self):
+        if self._running:
+            self._start_scheduler()
+
+    def _start_member(self, member):
+        self._start_loop(member, CONSUME)
+        if self.scheduler is not None:
+            member.agent.schedule_behaviors(self.scheduler)
+        else:
+            self._start_loop(member, BEHAVIORS)
+
+    def _start_loop(self, member, kind):
+        agent = member.agent
+        coroutine = agent.consume_messages() if kind == CONSUME else agent.run_behaviors()
+        task = member.tasks[kind] = asyncio.create_task(coroutine)
+        task.add_done_callback(lambda task: self._loop_done(member, kind, task))
+
+    def _loop_done(self, member, kind, task):
+        # Note: the agent loops catch their own cancellation and return, a cancelled loop is
+        # told apart from a loop which ended on its own by its pending cancellation requests.
+        if member.stopping or task.cancelling() or member.tasks.get(kind) is not task:
+            return
+        error = None if task.cancelled() else task.exception()
+        logging.error(
+            "The %s loop of agent %s stopped (%r), restarting it.",
+            kind,
+            getattr(member.agent, "agent_id", None),
+            error,
+        )
+        self.restarts += 1
+        asyncio.get_running_loop().call_later(self.restart_delay, self._restart_loop, member, kind)
+
+    def _restart_loop(self, member, kind):
+        if not member.stopping and self._members.get(member.agent) is member:
+            self._start_loop(member, kind)
+
+    async def remove(self, agents, drain_timeout=None):
+        """
+        Stops the behaviors of agents, drains their inboxes within 'drain_timeout' sec, then
+        stops them and releases their agent ids.
+
+        Args:
+            agents (AutonomousAgent or iterable): The agent(s) to remove.
+            drain_timeout (float): Max time in sec spent draining, 'drain_timeout' if None.
+
+        Returns:
+            int: Number of messages left in their inboxes.
+        """
+        if isinstance(agents, AutonomousAgent):
+            agents = [agents]
+        members = [self._members[agent] for agent in agents if agent in self._members]
+        timeout = self.drain_timeout if drain_timeout is None else drain_timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        for member in members:
+            member.stopping = True
+            agent = member.agent
+            if self.bus is not None:
+                # Note: the outbox stays on the bus, messages emitted while draining are delivered.
+                self.bus.disconnect(agent, detach=False)
+            agent.unschedule_behaviors()
+            behaviors = member.tasks.pop(BEHAVIORS, None)
+            if behaviors is not None:
+                behaviors.cancel()
+
+        await asyncio.gather(*(self._drain(member, deadline) for member in members))
+
+        lost = 0
+        for member in members:
+            agent = member.agent
+            for task in member.tasks.values():
+                task.cancel()
+            await asyncio.gather(*member.tasks.values(), return_exceptions=True)
+            member.tasks.clear()
+            lost += agent.inbox.qsize()
+            if self.bus is not None:
+                self.bus.detach(agent)
+            del self._members[agent]
+            close = getattr(agent, "close", None)
+            if close is not None:
+                close()
+        self.lost += lost
+        if members:
+            logging.info("Removed %d agents from the pool, %d messages lost.", len(members), lost)
+        return lost
+
+    async def _drain(self, member, deadline):
+        agent = member.agent
+        loop = asyncio.get_running_loop()
+        consume = member.tasks.get(CONSUME)
+        if consume is None or consume.done():
+            return  # Skip: nothing consumes the inbox
+        agent.consume_batch_size = 1
+        while not agent.idle() and loop.time() < deadline:
+            await asyncio.sleep(min(POOL_DRAIN_POLL, max(deadline - loop.time(), 0)))
+
+    async def shutdown(self, drain_timeout=None):
+        """
+        Drains and removes all agents, then stops the scheduler.
+
+        Args:
+            drain_timeout (float): Max time in sec spent draining, 'drain_timeout' if None.
+
+        Returns:
+            int: Number of messages left in the inboxes.
+        """
+        lost = await self.remove(list(self._members), drain_timeout)
+        self._running = False
+        if self._scheduler_task is not None:
+            self._scheduler_task.cancel()
+            await asyncio.gather(self._scheduler_task, return_exceptions=True)
+            self._scheduler_task = None
+        return lost
+
+    async def run(self):
+        """
+        Starts the pool and runs it until cancelled, then shuts it down gracefully.
+
+        Returns:
+            None
+        """
+        self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.shutdown()
+
+    def stats(self):
+        return {
+            "agents": len(self._members),
+            "restarts": self.restarts,
+            "lost": self.lost,
+            "queued": sum(member.agent.inbox.qsize() for member in self._members.values()),
+        }
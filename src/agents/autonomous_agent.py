@@ -8,23 +8,108 @@ agents with specific behaviors. It provides the following features:
    - The agent has an inbox and an outbox for message exchange with other agents.
    - By connecting outboxes and inboxes, you can create communication channels
      between agents.
+   - Inbox and outbox are bounded mailboxes, a backpressure policy decides what happens to
+     messages put into a full mailbox and emitters can query the current queue pressure.
 
 2. Message Handling:
    - The agent consumes messages from its inbox and handles them based on their types.
+   - Messages are drained in batches, the agent only backs off when its inbox is empty.
+   - A MessageBatch put into the inbox is handled as one batch, without a per-message object
+     queued in between.
+   - With 'priority_lanes' the inbox is a PriorityMailbox, handlers registered with a priority
+     get their message type served ahead of (or behind) the rest of the backlog.
+   - With a DurableMailbox as inbox the consumed offset is committed after every handled batch,
+     messages are then delivered at least once across restarts.
+   - Optionally up to 'handler_concurrency' handlers run at once, messages sharing the same
+     ordering key (e.g. 'agent_id') are still handled in arrival order. A message waiting for
+     its predecessor does not hold a handler slot, so a hot key cannot block the other keys,
+     at most 'max_pending_handlers' messages are dispatched but not yet handled.
+   - Messages first go through a middleware Pipeline of validators, transforms and filters,
+     compiled once into a flat function and run on whole batches. Rejected messages are counted
+     and reported by their stage instead of raising, by default messages must be Message
+     instances with two words of content. Stages can be added and removed at runtime.
    - You can register custom message handlers to react to specific message types.
+   - Content handlers are routed by keyword or regex sets, all of them are compiled into a
+     single matcher which scans a whole batch of messages at once.
+   - Handlers and behaviors can be declared 'blocking' or 'cpu_bound' at registration, they
+     are then run on a managed thread or process pool instead of the event loop.
 
 3. Behavior Execution:
    - The agent runs behaviors periodically (e.g., every 2 seconds).
    - Behaviors can be proactive (triggered by internal state or local time) and allow
      the agent to create new messages.
+   - Behaviors can alternatively be scheduled on a shared BehaviorScheduler, which drives the
+     behaviors of many agents from a single task.
+
+4. Deduplication:
+   - An optional DedupCache in front of handler dispatch skips messages already handled
+     recently, keyed on a content digest or on a message id returned by a key function.
+
+5. Traffic Recording:
+   - An optional TrafficRecorder streams every emitted and handled message to a trace file,
+     which a TrafficReplayer can feed back into agents for load tests.
+
+6. Instrumentation:
+   - Optional counters, queue-depth gauges and latency histograms of handlers and behaviors,
+     disabled by default at the cost of a single attribute check per message.
+   - Optional CallProfiler which records slow handler and behavior calls with stack samples.
 """
 
 import asyncio
+import functools
 import logging
+import time
 
-from configs.config import BEHAVIOUR_INTERVAL, CONSUME_INTERVAL
-from lib.exception import IncorrectMessageContentException, IncorrectMessageFormatException
+from configs.config import (
+    BACKPRESSURE_POLICY,
+    BEHAVIOUR_INTERVAL,
+    CONSUME_BATCH_SIZE,
+    CONSUME_INTERVAL,
+    DEDUP_MAX_ENTRIES,
+    DEDUP_TTL,
+    HANDLER_CONCURRENCY,
+    HANDLER_MAX_PENDING,
+    HANDLER_ORDERING_KEY,
+    MAILBOX_SIZE,
+    PRIORITY_LANES,
+)
+from lib.content_matcher import ContentMatcher
+from lib.dedup_cache import DedupCache, content_key
+from lib.metrics import AgentMetrics
+from lib.middleware import Pipeline, validator
 from models.message import Message
+from models.message_batch import MessageBatch
+
+from .durable_mailbox import DurableMailbox
+from .mailbox import Mailbox
+from .offload_executor import DEFAULT_EXECUTOR, OffloadExecutor
+from .priority_mailbox import PriorityMailbox
+from .traffic_recorder import EMITTED, HANDLED
+
+WRONG_CONTENT_WARNING = (
+    "Received wrong message content:'%s' from '%s',"
+    "\nit should have only 2 words separated with a single space.\n"
+    "Skipping further processing."
+)
+WRONG_FORMAT_WARNING = "Received message is not in correct format, skipping further processing."
+
+
+def _warn_wrong_format(message):
+    logging.warning(WRONG_FORMAT_WARNING)
+
+
+def _has_two_words(message):
+    return message.content.count(" ") == 1
+
+
+def _warn_wrong_content(message):
+    # Note: arguments are formatted lazily, only if the record passes the rate limit.
+    logging.warning(WRONG_CONTENT_WARNING, message.content, message.agent_id)
+
+
+FORMAT_STAGE = validator("format", lambda message: isinstance(message, Message), _warn_wrong_format)
+TWO_WORDS_STAGE = validator("two_words", _has_two_words, _warn_wrong_content)
+DEFAULT_STAGES = (FORMAT_STAGE, TWO_WORDS_STAGE)
 
 
 class AutonomousAgent:
@@ -32,126 +117,560 @@ class AutonomousAgent:
     Represents an autonomous agent with message handling and behavior execution.
 
     Attributes:
-        inbox (asyncio.Queue): Queue for incoming messages.
-        outbox (asyncio.Queue): Queue for outgoing messages.
+        inbox (Mailbox): Bounded queue for incoming messages.
+        outbox (Mailbox): Bounded queue for outgoing messages.
         message_handlers (dict): Dictionary mapping message types to handler functions.
+        message_priorities (dict): Inbox lane of message types registered with a priority.
         behaviors (list): List of behavior functions.
+        content_matcher (ContentMatcher): Routes message contents to content handlers.
+        execution_modes (dict): Execution mode of every registered handler and behavior.
+        executor (OffloadExecutor): Runs 'blocking' and 'cpu_bound' handlers and behaviors.
+        metrics (AgentMetrics): Counters and histograms, None while metrics are disabled.
+        profiler (CallProfiler): Times handler and behavior calls, None while not profiled.
+        dedup (DedupCache): Skips duplicate messages, None while deduplication is disabled.
+        traffic_recorder (TrafficRecorder): Records emitted and handled messages, None while
+            not recording.
+        pipeline (Pipeline): Validators, transforms and filters run before dispatch.
         behavior_interval = time in sec
         consume_interval = time in sec
+        consume_batch_size = max messages drained from the inbox per wakeup
+        handler_concurrency = max handlers running at once, 1 handles messages sequentially
+        ordering_key = message attribute name or callable, messages with equal keys are
+            handled in arrival order when handler_concurrency > 1
+        max_pending_handlers = max messages dispatched to tasks but not yet handled
 
     Methods:
         consume_messages(): Continuously consumes messages from the inbox.
-        handle_message(message): Handles an incoming message using the appropriate handler.
+        handle_batch(messages): Handles a batch of messages drained from the inbox.
+        wait_for_handlers(): Waits for handlers dispatched concurrently to complete.
+        idle(): Tells whether the agent has nothing left to handle.
+        handle_message(message, content_handlers): Handles an incoming message using the
+            appropriate handlers.
         emit_message(message): Adds a message to the outbox.
-        register_message_handler(message_type, handler): Registers a message handler.
-        register_behavior(behavior): Registers a behavior function.
+        queue_pressure(): Returns how full the inbox and outbox are.
+        queue_depths(): Returns the number of messages queued in the inbox and outbox.
+        enable_metrics(): Starts collecting metrics.
+        disable_metrics(): Stops collecting metrics.
+        metrics_snapshot(): Returns the current metrics.
+        set_pacing(behavior_interval, consume_interval): Changes the pacing at runtime.
+        enable_dedup(max_entries, ttl, key): Starts skipping duplicate messages.
+        disable_dedup(): Stops skipping duplicate messages.
+        enable_recording(recorder): Starts recording emitted and handled messages.
+        disable_recording(): Stops recording messages.
+        register_message_handler(message_type, handler, mode, priority): Registers a message
+            handler.
+        register_content_handler(handler, keywords, patterns, mode): Registers a handler for
+            messages whose content matches any of the keywords or regexes.
+        register_behavior(behavior, mode): Registers a behavior function.
         run_behaviors(): Executes registered behaviors periodically.
+        schedule_behaviors(scheduler, jitter): Schedules behaviors on a shared scheduler.
+        unschedule_behaviors(): Cancels behaviors scheduled on a shared scheduler.
     """
 
-    def __init__(self):
-        self.inbox = asyncio.Queue()
-        self.outbox = asyncio.Queue()
+    def __init__(
+        self,
+        mailbox_size=MAILBOX_SIZE,
+        backpressure=BACKPRESSURE_POLICY,
+        priority_lanes=PRIORITY_LANES,
+    ):
+        """
+        Args:
+            mailbox_size (int): Capacity of the inbox and the outbox.
+            backpressure (str): Backpressure policy of the inbox and the outbox, see Mailbox.
+            priority_lanes (int): Number of lanes of the inbox, None for a FIFO inbox.
+        """
+        self.message_priorities = {}
+        if priority_lanes:
+            self.inbox = PriorityMailbox(
+                mailbox_size,
+                backpressure,
+                lanes=priority_lanes,
+                priorities=self.message_priorities,
+            )
+        else:
+            self.inbox = Mailbox(mailbox_size, backpressure)
+        self.outbox = Mailbox(mailbox_size, backpressure)
         self.message_handlers = {}
+        self.content_matcher = ContentMatcher()
         self.behaviors = []
+        self.execution_modes = {}
+        self.executor = DEFAULT_EXECUTOR
+        self.metrics = None
+        self.profiler = None
+        self.dedup = None
+        self.traffic_recorder = None
+        self.pipeline = Pipeline(DEFAULT_STAGES)
         self.behavior_interval = BEHAVIOUR_INTERVAL
         self.consume_interval = CONSUME_INTERVAL
+        self.consume_batch_size = CONSUME_BATCH_SIZE
+        self.handler_concurrency = HANDLER_CONCURRENCY
+        self.ordering_key = HANDLER_ORDERING_KEY
+        self.max_pending_handlers = HANDLER_MAX_PENDING
+        self.scheduled_behaviors = []
+        self._handler_slots = None
+        self._handler_tails = {}
+        self._handler_tasks = set()
+        self._handling = False
 
     async def consume_messages(self):
         """
         Continuously consumes messages from the inbox.
+
+        On each wakeup up to 'consume_batch_size' queued messages are drained and passed to
+        handle_batch(). The agent only backs off for 'consume_interval' once the inbox is empty,
+        so throughput under load is bound by handler cost rather than by a fixed sleep.
         """
         while True:
             try:
-                message = await self.inbox.get()
-                await self.handle_message(message)
-                await asyncio.sleep(self.consume_interval)
+                self._handling = False
+                batch = await self.inbox.get()
+                self._handling = True
+                if not isinstance(batch, MessageBatch):
+                    batch = [batch]
+                    while len(batch) < self.consume_batch_size and not self.inbox.empty():
+                        item = self.inbox.get_nowait()
+                        if isinstance(item, MessageBatch):
+                            await self.handle_batch(batch)
+                            batch = item
+                            break
+                        batch.append(item)
+                await self.handle_batch(batch)
+                if isinstance(self.inbox, DurableMailbox):
+                    # Wait: for concurrent handlers, only handled messages may be committed.
+                    await self.wait_for_handlers()
+                    self.inbox.commit()
+
+                self._handling = False
+                if self.inbox.empty():
+                    await asyncio.sleep(self.consume_interval)
+                else:
+                    # Yield: to other tasks before draining the next batch.
+                    await asyncio.sleep(0)
             except asyncio.CancelledError:
                 logging.info("Message consumption task cancelled.")
+                for task in list(self._handler_tasks):
+                    task.cancel()
                 break
             except Exception as e:
                 logging.exception(f"Error consuming message: {e}")
 
-    async def handle_message(self, message):
+    def idle(self):
+        """
+        Tells whether the agent has nothing left to handle, i.e. its inbox is empty and no
+        drained batch or concurrent handler is still in progress.
+
+        Returns:
+            bool: True if the agent is idle.
+        """
+        return self.inbox.empty() and not self._handling and not self._handler_tasks
+
+    async def handle_batch(self, messages):
         """
-        Handles an incoming message using the appropriate handler.
+        Handles a batch of messages drained from the inbox, can be overridden by subclasses
+        which are able to process messages in bulk.
+
+        With 'handler_concurrency' > 1 each message is handed to a task instead, this waits only
+        while 'max_pending_handlers' tasks are pending.
+
+        Args:
+            messages (list or MessageBatch): The drained messages, in arrival order.
+
+        Returns:
+            None
+        """
+        if self.metrics is not None:
+            self.metrics.consumed += len(messages)
+        if self.traffic_recorder is not None:
+            self._record_handled(messages)
+        accepted = self._run_pipeline(messages)
+
+        if len(self.content_matcher):
+            if len(accepted) == len(messages) and isinstance(messages, MessageBatch):
+                contents = messages.contents()
+            else:
+                contents = [m.content if isinstance(m, Message) else "" for m in accepted]
+            matches = self.content_matcher.match_batch(contents)
+        else:
+            matches = [()] * len(accepted)
+
+        if self.handler_concurrency <= 1:
+            for message, content_handlers in zip(accepted, matches, strict=True):
+                await self._dispatch_message(message, content_handlers)
+            return
+
+        limits = (self.handler_concurrency, self.max_pending_handlers)
+        if self._handler_slots is None or self._handler_slots[0] != limits:
+            self._handler_slots = (
+                limits,
+                asyncio.Semaphore(self.handler_concurrency),
+                asyncio.Semaphore(max(self.max_pending_handlers, self.handler_concurrency)),
+            )
+        _, slots, pending = self._handler_slots
+        for message, content_handlers in zip(accepted, matches, strict=True):
+            await self._dispatch_concurrent(message, content_handlers, slots, pending)
+
+    async def _dispatch_concurrent(self, message, content_handlers, slots, pending):
+        await pending.acquire()
+        if callable(self.ordering_key):
+            key = self.ordering_key(message)
+        else:
+            key = getattr(message, self.ordering_key, None)
+
+        previous = self._handler_tails.get(key)
+        task = asyncio.create_task(self._handle_after(previous, message, content_handlers, slots))
+        self._handler_tails[key] = task
+        self._handler_tasks.add(task)
+
+        def release(task):
+            pending.release()
+            self._handler_tasks.discard(task)
+            if self._handler_tails.get(key) is task:
+                del self._handler_tails[key]
+
+        task.add_done_callback(release)
+
+    async def _handle_after(self, previous, message, content_handlers, slots):
+        if previous is not None:
+            # Wait: for the previous message with the same key, whatever its outcome.
+            await asyncio.wait({previous})
+        # Note: the handler slot is taken only once the message is next in line for its key.
+        async with slots:
+            await self._dispatch_message(message, content_handlers)
+
+    async def wait_for_handlers(self):
+        """
+        Waits for handlers dispatched concurrently to complete.
+
+        Returns:
+            None
+        """
+        while self._handler_tasks:
+            await asyncio.wait(set(self._handler_tasks))
+
+    async def handle_message(self, message, content_handlers=None):
+        """
+        Handles an incoming message using the appropriate handler, once it passed the pipeline.
 
         Args:
             message (class Message): The incoming message.
+            content_handlers (iterable): Content handlers already matched by handle_batch(),
+                None to match the content of this message on its own.
 
         Returns:
             None
         """
-        try:
-            if not isinstance(message, Message):
-                raise IncorrectMessageFormatException(
-                    "Received message is not in correct format, skipping further processing."
-                )
-            elif len(message.content.split(" ")) != 2:
-                msg = (
-                    f"Received wrong message content:'{message.content}' from '{message.agent_id}',"
-                    "\nit should have only 2 words separated with a single space.\n"
-                    "Skipping further processing."
-                )
-                raise IncorrectMessageContentException(msg)
-        except (IncorrectMessageFormatException, IncorrectMessageContentException) as e:
-            logging.warning(e)
-            return  # Skip: processing incorrect messages
+        if self.traffic_recorder is not None:
+            self.traffic_recorder.record(HANDLED, getattr(self, "agent_id", None), message)
+        accepted = self._run_pipeline((message,))
+        if accepted:
+            await self._dispatch_message(accepted[0], content_handlers)
 
-        # Note: If message is intance of Message class then automatically it becomes ready for
-        # preprocessing as it will hold proper values of all required attributes hence no recheck.
+    def _record_handled(self, messages):
+        agent_id = getattr(self, "agent_id", None)
+        if isinstance(messages, MessageBatch):
+            self.traffic_recorder.record(HANDLED, agent_id, messages)
+            return
+        for message in messages:
+            self.traffic_recorder.record(HANDLED, agent_id, message)
+
+    def _run_pipeline(self, messages):
+        """
+        Runs the middleware pipeline on messages and counts the ones it did not accept.
+
+        Args:
+            messages (iterable): The messages.
+
+        Returns:
+            list: The accepted messages, as returned by the last transform.
+        """
+        accepted, rejected = self.pipeline.run_batch(messages)
+        if len(accepted) == len(messages):
+            return accepted
+        for stage, message in rejected:
+            if stage is not None and stage.on_reject is not None:
+                stage.on_reject(message)
+        if self.metrics is not None:
+            self.metrics.rejected += len(rejected)
+            self.metrics.filtered += len(messages) - len(accepted) - len(rejected)
+        return accepted
+
+    async def _dispatch_message(self, message, content_handlers):
+        if self.dedup is not None and self.dedup.seen(message):
+            if self.metrics is not None:
+                self.metrics.duplicates += 1
+            return  # Skip: duplicate of a message seen recently
+
+        # Note: a message accepted by the pipeline holds proper values of all required
+        # attributes hence no recheck.
         handler = self.message_handlers.get(message.type)
 
         if handler:
-            try:
-                await handler(message)
-            except Exception as e:
-                logging.exception(f"Error in handling message: {message.content}\n{e}")
+            await self._invoke_handler(handler, message)
+
+        if content_handlers is None:
+            content_handlers = self.content_matcher.match(message.content)
+        for content_handler in content_handlers:
+            await self._invoke_handler(content_handler, message)
+
+    async def _invoke_handler(self, handler, message):
+        started = time.perf_counter() if self.metrics is not None else None
+        token = self.profiler.enter(handler, message, self) if self.profiler is not None else None
+        try:
+            await self._invoke(handler, message)
+        except Exception as e:
+            logging.exception(f"Error in handling message: {message.content}\n{e}")
+        finally:
+            if started is not None and self.metrics is not None:
+                self.metrics.handler_latency.record(time.perf_counter() - started)
+            if token is not None and self.profiler is not None:
+                self.profiler.exit(token)
 
     async def emit_message(self, message):
         """
-        Adds a message to the outbox.
+        Adds a message to the outbox, a full mailbox applies its backpressure policy and counts
+        the dropped messages itself. A MessageBatch is put as a single item which counts as
+        len(batch) messages against the capacity of a Mailbox, and is accepted or dropped as
+        a whole.
 
         Args:
-            message (dict): The message to emit.
+            message (class Message or MessageBatch): The message to emit.
 
         Returns:
             None
         """
         try:
-            if self.outbox.full():
+            if isinstance(self.outbox, Mailbox):
+                accepted = await self.outbox.put(message)
+            elif self.outbox.full():
                 logging.warning("Outbox is full. Message has been dropped.")
+                accepted = False
             else:
                 await self.outbox.put(message)
+                accepted = True
+
+            if accepted and self.traffic_recorder is not None:
+                self.traffic_recorder.record(EMITTED, getattr(self, "agent_id", None), message)
+            if self.metrics is not None:
+                count = len(message) if isinstance(message, MessageBatch) else 1
+                if accepted:
+                    self.metrics.emitted += count
+                else:
+                    self.metrics.dropped += count
         except Exception as e:
             logging.exception("Error emitting message: %s", e)
 
-    def register_message_handler(self, message_type, handler):
+    def queue_pressure(self):
+        """
+        Returns how full the inbox and outbox are, so emitters can slow down before messages
+        start being dropped.
+
+        Returns:
+            dict: Pressure between 0.0 and 1.0 keyed by 'inbox' and 'outbox'.
+        """
+        pressure = {}
+        for name, queue in (("inbox", self.inbox), ("outbox", self.outbox)):
+            if isinstance(queue, Mailbox):
+                pressure[name] = queue.pressure()
+            else:
+                maxsize = getattr(queue, "maxsize", 0)
+                pressure[name] = queue.qsize() / maxsize if maxsize > 0 else 0.0
+        return pressure
+
+    async def _invoke(self, func, *args):
+        mode = self.execution_modes.get(func, OffloadExecutor.ASYNC)
+        if mode == OffloadExecutor.ASYNC:
+            return await func(*args)
+        return await self.executor.run(mode, func, *args)
+
+    def queue_depths(self):
+        """
+        Returns the number of messages queued in the inbox and outbox.
+
+        Returns:
+            dict: Depths keyed by 'inbox_depth' and 'outbox_depth'.
+        """
+        return {"inbox_depth": self.inbox.qsize(), "outbox_depth": self.outbox.qsize()}
+
+    def enable_metrics(self):
+        """
+        Starts collecting metrics, counters and histograms start from zero.
+
+        Returns:
+            AgentMetrics: The metrics.
+        """
+        self.metrics = AgentMetrics()
+        return self.metrics
+
+    def disable_metrics(self):
+        """
+        Stops collecting metrics.
+
+        Returns:
+            None
+        """
+        self.metrics = None
+
+    def metrics_snapshot(self):
+        """
+        Returns the current metrics together with the queue depths.
+
+        Returns:
+            dict: The metrics, None while metrics are disabled.
+        """
+        if self.metrics is None:
+            return None
+        snapshot = self.metrics.snapshot()
+        snapshot.update(self.queue_depths())
+        snapshot["inbox_dropped"] = getattr(self.inbox, "dropped", 0)
+        snapshot["behavior_interval"] = self.behavior_interval
+        snapshot["consume_interval"] = self.consume_interval
+        if self.dedup is not None:
+            snapshot["dedup"] = self.dedup.stats()
+        if self.traffic_recorder is not None:
+            snapshot["recording"] = self.traffic_recorder.stats()
+        snapshot["pipeline"] = self.pipeline.stats()
+        return snapshot
+
+    def set_pacing(self, behavior_interval=None, consume_interval=None):
+        """
+        Changes how often behaviors run and how long the agent backs off on an empty inbox,
+        behaviors scheduled on a BehaviorScheduler use the new interval from their next run.
+
+        Args:
+            behavior_interval (float): New behavior interval in sec, None to keep the current one.
+            consume_interval (float): New consume interval in sec, None to keep the current one.
+
+        Returns:
+            None
+        """
+        if behavior_interval is not None:
+            self.behavior_interval = behavior_interval
+            for handle in self.scheduled_behaviors:
+                handle.interval = behavior_interval
+        if consume_interval is not None:
+            self.consume_interval = consume_interval
+
+    def enable_dedup(self, max_entries=DEDUP_MAX_ENTRIES, ttl=DEDUP_TTL, key=content_key):
+        """
+        Starts skipping messages whose key has been seen within 'ttl' sec, duplicates are
+        dropped after validation and before any handler runs.
+
+        Args:
+            max_entries (int): Max number of remembered keys, the least recently seen is evicted.
+            ttl (float): Time in sec a key is remembered, None for no expiry.
+            key (callable): Maps a message to its key, e.g. a message id, by default a digest of
+                its agent_id, type and content.
+
+        Returns:
+            DedupCache: The cache.
+        """
+        self.dedup = DedupCache(max_entries, ttl, key)
+        return self.dedup
+
+    def disable_dedup(self):
+        """
+        Stops skipping duplicate messages.
+
+        Returns:
+            None
+        """
+        self.dedup = None
+
+    def enable_recording(self, recorder):
+        """
+        Starts recording the messages this agent emits and handles, a recorder can be shared by
+        several agents.
+
+        Args:
+            recorder (TrafficRecorder): The recorder.
+
+        Returns:
+            TrafficRecorder: The recorder.
+        """
+        self.traffic_recorder = recorder
+        return recorder
+
+    def disable_recording(self):
+        """
+        Stops recording messages, the recorder itself is left open.
+
+        Returns:
+            None
+        """
+        self.traffic_recorder = None
+
+    async def _invoke_behavior(self, behavior):
+        if self.metrics is None and self.profiler is None:
+            return await self._invoke(behavior)
+        started = time.perf_counter()
+        token = self.profiler.enter(behavior, None, self) if self.profiler is not None else None
+        try:
+            return await self._invoke(behavior)
+        finally:
+            if self.metrics is not None:
+                self.metrics.behavior_latency.record(time.perf_counter() - started)
+            if token is not None and self.profiler is not None:
+                self.profiler.exit(token)
+
+    def register_message_handler(self, message_type, handler, mode=None, priority=None):
         """
         Registers a message handler.
 
         Args:
             message_type (str): The type of message.
             handler (callable): The handler function.
+            mode (str): 'async', 'blocking' or 'cpu_bound', by default coroutine functions are
+                'async' and plain functions 'blocking'.
+            priority (int): Inbox lane of the messages of this type, 0 being the highest, only
+                effective with a PriorityMailbox inbox.
 
         Returns:
             None
         """
         try:
+            self.execution_modes[handler] = OffloadExecutor.resolve_mode(handler, mode)
             self.message_handlers[message_type] = handler
+            if priority is not None:
+                self.message_priorities[message_type] = priority
+                if isinstance(self.inbox, PriorityMailbox):
+                    self.inbox.priorities[message_type] = priority
         except Exception as e:
             logging.error(f"Error occurred while registering message handler: {e}")
 
-    def register_behavior(self, behavior):
+    def register_content_handler(self, handler, keywords=(), patterns=(), mode=None):
+        """
+        Registers a handler for messages of any type whose content contains any of the keywords
+        or matches any of the regexes.
+
+        Args:
+            handler (callable): The handler function.
+            keywords (iterable): Plain substrings.
+            patterns (iterable): Regular expressions.
+            mode (str): 'async', 'blocking' or 'cpu_bound', see register_message_handler().
+
+        Returns:
+            None
+        """
+        try:
+            self.execution_modes[handler] = OffloadExecutor.resolve_mode(handler, mode)
+            self.content_matcher.add(handler, keywords, patterns)
+        except Exception as e:
+            logging.error(f"Error occurred while registering content handler: {e}")
+
+    def register_behavior(self, behavior, mode=None):
         """
         Registers a behavior function.
 
         Args:
             behavior (callable): The behavior function.
+            mode (str): 'async', 'blocking' or 'cpu_bound', by default coroutine functions are
+                'async' and plain functions 'blocking'.
 
         Returns:
             None
         """
         try:
+            self.execution_modes[behavior] = OffloadExecutor.resolve_mode(behavior, mode)
             self.behaviors.append(behavior)
         except Exception as e:
             logging.error(f"Error occurred while registering behavior: {e}")
@@ -166,10 +685,46 @@ class AutonomousAgent:
         while True:
             try:
                 for behavior in self.behaviors:
-                    await behavior()
+                    await self._invoke_behavior(behavior)
                 await asyncio.sleep(self.behavior_interval)
             except asyncio.CancelledError:
                 logging.info("Behavior execution task cancelled.")
                 break
             except Exception as e:
                 logging.exception(f"Error running behaviors: {e}")
+
+    def schedule_behaviors(self, scheduler, jitter=0.0):
+        """
+        Schedules registered behaviors on a shared BehaviorScheduler, to be used instead of
+        running run_behaviors() as a separate task.
+
+        Args:
+            scheduler (BehaviorScheduler): The shared scheduler.
+            jitter (float): Max random delay in sec added to each behavior deadline.
+
+        Returns:
+            None
+        """
+        try:
+            self.unschedule_behaviors()
+            self.scheduled_behaviors = [
+                scheduler.register(
+                    functools.partial(self._invoke_behavior, behavior),
+                    self.behavior_interval,
+                    jitter,
+                )
+                for behavior in self.behaviors
+            ]
+        except Exception as e:
+            logging.error(f"Error occurred while scheduling behaviors: {e}")
+
+    def unschedule_behaviors(self):
+        """
+        Cancels behaviors scheduled on a shared BehaviorScheduler.
+
+        Returns:
+            None
+        """
+        for handle in self.scheduled_behaviors:
+            handle.cancel()
+        self.scheduled_behaviors = []
@@ -0,0 +1,193 @@
+"""
+agents/behavior_scheduler.py
+
+This module holds a shared behavior scheduler which drives the behaviors of many agents from a
+single task instead of one 'run_behaviors' task per agent.
+
+1. Timing Wheel:
+   - Behaviors are kept in a hashed timing wheel of 'wheel_size' slots, each slot covering one
+     'tick' of time. Registration, cancellation and firing are O(1) per behavior.
+   - Deadlines further away than one wheel revolution carry a 'rounds' counter.
+
+2. Drift-free Periods:
+   - Every behavior has its own interval and an optional jitter. The next deadline is derived
+     from the previous one rather than from the time the behavior finished, so the period does
+     not drift by the behavior's run time.
+
+3. Concurrent Execution:
+   - All behaviors which fall due on the same tick are run concurrently in one task. A behavior
+     still running from a previous period is skipped rather than stacked.
+"""
+
+import asyncio
+import logging
+import math
+import random
+import time
+
+from configs.config import SCHEDULER_TICK, SCHEDULER_WHEEL_SIZE
+
+
+class ScheduledBehavior:
+    """
+    Handle of a behavior registered with the BehaviorScheduler.
+
+    Attributes:
+        behavior (callable): The behavior coroutine function.
+        interval (float): Period in sec.
+        jitter (float): Max random delay in sec added to each deadline.
+        runs (int): Number of times the behavior has been started.
+        skipped (int): Number of periods skipped as the previous run was still in progress.
+    """
+
+    def __init__(self, behavior, interval, jitter=0.0):
+        self.behavior = behavior
+        self.interval = interval
+        self.jitter = jitter
+        self.runs = 0
+        self.skipped = 0
+        self.cancelled = False
+        self.running = False
+        self.base = 0.0
+        self.rounds = 0
+
+    def cancel(self):
+        """
+        Stops the behavior from being fired again.
+        """
+        self.cancelled = True
+
+
+class BehaviorScheduler:
+    """
+    Drives periodic behaviors of any number of agents from a single loop task.
+
+    Attributes:
+        tick (float): Resolution of the wheel in sec.
+        wheel_size (int): Number of slots in the wheel.
+        seed (int): Seed of the jitter randomness.
+        clock (callable): Returns the current time in sec, time.monotonic by default.
+
+    Methods:
+        register(behavior, interval, jitter): Schedules a behavior, returns its handle.
+        cancel(handle): Stops a scheduled behavior.
+        run(): Fires due behaviors until cancelled.
+    """
+
+    def __init__(self, tick=SCHEDULER_TICK, wheel_size=SCHEDULER_WHEEL_SIZE, seed=None, clock=None):
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self._clock = clock or time.monotonic
+        self._wheel = [[] for _ in range(wheel_size)]
+        self._current_tick = 0
+        self._start = self._clock()
+        self._random = random.Random(seed)
+        self._tasks = set()
+
+    def __len__(self):
+        return sum(not entry.cancelled for slot in self._wheel for entry in slot)
+
+    def register(self, behavior, interval, jitter=0.0):
+        """
+        Schedules a behavior to be run every 'interval' sec, the first run is due after a random
+        delay of up to 'jitter' sec which spreads the load of agents registered together.
+
+        Args:
+            behavior (callable): The behavior coroutine function.
+            interval (float): Period in sec.
+            jitter (float): Max random delay in sec added to each deadline.
+
+        Returns:
+            ScheduledBehavior: Handle which can be used to cancel the behavior.
+        """
+        entry = ScheduledBehavior(behavior, interval, jitter)
+        entry.base = self._clock()
+        self._insert(entry, self._next_deadline(entry), self._current_tick)
+        return entry
+
+    def cancel(self, handle):
+        """
+        Stops a scheduled behavior, it is removed from the wheel lazily when its slot is visited.
+
+        Args:
+            handle (ScheduledBehavior): Handle returned by register().
+
+        Returns:
+            None
+        """
+        handle.cancel()
+
+    async def run(self):
+        """
+        Fires due behaviors until cancelled, sleeping until the next tick in between.
+
+        Returns:
+            None
+        """
+        while True:
+            try:
+                # Note: epsilon absorbs float error of clocks which jump exactly to the deadline.
+                now_tick = int((self._clock() - self._start) / self.tick + 1e-9)
+                while self._current_tick <= now_tick:
+                    self._fire_slot()
+                    self._current_tick += 1
+                next_time = self._start + self._current_tick * self.tick
+                await asyncio.sleep(max(0.0, next_time - self._clock()))
+            except asyncio.CancelledError:
+                logging.info("Behavior scheduler task cancelled.")
+                for task in list(self._tasks):
+                    task.cancel()
+                break
+            except Exception as e:
+                logging.exception(f"Error running behavior scheduler: {e}")
+
+    def _next_deadline(self, entry):
+        return entry.base + (self._random.uniform(0.0, entry.jitter) if entry.jitter else 0.0)
+
+    def _insert(self, entry, deadline, min_tick):
+        tick_index = max(math.ceil((deadline - self._start) / self.tick), min_tick)
+        # Note: the slot is next visited at the first tick >= 'min_tick' it covers.
+        entry.rounds = (tick_index - min_tick) // self.wheel_size
+        self._wheel[tick_index % self.wheel_size].append(entry)
+
+    def _fire_slot(self):
+        slot = self._current_tick % self.wheel_size
+        entries, self._wheel[slot] = self._wheel[slot], []
+        due = []
+        now = self._clock()
+        for entry in entries:
+            if entry.cancelled:
+                continue
+            if entry.rounds > 0:
+                entry.rounds -= 1
+                self._wheel[slot].append(entry)
+                continue
+
+            if entry.running:
+                entry.skipped += 1
+            else:
+                entry.running = True
+                entry.runs += 1
+                due.append(entry)
+
+            # Note: next period is derived from the previous deadline, missed periods are skipped.
+            entry.base += entry.interval
+            if now - entry.base >= entry.interval:
+                entry.base += entry.interval * math.floor((now - entry.base) / entry.interval)
+            self._insert(entry, self._next_deadline(entry), self._current_tick + 1)
+
+        if due:
+            task = asyncio.create_task(self._run_due(due))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_due(self, entries):
+        await asyncio.gather(*(self._invoke(entry) for entry in entries))
+
+    async def _invoke(self, entry):
+        try:
+            await entry.behavior()
+        except Exception as e:
+            logging.exception(f"Error running behavior: {e}")
+        finally:
+            entry.running = False
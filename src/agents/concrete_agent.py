@@ -6,7 +6,8 @@ It provides additional functionality specific to concrete agents.
 
 1. Message Handling:
    - The agent consumes messages from its inbox and filters them for the keyword "hello."
-   - If a message contains "hello," the entire message is printed to stdout.
+   - The keyword is registered with the content matcher, which routes every message
+     containing "hello," of any type, to a handler logging the entire message.
 
 2. Behavior Execution:
    - The agent runs a behavior that generates random 2-word messages.
@@ -14,17 +15,29 @@ It provides additional functionality specific to concrete agents.
     "hello," "sun," "world," "space," "moon," "crypto," "sky," "ocean," "universe," and "human."
    - The behavior repeats every 2 seconds.
 
+3. Bulk Generation:
+   - With 'bulk_size' the behavior instead emits a MessageBatch of 'bulk_size' messages per
+     tick, so the agent can serve as a load generator.
+   - Contents are drawn from a table of all word pairs precomputed from the alphabet, as token
+     ids, in a single draw per batch. They are clean by construction and are not sanitized.
+   - Each batch is put into the outbox with a single operation.
+
 """
 
+import itertools
 import logging
 import random
 
-from configs.config import ALPHABET
+from configs.config import ALPHABET, BULK_BATCH_SIZE
 from lib.utility import process_data
 from models.message import Message
+from models.message_batch import MessageBatch
 
 from .autonomous_agent import AutonomousAgent
 
+# Note: token ids of every ordered pair of distinct words, as drawn by random.sample(ALPHABET, 2).
+WORD_PAIRS = [bytes(pair) for pair in itertools.permutations(range(len(ALPHABET)), 2)]
+
 
 class ConcreteAgent(AutonomousAgent):
     """
@@ -32,24 +45,34 @@ class ConcreteAgent(AutonomousAgent):
 
     Attributes:
         All parent class attributes i.e. of AutonomousAgent class.
+        random (random.Random): Source of randomness of generated messages, can be replaced by
+            a seeded instance for reproducible runs.
+        bulk_size (int): Number of messages generated per behavior tick, None for one message.
 
     Methods:
-        handle_custom_message(message): Handles an incoming custom message.
+        handle_custom_message(message): Handles an incoming message containing "hello".
         generate_random_message(): Generates a random custom message.
+        generate_message_batch(count): Generates a batch of random custom messages.
+        close(): Releases the agent ID so that it can be reused by new agents.
     """
 
-    def __init__(self):
+    def __init__(self, bulk_size=BULK_BATCH_SIZE, announce=True, **kwargs):
         """
         Initializes a ConcreteAgent instance by extending the AutonomousAgent and
         guides its workflow.
 
         Args:
-            None
+            bulk_size (int): Number of messages generated per behavior tick, None for one message.
+            announce (bool): Whether to log the start of the agent, an AgentPool starting agents
+                in bulk logs once for all of them instead.
+            kwargs: Passed on to AutonomousAgent, e.g. 'mailbox_size' and 'backpressure'.
 
         Returns:
             None
         """
-        super().__init__()
+        super().__init__(**kwargs)
+        self.random = random
+        self.bulk_size = bulk_size
 
         # Get: 'msg_type' and 'agent_id'.
         # Note: this is designed in a way that these can be passed from main.
@@ -63,13 +86,18 @@ class ConcreteAgent(AutonomousAgent):
             "custom" if not (self.msg_type == Message.DEFAULT_TYPE) else Message.DEFAULT_TYPE
         )
 
-        self.register_message_handler(self.msg_type, self.handle_custom_message)
-        self.register_behavior(self.generate_random_message)
-        logging.info(f"Invoking Agent: {self.agent_id}.")
+        self.register_content_handler(self.handle_custom_message, keywords=("hello",))
+        if bulk_size:
+            self.register_behavior(self.generate_message_batch)
+        else:
+            self.register_behavior(self.generate_random_message)
+        if announce:
+            logging.info("Invoking Agent: %s.", self.agent_id)
 
     async def handle_custom_message(self, message):
         """
-        Handles an incoming custom message containing data about message and agent.
+        Handles an incoming message routed by the content matcher for the keyword "hello" and
+        logs it along with data about message and agent.
 
         Args:
             message (class Message): The incoming message.
@@ -77,15 +105,49 @@ class ConcreteAgent(AutonomousAgent):
         Returns:
             None
         """
-        if "hello" in message.content:
-            logging.info(
-                f"Received '{message.type}' message '{message.content}' from '{message.agent_id}'."
-            )
+        logging.info(
+            "Received '%s' message '%s' from '%s'.",
+            message.type,
+            message.content,
+            message.agent_id,
+        )
 
     async def generate_random_message(self) -> None:
         """
         Generates a random custom message by selecting two words from an alphabet list.
         """
-        message_content = process_data(" ".join(random.sample(ALPHABET, 2)))
+        message_content = " ".join(self.random.sample(ALPHABET, 2))
         message = Message(self.agent_id, type=self.msg_type, content=message_content)
         await self.emit_message(message)
+
+    async def generate_message_batch(self, count=None):
+        """
+        Generates a batch of random custom messages of two words each and emits it at once. The
+        batch is accepted or dropped by the outbox as a whole, 'bulk_size' should therefore stay
+        well below the mailbox size.
+
+        Args:
+            count (int): Number of messages, 'bulk_size' if None.
+
+        Returns:
+            None
+        """
+        count = self.bulk_size if count is None else count
+        batch = MessageBatch()
+        batch.extend_tokens(
+            self.agent_id, self.msg_type, b"".join(self.random.choices(WORD_PAIRS, k=count)), 2
+        )
+        await self.emit_message(batch)
+
+    def close(self):
+        """
+        Releases the agent ID so that it can be reused by new agents, should be called once the
+        agent has been stopped.
+
+        Returns:
+            None
+        """
+        try:
+            Message.release_agent_id(self.agent_id)
+        except Exception as e:
+            logging.error(f"Error occurred while releasing agent id: {e}")
@@ -0,0 +1,375 @@
+"""
+agents/durable_mailbox.py
+
+This module holds a persistent mailbox which keeps its messages in an append-only log on disk, so
+that messages queued when the process dies are delivered again after a restart.
+
+1. Log:
+   - The log is split in fixed size segment files, each one preallocated and accessed through
+     'mmap'. Segment files are named after the log offset of their first byte.
+   - A record is a header (payload length, crc32, kind) followed by a MessageCodec frame holding
+     either messages put one by one or a whole MessageBatch. A zero length marks the end of the
+     written data.
+   - Only messages whose type is in 'durable_types' are logged, other messages are queued in
+     memory only. With 'durable_types' None every message is logged.
+
+2. Batched Writes and Group Commit:
+   - Messages put one by one are buffered and written as a single record every 'sync_interval'
+     sec, or as soon as 'write_batch' of them are pending. A MessageBatch is written right away.
+   - The mapping and the consumer offset are synced to disk at the same time, a single fsync
+     covers all records written in between. The offset file is replaced atomically and the
+     directory is synced after the rename, so that the new offset survives a crash.
+
+3. Consumer Offset:
+   - commit() records that every message taken with get() so far has been handled. The agent
+     commits after each handled batch, so delivery is at-least-once: messages handled but not
+     committed before a crash are delivered again, as are the other messages of a record which
+     has only been partly consumed.
+   - Segments lying entirely before the committed offset are deleted.
+   - On open, records from the committed offset onwards are queued again, in order.
+"""
+
+import asyncio
+import mmap
+import os
+import struct
+import zlib
+
+from configs.config import (
+    BACKPRESSURE_POLICY,
+    DURABLE_SEGMENT_SIZE,
+    DURABLE_SYNC_INTERVAL,
+    DURABLE_WRITE_BATCH,
+    MAILBOX_SIZE,
+)
+from models.codec import MessageCodec
+from models.message import Message
+from models.message_batch import MessageBatch
+
+from .mailbox import Mailbox, message_count
+
+RECORD_HEADER = struct.Struct("!IIB")
+OFFSET = struct.Struct("!Q")
+MESSAGES = 0
+BATCH = 1
+SEGMENT_SUFFIX = ".log"
+OFFSET_FILE = "consumer.offset"
+
+
+class _Segment:
+    """
+    One preallocated and memory-mapped log file starting at log offset 'base'.
+    """
+
+    def __init__(self, path, base, size):
+        self.path = path
+        self.base = base
+        self.file = open(path, "a+b")
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size)
+        self.size = size
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class _Record:
+    """
+    Log position of a record and number of its messages still queued.
+    """
+
+    __slots__ = ("start", "end", "remaining")
+
+    def __init__(self, remaining, start=None, end=None):
+        self.remaining = remaining
+        self.start = start
+        self.end = end
+
+
+class DurableMailbox(Mailbox):
+    """
+    Mailbox backed by a segmented, memory-mapped append-only log.
+
+    Attributes:
+        directory (str): Directory holding the segments and the consumer offset.
+        segment_size (int): Size in bytes of a segment file.
+        sync_interval (float): Max time in sec between a put and the sync of its record.
+        write_batch (int): Max number of buffered messages before they are written.
+        durable_types (set): Message types which are logged, None for all.
+        recovered (int): Number of records queued again when the mailbox was opened.
+
+    Methods:
+        commit(): Marks the messages taken so far as handled.
+        sync(): Flushes the log and the consumer offset to disk.
+        close(): Syncs and closes the log.
+    """
+
+    def __init__(
+        self,
+        directory,
+        maxsize=MAILBOX_SIZE,
+        policy=BACKPRESSURE_POLICY,
+        segment_size=DURABLE_SEGMENT_SIZE,
+        sync_interval=DURABLE_SYNC_INTERVAL,
+        write_batch=DURABLE_WRITE_BATCH,
+        durable_types=None,
+        **kwargs,
+    ):
+        """
+        Args:
+            directory (str): Directory of the log, created if needed.
+            maxsize (int): Capacity of the mailbox.
+            policy (str): Backpressure policy, see Mailbox.
+            segment_size (int): Size in bytes of a segment file.
+            sync_interval (float): Max time in sec between a put and the sync of its record.
+            write_batch (int): Max number of buffered messages before they are written.
+            durable_types (iterable): Message types which are logged, None for all.
+            **kwargs: Other Mailbox arguments.
+        """
+        super().__init__(maxsize, policy, **kwargs)
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync_interval = sync_interval
+        self.write_batch = max(1, write_batch)
+        self.durable_types = set(durable_types) if durable_types is not None else None
+        self.recovered = 0
+        self._codec = MessageCodec()
+        self._segments = []
+        self._position = 0
+        self._pending = []
+        self._pending_record = None
+        self._last_taken = None
+        self._committed = 0
+        self._synced_commit = 0
+        self._sync_handle = None
+        self._dirty = False
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _offset_path(self):
+        return os.path.join(self.directory, OFFSET_FILE)
+
+    def _recover(self):
+        try:
+            with open(self._offset_path(), "rb") as offset_file:
+                (self._committed,) = OFFSET.unpack(offset_file.read(OFFSET.size))
+        except (FileNotFoundError, struct.error):
+            self._committed = 0
+        self._synced_commit = self._committed
+
+        bases = sorted(
+            int(name[: -len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX) and name[: -len(SEGMENT_SUFFIX)].isdigit()
+        )
+        for base in bases:
+            if base + self.segment_size <= self._committed and base != bases[-1]:
+                os.unlink(self._segment_path(base))
+            else:
+                self._segments.append(_Segment(self._segment_path(base), base, self.segment_size))
+        if not self._segments:
+            self._segments.append(self._new_segment(self._committed))
+
+        # Note: records are queued again without going through put(), they are already logged
+        # and the whole backlog is restored even if it exceeds 'maxsize'.
+        for segment in self._segments:
+            start = max(self._committed - segment.base, 0)
+            for kind, payload, end in self._records(segment, start):
+                messages = self._codec.decode_batch(payload)
+                items = messages if kind == MESSAGES else [MessageBatch(messages)]
+                start = end - len(payload) - RECORD_HEADER.size
+                record = _Record(len(items), segment.base + start, segment.base + end)
+                for item in items:
+                    self._queue.append((item, record))
+                    self._messages += message_count(item)
+                self._unfinished_tasks += len(items)
+                self.recovered += len(items)
+        self._position = self._segments[-1].base + self._scan_end(self._segments[-1])
+        if self._queue:
+            self._finished.clear()
+
+    def _segment_path(self, base):
+        return os.path.join(self.directory, f"{base:020d}{SEGMENT_SUFFIX}")
+
+    def _new_segment(self, base):
+        return _Segment(self._segment_path(base), base, self.segment_size)
+
+    def _records(self, segment, position):
+        """
+        Yields the (kind, payload, end position) of the valid records of a segment from
+        'position' on.
+        """
+        view = segment.map
+        while position + RECORD_HEADER.size <= segment.size:
+            length, checksum, kind = RECORD_HEADER.unpack_from(view, position)
+            start = position + RECORD_HEADER.size
+            if not length or start + length > segment.size:
+                return
+            payload = view[start : start + length]
+            if zlib.crc32(payload) != checksum:
+                # Check: a torn write at the tail of the log ends recovery.
+                return
+            position = start + length
+            yield kind, payload, position
+
+    def _scan_end(self, segment):
+        end = 0
+        for record in self._records(segment, 0):
+            end = record[2]
+        return end
+
+    def _durable(self, item):
+        if isinstance(item, MessageBatch):
+            return True
+        if not isinstance(item, Message):
+            return False
+        return self.durable_types is None or item.type in self.durable_types
+
+    def _write(self, kind, messages, record):
+        """
+        Writes messages as one record, or as several if they do not fit in a segment.
+        """
+        payload = self._codec.encode_batch(messages)
+        size = RECORD_HEADER.size + len(payload)
+        if size + RECORD_HEADER.size > self.segment_size:
+            if kind == BATCH or len(messages) == 1:
+                raise ValueError(f"Record of {size} bytes does not fit in a log segment.")
+            # Note: a split record keeps a single _Record spanning all of its parts.
+            middle = len(messages) // 2
+            self._write(kind, messages[:middle], record)
+            start = record.start
+            self._write(kind, messages[middle:], record)
+            record.start = start
+            return
+
+        segment = self._segments[-1]
+        position = self._position - segment.base
+        if position + size + RECORD_HEADER.size > segment.size:
+            # Note: the zeroed space left at the end of the segment reads as the end of its data.
+            segment.map.flush()
+            segment = self._new_segment(segment.base + segment.size)
+            self._segments.append(segment)
+            position = 0
+
+        start = position + RECORD_HEADER.size
+        segment.map[start : start + len(payload)] = payload
+        # Note: the header is written last, a record is only visible once it is complete.
+        RECORD_HEADER.pack_into(segment.map, position, len(payload), zlib.crc32(payload), kind)
+        record.start = segment.base + position
+        record.end = self._position = segment.base + position + size
+        self._dirty = True
+
+    def _write_pending(self):
+        if self._pending:
+            self._write(MESSAGES, self._pending, self._pending_record)
+            self._pending = []
+            self._pending_record = None
+
+    def _schedule_sync(self):
+        if self._sync_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Skip: without a loop the log is synced by sync() or close()
+        self._sync_handle = loop.call_later(self.sync_interval, self.sync)
+
+    def _put(self, item):
+        if not self._durable(item):
+            self._queue.append((item, None))
+            return
+        if isinstance(item, MessageBatch):
+            self._write_pending()
+            record = _Record(1)
+            self._write(BATCH, item, record)
+        else:
+            if self._pending_record is None:
+                self._pending_record = _Record(0)
+            record = self._pending_record
+            record.remaining += 1
+            self._pending.append(item)
+            if len(self._pending) >= self.write_batch:
+                self._write_pending()
+        self._queue.append((item, record))
+        self._schedule_sync()
+
+    def _get(self):
+        item, record = self._queue.popleft()
+        if record is not None:
+            record.remaining -= 1
+            self._last_taken = record
+        return item
+
+    def commit(self):
+        """
+        Marks every message taken from the mailbox so far as handled, the offset is persisted by
+        the next sync.
+
+        Returns:
+            None
+        """
+        record = self._last_taken
+        if record is None:
+            return
+        if record.end is None:
+            self._write_pending()
+        # Check: a record is committed once all of its messages have been taken.
+        offset = record.end if not record.remaining else record.start
+        if offset != self._committed:
+            self._committed = offset
+            self._dirty = True
+            self._schedule_sync()
+
+    def sync(self):
+        """
+        Writes the buffered messages, flushes the log and the consumer offset to disk and deletes
+        the segments which have been fully consumed.
+
+        Returns:
+            None
+        """
+        if self._sync_handle is not None:
+            self._sync_handle.cancel()
+            self._sync_handle = None
+        self._write_pending()
+        if not self._dirty:
+            return
+        self._dirty = False
+        self._segments[-1].map.flush()
+
+        if self._committed != self._synced_commit:
+            temporary = self._offset_path() + ".tmp"
+            with open(temporary, "wb") as offset_file:
+                offset_file.write(OFFSET.pack(self._committed))
+                offset_file.flush()
+                os.fsync(offset_file.fileno())
+            os.replace(temporary, self._offset_path())
+            self._sync_directory()
+            self._synced_commit = self._committed
+
+            while len(self._segments) > 1 and self._segments[1].base <= self._committed:
+                segment = self._segments.pop(0)
+                segment.close()
+                os.unlink(segment.path)
+
+    def _sync_directory(self):
+        # Note: persists the rename of the offset file and the segment files created so far.
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        """
+        Syncs and closes the log, the mailbox must not be used afterwards.
+
+        Returns:
+            None
+        """
+        self.sync()
+        for segment in self._segments:
+            segment.close()
+        self._segments = []
@@ -0,0 +1,188 @@
+"""
+agents/mailbox.py
+
+This module holds a bounded mailbox, an asyncio.Queue with a backpressure policy which decides
+what happens to a message put into a full (or nearly full) mailbox.
+
+1. Policies:
+   - block: waits up to 'timeout' sec for free space, then drops the message.
+   - drop_newest: drops the message being put.
+   - drop_oldest: evicts the oldest queued message, the mailbox behaves like a ring buffer.
+   - sample: once pressure reaches 'high_watermark' only every 'sample_rate'-th message is
+     admitted, the rest is dropped.
+
+2. Accounting:
+   - Every dropped message is counted, and pressure() reports how full the mailbox is.
+   - A MessageBatch is queued as one item but counts as len(batch) messages against 'maxsize',
+     in qsize() and in 'dropped'. A batch is admitted only as a whole, one larger than 'maxsize'
+     is always dropped.
+"""
+
+import asyncio
+import contextlib
+
+from configs.config import (
+    BACKPRESSURE_HIGH_WATERMARK,
+    BACKPRESSURE_POLICY,
+    BACKPRESSURE_SAMPLE_RATE,
+    BACKPRESSURE_TIMEOUT,
+    MAILBOX_SIZE,
+)
+from models.message_batch import MessageBatch
+
+
+def message_count(item):
+    """
+    Returns the number of messages an item of a mailbox counts as.
+    """
+    return len(item) if isinstance(item, MessageBatch) else 1
+
+
+class Mailbox(asyncio.Queue):
+    """
+    Bounded asyncio.Queue applying a backpressure policy on put.
+
+    Attributes:
+        policy (str): One of POLICIES.
+        timeout (float): Max time in sec a put waits for free space with the 'block' policy.
+        sample_rate (int): One in 'sample_rate' messages is admitted with the 'sample' policy.
+        high_watermark (float): Pressure from which the 'sample' policy starts dropping.
+        dropped (int): Number of messages dropped by the policy.
+
+    Methods:
+        put(item): Puts a message applying the policy, returns whether it was accepted.
+        put_nowait(item): Puts a message without waiting, raises QueueFull if it was dropped.
+        pressure(): Returns how full the mailbox is, between 0.0 and 1.0.
+        qsize(): Returns the number of queued messages, batches counted by their length.
+    """
+
+    BLOCK = "block"
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+    SAMPLE = "sample"
+    POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, SAMPLE)
+
+    def __init__(
+        self,
+        maxsize=MAILBOX_SIZE,
+        policy=BACKPRESSURE_POLICY,
+        timeout=BACKPRESSURE_TIMEOUT,
+        sample_rate=BACKPRESSURE_SAMPLE_RATE,
+        high_watermark=BACKPRESSURE_HIGH_WATERMARK,
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{policy}'.")
+        self._messages = 0
+        super().__init__(maxsize)
+        self.policy = policy
+        self.timeout = timeout
+        self.sample_rate = max(1, sample_rate)
+        self.high_watermark = high_watermark
+        self.dropped = 0
+        self._sample_counter = 0
+
+    def qsize(self):
+        return self._messages
+
+    def pressure(self):
+        """
+        Returns how full the mailbox is.
+
+        Returns:
+            float: Ratio of queued messages to 'maxsize', 0.0 for an unbounded mailbox.
+        """
+        return self.qsize() / self.maxsize if self.maxsize > 0 else 0.0
+
+    def _fits(self, count):
+        return self.maxsize <= 0 or self._messages + count <= self.maxsize
+
+    def _evict(self):
+        """
+        Removes the item evicted by the 'drop_oldest' policy.
+
+        Returns:
+            The evicted item.
+        """
+        return self.get_nowait()
+
+    def _admit(self, item):
+        """
+        Applies the non-blocking part of the policy, returns whether the item has been queued.
+        """
+        count = message_count(item)
+        if not count:
+            return True  # Skip: an empty batch carries nothing, even a full mailbox accepts it
+        if self.policy == self.SAMPLE and self.pressure() >= self.high_watermark:
+            self._sample_counter += 1
+            if self._sample_counter % self.sample_rate:
+                self.dropped += count
+                return False
+        if not self._fits(count):
+            if self.policy != self.DROP_OLDEST or count > self.maxsize:
+                self.dropped += count
+                return False
+            while not self._fits(count):
+                self.dropped += message_count(self._evict())
+        super().put_nowait(item)
+        self._messages += count
+        return True
+
+    def put_nowait(self, item):
+        """
+        Puts a message without waiting, the 'block' policy behaves like 'drop_newest' here.
+
+        Args:
+            item: The message.
+
+        Returns:
+            None
+
+        Raises:
+            asyncio.QueueFull: If the message has been dropped.
+        """
+        if not self._admit(item):
+            raise asyncio.QueueFull
+
+    def get_nowait(self):
+        item = super().get_nowait()
+        self._messages -= message_count(item)
+        return item
+
+    async def _wait_for_room(self, count):
+        # Note: like asyncio.Queue.put(), but waits until 'count' messages fit.
+        loop = asyncio.get_running_loop()
+        while not self._fits(count):
+            putter = loop.create_future()
+            self._putters.append(putter)
+            try:
+                await putter
+            except BaseException:
+                putter.cancel()
+                with contextlib.suppress(ValueError):
+                    self._putters.remove(putter)
+                if not self.full() and not putter.cancelled():
+                    self._wakeup_next(self._putters)
+                raise
+
+    async def put(self, item):
+        """
+        Puts a message applying the policy.
+
+        Args:
+            item: The message.
+
+        Returns:
+            bool: True if the message has been queued, False if it has been dropped.
+        """
+        count = message_count(item)
+        if self.policy != self.BLOCK or self._fits(count):
+            return self._admit(item)
+        if count > self.maxsize:
+            self.dropped += count
+            return False
+        try:
+            await asyncio.wait_for(self._wait_for_room(count), self.timeout)
+        except TimeoutError:
+            self.dropped += count
+            return False
+        return self._admit(item)
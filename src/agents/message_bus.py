@@ -0,0 +1,298 @@
+"""
+agents/message_bus.py
+
+This module holds an in-process message bus which replaces hand-wired 'outbox = inbox' links
+between agents.
+
+1. Publish / Subscribe:
+   - Queues subscribe by topic, by message type or by sender agent id.
+   - Routing uses dict lookups keyed on the topic, type and agent id of a message, so its cost
+     depends on the number of matching subscribers only.
+   - Fan-out hands the same Message object to every subscriber, nothing is copied.
+
+2. Agent Wiring:
+   - connect(agent, topic) replaces the agent's outbox with a publisher, so emit_message()
+     publishes to the bus without any change to the agent.
+   - Every agent has an address topic to which its inbox is subscribed, topologies such as
+     ring, star and full mesh are built on top of these.
+"""
+
+import asyncio
+import logging
+
+from .mailbox import Mailbox
+
+
+class TopicPublisher:
+    """
+    Queue-like outbox which publishes everything put into it to a MessageBus topic.
+
+    Attributes:
+        bus (MessageBus): The bus to publish on.
+        topic (str): The topic to publish to.
+        sender (asyncio.Queue): Queue of the publishing agent, skipped on fan-out.
+        replaced (asyncio.Queue): Outbox the publisher replaced, restored on disconnect.
+    """
+
+    def __init__(self, bus, topic, sender=None, replaced=None):
+        self.bus = bus
+        self.topic = topic
+        self.sender = sender
+        self.replaced = replaced
+
+    def full(self):
+        return False
+
+    def empty(self):
+        return True
+
+    def qsize(self):
+        return 0
+
+    def put_nowait(self, message):
+        self.bus.publish(message, topic=self.topic, sender=self.sender)
+
+    async def put(self, message):
+        self.put_nowait(message)
+
+
+class MessageBus:
+    """
+    In-process message bus routing messages to subscribed queues.
+
+    Attributes:
+        published (int): Number of messages published.
+        delivered (int): Number of deliveries made to subscriber queues.
+        dropped (int): Number of deliveries dropped as the subscriber queue was full.
+
+    Methods:
+        subscribe(queue, topic, message_type, agent_id): Subscribes a queue.
+        unsubscribe(queue, topic, message_type, agent_id): Removes a subscription.
+        publish(message, topic, sender): Delivers a message to matching subscribers.
+        address(agent): Returns the address topic of an agent.
+        connect(agent, topic): Routes the agent's outbox to a topic.
+        disconnect(agent, detach): Removes all subscriptions of the agent's inbox.
+        detach(agent): Restores the outbox the agent had before it was connected.
+        ring(agents): Wires agents in a ring.
+        star(hub, agents): Wires agents to and from a hub.
+        full_mesh(agents): Wires every agent to every other agent.
+    """
+
+    ADDRESS_PREFIX = "@"
+
+    def __init__(self):
+        self._by_topic = {}
+        self._by_type = {}
+        self._by_agent_id = {}
+        # Note: subscriptions of every queue, so disconnect() does not scan all indexes.
+        self._subscriptions = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def _index(self, topic=None, message_type=None, agent_id=None):
+        keys = [(k, v) for k, v in ((topic, 0), (message_type, 1), (agent_id, 2)) if k is not None]
+        if len(keys) != 1:
+            raise ValueError("Exactly one of topic, message_type or agent_id must be given.")
+        key, position = keys[0]
+        return (self._by_topic, self._by_type, self._by_agent_id)[position], key
+
+    def subscribe(self, queue, topic=None, message_type=None, agent_id=None):
+        """
+        Subscribes a queue to a topic, a message type or messages sent by an agent id.
+
+        Args:
+            queue (asyncio.Queue): The queue receiving matching messages.
+            topic (str): The topic to subscribe to.
+            message_type (str): The message type to subscribe to.
+            agent_id (str): The sender agent id to subscribe to.
+
+        Returns:
+            None
+        """
+        index, key = self._index(topic, message_type, agent_id)
+        # Note: dict is used as an insertion ordered set of subscribers.
+        index.setdefault(key, {})[id(queue)] = queue
+        self._subscriptions.setdefault(id(queue), set()).add((id(index), key))
+
+    def unsubscribe(self, queue, topic=None, message_type=None, agent_id=None):
+        """
+        Removes a subscription made with subscribe().
+
+        Args:
+            queue (asyncio.Queue): The subscribed queue.
+            topic (str): The subscribed topic.
+            message_type (str): The subscribed message type.
+            agent_id (str): The subscribed sender agent id.
+
+        Returns:
+            None
+        """
+        index, key = self._index(topic, message_type, agent_id)
+        subscribers = index.get(key)
+        if subscribers is not None:
+            subscribers.pop(id(queue), None)
+            if not subscribers:
+                del index[key]
+        subscriptions = self._subscriptions.get(id(queue))
+        if subscriptions is not None:
+            subscriptions.discard((id(index), key))
+            if not subscriptions:
+                del self._subscriptions[id(queue)]
+
+    def publish(self, message, topic=None, sender=None):
+        """
+        Delivers a message to every queue subscribed to the topic, to the message type or to the
+        sender agent id. Each queue receives the message at most once.
+
+        Args:
+            message (class Message): The message to publish.
+            topic (str): The topic to publish to.
+            sender (asyncio.Queue): Queue of the publishing agent, it does not receive the message.
+
+        Returns:
+            int: Number of queues the message was delivered to.
+        """
+        self.published += 1
+        targets = {}
+        if topic is not None and topic in self._by_topic:
+            targets.update(self._by_topic[topic])
+        message_type = getattr(message, "type", None)
+        if message_type in self._by_type:
+            targets.update(self._by_type[message_type])
+        agent_id = getattr(message, "agent_id", None)
+        if agent_id in self._by_agent_id:
+            targets.update(self._by_agent_id[agent_id])
+        if sender is not None:
+            targets.pop(id(sender), None)
+
+        delivered = 0
+        for queue in targets.values():
+            try:
+                queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logging.warning("Subscriber queue is full. Message has been dropped.")
+        self.delivered += delivered
+        return delivered
+
+    def address(self, agent):
+        """
+        Returns the address topic of an agent, to which its inbox is subscribed by connect().
+
+        Args:
+            agent (AutonomousAgent): The agent.
+
+        Returns:
+            str: The address topic.
+        """
+        return f"{self.ADDRESS_PREFIX}{getattr(agent, 'agent_id', None) or id(agent)}"
+
+    def connect(self, agent, topic=None):
+        """
+        Subscribes the agent's inbox to its address topic and routes its outbox to a topic.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+            topic (str): The topic emitted messages are published to, None to only receive.
+
+        Returns:
+            None
+        """
+        self.subscribe(agent.inbox, topic=self.address(agent))
+        if topic is not None:
+            self._publish_to(agent, topic)
+
+    def _publish_to(self, agent, topic):
+        outbox = agent.outbox
+        if isinstance(outbox, TopicPublisher):
+            outbox = outbox.replaced
+        agent.outbox = TopicPublisher(self, topic, sender=agent.inbox, replaced=outbox)
+
+    def disconnect(self, agent, detach=True):
+        """
+        Removes all subscriptions of the agent's inbox and detaches its outbox from the bus, the
+        outbox the agent had before connect() is restored.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+            detach (bool): False to keep publishing what the agent emits, e.g. while it drains
+                its inbox, detach() then detaches the outbox later.
+
+        Returns:
+            None
+        """
+        indexes = {id(index): index for index in (self._by_topic, self._by_type, self._by_agent_id)}
+        for index_id, key in self._subscriptions.pop(id(agent.inbox), ()):
+            index = indexes[index_id]
+            subscribers = index.get(key)
+            if subscribers is not None:
+                subscribers.pop(id(agent.inbox), None)
+                if not subscribers:
+                    del index[key]
+        if detach:
+            self.detach(agent)
+
+    def detach(self, agent):
+        """
+        Detaches the agent's outbox from the bus, the outbox it had before connect() is restored.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+
+        Returns:
+            None
+        """
+        if isinstance(agent.outbox, TopicPublisher) and agent.outbox.bus is self:
+            # Note: the agent gets back its own bounded outbox with its backpressure policy.
+            replaced = agent.outbox.replaced
+            agent.outbox = replaced if replaced is not None else Mailbox()
+
+    def ring(self, agents):
+        """
+        Wires agents in a ring, each agent emits to the next one and the last to the first.
+
+        Args:
+            agents (list): The agents.
+
+        Returns:
+            None
+        """
+        for agent in agents:
+            self.subscribe(agent.inbox, topic=self.address(agent))
+        for position, agent in enumerate(agents):
+            peer = agents[(position + 1) % len(agents)]
+            self._publish_to(agent, self.address(peer))
+
+    def star(self, hub, agents):
+        """
+        Wires agents to a hub, the hub broadcasts to all agents and every agent emits to the hub.
+
+        Args:
+            hub (AutonomousAgent): The hub agent.
+            agents (list): The spoke agents.
+
+        Returns:
+            None
+        """
+        broadcast = f"{self.address(hub)}/star"
+        self.connect(hub, broadcast)
+        for agent in agents:
+            self.connect(agent, self.address(hub))
+            self.subscribe(agent.inbox, topic=broadcast)
+
+    def full_mesh(self, agents, topic="mesh"):
+        """
+        Wires every agent to every other agent through a shared broadcast topic.
+
+        Args:
+            agents (list): The agents.
+            topic (str): The shared topic.
+
+        Returns:
+            None
+        """
+        for agent in agents:
+            self.connect(agent, topic)
+            self.subscribe(agent.inbox, topic=topic)
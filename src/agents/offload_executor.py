@@ -0,0 +1,146 @@
+"""
+agents/offload_executor.py
+
+This module holds the executor used to run blocking and CPU-bound handlers and behaviors off
+the event loop, so they cannot freeze the other agents of the process.
+
+1. Modes:
+   - async: coroutine functions and objects with an 'async def __call__', awaited directly on
+     the event loop.
+   - blocking: plain functions doing blocking I/O, run on a managed thread pool. A plain
+     callable returning an awaitable, e.g. a lambda calling a coroutine function, has that
+     awaitable awaited on the event loop.
+   - cpu_bound: plain functions doing heavy computation, run on a managed process pool. They
+     and their arguments have to be picklable, i.e. module level functions rather than
+     bound methods of an agent.
+
+2. Limits:
+   - Pools are created lazily with a bounded number of workers.
+   - At most 'max_pending' calls per mode are submitted at once, further calls wait on the
+     event loop instead of piling up in the pool's queue.
+"""
+
+import asyncio
+import functools
+import inspect
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from configs.config import OFFLOAD_MAX_PENDING, OFFLOAD_PROCESSES, OFFLOAD_THREADS
+
+
+def _is_coroutine_function(func):
+    if inspect.iscoroutinefunction(func):
+        return True
+    # Check: callable objects with an 'async def __call__'.
+    return callable(func) and inspect.iscoroutinefunction(type(func).__call__)
+
+
+class OffloadExecutor:
+    """
+    Runs callables according to their mode on the event loop, a thread pool or a process pool.
+
+    Attributes:
+        max_threads (int): Size of the thread pool.
+        max_processes (int): Size of the process pool, None for the number of CPUs.
+        max_pending (int): Max calls per mode submitted to a pool at once.
+
+    Methods:
+        resolve_mode(func, mode): Validates a mode, deriving it from the callable if None.
+        run(mode, func, *args): Runs a callable in the given mode.
+        shutdown(wait): Shuts the pools down.
+    """
+
+    ASYNC = "async"
+    BLOCKING = "blocking"
+    CPU_BOUND = "cpu_bound"
+    MODES = (ASYNC, BLOCKING, CPU_BOUND)
+
+    def __init__(
+        self,
+        max_threads=OFFLOAD_THREADS,
+        max_processes=OFFLOAD_PROCESSES,
+        max_pending=OFFLOAD_MAX_PENDING,
+    ):
+        self.max_threads = max_threads
+        self.max_processes = max_processes
+        self.max_pending = max_pending
+        self._pools = {}
+        # Note: semaphores are bound to an event loop, hence kept per loop.
+        self._slots = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def resolve_mode(cls, func, mode=None):
+        """
+        Validates a mode, coroutine functions and objects with an 'async def __call__' default
+        to 'async' and other callables to 'blocking' so that sync callables can be registered
+        without wrapping them.
+
+        Args:
+            func (callable): The handler or behavior.
+            mode (str): One of MODES or None.
+
+        Returns:
+            str: The mode.
+
+        Raises:
+            ValueError: If the mode is unknown.
+        """
+        if mode is None:
+            return cls.ASYNC if _is_coroutine_function(func) else cls.BLOCKING
+        if mode not in cls.MODES:
+            raise ValueError(f"Unknown execution mode '{mode}'.")
+        return mode
+
+    def _pool(self, mode):
+        pool = self._pools.get(mode)
+        if pool is None:
+            if mode == self.CPU_BOUND:
+                pool = ProcessPoolExecutor(max_workers=self.max_processes)
+            else:
+                pool = ThreadPoolExecutor(self.max_threads, thread_name_prefix="agent-offload")
+            self._pools[mode] = pool
+        return pool
+
+    async def run(self, mode, func, *args):
+        """
+        Runs a callable in the given mode.
+
+        Args:
+            mode (str): One of MODES.
+            func (callable): The handler or behavior.
+            args: Arguments passed to the callable.
+
+        Returns:
+            The result of the callable.
+        """
+        if mode == self.ASYNC:
+            return await func(*args)
+
+        loop = asyncio.get_running_loop()
+        slots = self._slots.setdefault(loop, {})
+        if mode not in slots:
+            slots[mode] = asyncio.Semaphore(self.max_pending)
+        async with slots[mode]:
+            result = await loop.run_in_executor(self._pool(mode), functools.partial(func, *args))
+        if inspect.isawaitable(result):
+            # Note: a sync callable may return a coroutine, e.g. a lambda wrapping a handler.
+            result = await result
+        return result
+
+    def shutdown(self, wait=True):
+        """
+        Shuts the pools down, they are recreated on the next offloaded call.
+
+        Args:
+            wait (bool): Whether to wait for running calls to complete.
+
+        Returns:
+            None
+        """
+        pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait)
+
+
+DEFAULT_EXECUTOR = OffloadExecutor()
@@ -0,0 +1,206 @@
+"""
+agents/pacing_controller.py
+
+This module holds a feedback controller which tunes the behavior and consume intervals of agents
+from their live load, instead of the fixed BEHAVIOUR_INTERVAL and CONSUME_INTERVAL.
+
+1. Emission Rate (AIMD):
+   - Every period the emission rate (1 / behavior_interval) is increased by a constant step,
+     unless the agent is congested: it dropped messages on emit or its outbox pressure reached
+     the high watermark. The rate is then multiplied by a decrease factor.
+
+2. Consumption Pacing (PI):
+   - The latency of a message arriving now is estimated as the time to work through the inbox
+     backlog (depth x mean handler time) plus the consume interval the agent may be sleeping.
+   - A PI controller in velocity form moves the consume interval so that this estimate stays at
+     the target latency: idle agents back off up to the target, loaded agents poll quickly.
+
+3. Visibility:
+   - snapshot() returns the effective rates and the latency estimate of every agent, the
+     intervals are also part of the agent metrics and of the Prometheus exposition.
+
+Both intervals always stay within their configured bounds.
+"""
+
+import asyncio
+import logging
+
+from configs.config import (
+    BACKPRESSURE_HIGH_WATERMARK,
+    PACING_BEHAVIOR_BOUNDS,
+    PACING_CONSUME_BOUNDS,
+    PACING_GAIN_I,
+    PACING_GAIN_P,
+    PACING_INTERVAL,
+    PACING_RATE_DECREASE,
+    PACING_RATE_INCREASE,
+    PACING_TARGET_LATENCY,
+)
+
+
+def _clamp(value, bounds):
+    return min(max(value, bounds[0]), bounds[1])
+
+
+class _PacingState:
+    """
+    Counters of an agent at the previous control step.
+    """
+
+    def __init__(self, agent):
+        metrics = agent.metrics
+        self.dropped = metrics.dropped
+        self.handled = metrics.handler_latency.count
+        self.busy = metrics.handler_latency.total
+        self.service_time = 0.0
+        self.error = 0.0
+        self.latency = agent.consume_interval
+        self.congested = False
+
+
+class PacingController:
+    """
+    Adjusts the behavior and consume intervals of attached agents every 'interval' sec.
+
+    Attributes:
+        target_latency (float): Latency in sec the consume interval is tuned for.
+        interval (float): Period in sec of the control loop.
+        behavior_bounds (tuple): Min and max behavior interval in sec.
+        consume_bounds (tuple): Min and max consume interval in sec.
+        rate_increase (float): Emission rate in msg/sec added per period without congestion.
+        rate_decrease (float): Factor the emission rate is multiplied with on congestion.
+        high_watermark (float): Outbox pressure from which an agent is considered congested.
+        gain_p (float): Proportional gain of the consume interval controller.
+        gain_i (float): Integral gain of the consume interval controller.
+
+    Methods:
+        attach(agent): Starts pacing an agent, enables its metrics if needed.
+        detach(agent): Stops pacing an agent.
+        update(): Runs one control step for all attached agents.
+        run(): Runs update() every 'interval' sec.
+        snapshot(): Returns the effective rates of all attached agents.
+    """
+
+    def __init__(
+        self,
+        target_latency=PACING_TARGET_LATENCY,
+        interval=PACING_INTERVAL,
+        behavior_bounds=PACING_BEHAVIOR_BOUNDS,
+        consume_bounds=PACING_CONSUME_BOUNDS,
+        rate_increase=PACING_RATE_INCREASE,
+        rate_decrease=PACING_RATE_DECREASE,
+        high_watermark=BACKPRESSURE_HIGH_WATERMARK,
+        gain_p=PACING_GAIN_P,
+        gain_i=PACING_GAIN_I,
+    ):
+        self.target_latency = target_latency
+        self.interval = interval
+        self.behavior_bounds = behavior_bounds
+        self.consume_bounds = consume_bounds
+        self.rate_increase = rate_increase
+        self.rate_decrease = rate_decrease
+        self.high_watermark = high_watermark
+        self.gain_p = gain_p
+        self.gain_i = gain_i
+        self._agents = {}
+
+    def attach(self, agent):
+        """
+        Starts pacing an agent, its current intervals are brought within the bounds.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+
+        Returns:
+            None
+        """
+        if agent.metrics is None:
+            agent.enable_metrics()
+        agent.set_pacing(
+            behavior_interval=_clamp(agent.behavior_interval, self.behavior_bounds),
+            consume_interval=_clamp(agent.consume_interval, self.consume_bounds),
+        )
+        self._agents[agent] = _PacingState(agent)
+
+    def detach(self, agent):
+        """
+        Stops pacing an agent, it keeps its last intervals.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+
+        Returns:
+            None
+        """
+        self._agents.pop(agent, None)
+
+    def update(self):
+        """
+        Runs one control step for all attached agents.
+
+        Returns:
+            None
+        """
+        for agent, state in self._agents.items():
+            try:
+                self._update_agent(agent, state)
+            except Exception as e:
+                logging.error(f"Error occurred while pacing agent: {e}")
+
+    def _update_agent(self, agent, state):
+        metrics = agent.metrics
+        if metrics is None:
+            return  # Skip: metrics were disabled after attach()
+
+        # Emission: additive increase, multiplicative decrease of the rate.
+        dropped = metrics.dropped - state.dropped
+        state.dropped = metrics.dropped
+        state.congested = dropped > 0 or agent.queue_pressure()["outbox"] >= self.high_watermark
+        rate = 1.0 / agent.behavior_interval
+        if state.congested:
+            rate *= self.rate_decrease
+        else:
+            rate += self.rate_increase * self.interval
+        behavior_interval = _clamp(1.0 / rate, self.behavior_bounds)
+
+        # Consumption: PI in velocity form on the estimated latency.
+        histogram = metrics.handler_latency
+        handled = histogram.count - state.handled
+        if handled:
+            state.service_time = (histogram.total - state.busy) / handled
+        state.handled, state.busy = histogram.count, histogram.total
+        state.latency = agent.inbox.qsize() * state.service_time + agent.consume_interval
+        error = self.target_latency - state.latency
+        change = self.gain_p * (error - state.error) + self.gain_i * error * self.interval
+        state.error = error
+        consume_interval = _clamp(agent.consume_interval + change, self.consume_bounds)
+
+        agent.set_pacing(behavior_interval=behavior_interval, consume_interval=consume_interval)
+
+    async def run(self):
+        """
+        Runs update() every 'interval' sec until cancelled.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            self.update()
+
+    def snapshot(self):
+        """
+        Returns the effective rates of all attached agents.
+
+        Returns:
+            list: One dict per agent with its intervals, emission rate, estimated latency and
+            whether it is congested.
+        """
+        return [
+            {
+                "agent": getattr(agent, "agent_id", None) or id(agent),
+                "behavior_interval": agent.behavior_interval,
+                "emission_rate": 1.0 / agent.behavior_interval,
+                "consume_interval": agent.consume_interval,
+                "estimated_latency": state.latency,
+                "congested": state.congested,
+            }
+            for agent, state in self._agents.items()
+        ]
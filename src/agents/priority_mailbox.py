@@ -0,0 +1,189 @@
+"""
+agents/priority_mailbox.py
+
+This module holds a mailbox with priority lanes, so that control messages (shutdown,
+reconfiguration, health checks) are not queued behind a backlog of data messages.
+
+1. Lanes:
+   - Lane 0 has the highest priority. A message goes to the lane given by its 'priority'
+     attribute, else to the lane registered for its type in 'priorities', else to
+     'default_priority'.
+   - Capacity and backpressure are shared by all lanes, the 'drop_oldest' policy evicts the
+     oldest message of the lowest priority lane.
+
+2. Consumption Policies:
+   - strict: the highest priority lane is served first, but a queued message is promoted by one
+     lane every 'aging' sec up to lane 1, so low priority messages are delayed but never starved
+     by each other. Messages promoted to the same lane are served oldest first. Lane 0 is never
+     outranked by aged traffic, a control message is not queued behind an old data backlog.
+   - weighted: lanes are served by smooth weighted round-robin, lane 'i' gets 'weights[i]'
+     turns out of sum(weights) while all lanes are busy.
+"""
+
+import time
+from collections import deque
+
+from configs.config import (
+    BACKPRESSURE_POLICY,
+    MAILBOX_SIZE,
+    PRIORITY_AGING,
+    PRIORITY_POLICY,
+)
+
+from .mailbox import Mailbox, message_count
+
+
+class _Lanes:
+    """
+    One deque of (enqueue time, item) per lane, sized like a single queue for asyncio.Queue.
+    """
+
+    def __init__(self, count):
+        self.lanes = [deque() for _ in range(count)]
+        self.size = 0
+
+    def push(self, lane, entry):
+        self.lanes[lane].append(entry)
+        self.size += 1
+
+    def pop(self, lane):
+        self.size -= 1
+        return self.lanes[lane].popleft()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for lane in self.lanes:
+            for _, item in lane:
+                yield item
+
+
+class PriorityMailbox(Mailbox):
+    """
+    Bounded mailbox with priority lanes.
+
+    Attributes:
+        lanes (int): Number of lanes.
+        priorities (dict): Lane of every message type with a registered priority.
+        default_priority (int): Lane of the other messages, the middle lane by default.
+        consumption (str): One of CONSUMPTION_POLICIES.
+        aging (float): Time in sec after which a queued message is promoted by one lane, up to
+            lane 1.
+        weights (list): Share of every lane with the 'weighted' policy.
+
+    Methods:
+        lane_of(item): Returns the lane of a message.
+        depths(): Returns the number of messages queued per lane.
+    """
+
+    STRICT = "strict"
+    WEIGHTED = "weighted"
+    CONSUMPTION_POLICIES = (STRICT, WEIGHTED)
+
+    def __init__(
+        self,
+        maxsize=MAILBOX_SIZE,
+        policy=BACKPRESSURE_POLICY,
+        lanes=3,
+        priorities=None,
+        default_priority=None,
+        consumption=PRIORITY_POLICY,
+        aging=PRIORITY_AGING,
+        weights=None,
+        **kwargs,
+    ):
+        """
+        Args:
+            maxsize (int): Capacity shared by all lanes.
+            policy (str): Backpressure policy, see Mailbox.
+            lanes (int): Number of lanes.
+            priorities (dict): Lane by message type, kept by reference so it can be updated.
+            default_priority (int): Lane of messages without priority, the middle lane if None.
+            consumption (str): 'strict' or 'weighted'.
+            aging (float): Time in sec after which a queued message is promoted by one lane.
+            weights (list): Share of every lane with 'weighted', halving from lane to lane if None.
+            **kwargs: Other Mailbox arguments.
+        """
+        if consumption not in self.CONSUMPTION_POLICIES:
+            raise ValueError(f"Unknown consumption policy '{consumption}'.")
+        if lanes < 1 or (weights is not None and len(weights) != lanes):
+            raise ValueError("A priority mailbox needs at least one lane and one weight per lane.")
+        self.lanes = lanes
+        self.priorities = priorities if priorities is not None else {}
+        self.default_priority = lanes // 2 if default_priority is None else default_priority
+        self.consumption = consumption
+        self.aging = aging
+        self.weights = list(weights) if weights is not None else [2**n for n in range(lanes)][::-1]
+        self._current = [0] * lanes
+        super().__init__(maxsize, policy, **kwargs)
+
+    def _init(self, maxsize):
+        self._queue = _Lanes(self.lanes)
+
+    def lane_of(self, item):
+        """
+        Returns the lane of a message.
+
+        Args:
+            item: The message.
+
+        Returns:
+            int: The lane, 0 being the highest priority.
+        """
+        priority = getattr(item, "priority", None)
+        if priority is None:
+            priority = self.priorities.get(getattr(item, "type", None), self.default_priority)
+        return min(max(priority, 0), self.lanes - 1)
+
+    def depths(self):
+        """
+        Returns:
+            list: Number of messages queued per lane.
+        """
+        return [len(lane) for lane in self._queue.lanes]
+
+    def _put(self, item):
+        self._queue.push(self.lane_of(item), (time.monotonic(), item))
+
+    def _get(self):
+        if self.consumption == self.STRICT:
+            lane = self._select_strict()
+        else:
+            lane = self._select_weighted()
+        return self._queue.pop(lane)[1]
+
+    def _select_strict(self):
+        now = time.monotonic()
+        selected = rank = None
+        for index, lane in enumerate(self._queue.lanes):
+            if lane:
+                # Note: the head of a lane is its oldest message, aging promotes it first.
+                enqueued_at = lane[0][0]
+                if self.aging:
+                    promoted = max(index - (now - enqueued_at) / self.aging, min(index, 1))
+                else:
+                    promoted = index
+                lane_rank = (promoted, enqueued_at)
+                if rank is None or lane_rank < rank:
+                    selected, rank = index, lane_rank
+        return selected
+
+    def _select_weighted(self):
+        current = self._current
+        selected, total = None, 0
+        for index, lane in enumerate(self._queue.lanes):
+            if lane:
+                current[index] += self.weights[index]
+                total += self.weights[index]
+                if selected is None or current[index] > current[selected]:
+                    selected = index
+        current[selected] -= total
+        return selected
+
+    def _evict(self):
+        for lane in reversed(range(self.lanes)):
+            if self._queue.lanes[lane]:
+                item = self._queue.pop(lane)[1]
+                self._messages -= message_count(item)
+                return item
@@ -0,0 +1,279 @@
+"""
+agents/profiler.py
+
+This module holds opt-in profiling tools to find out which handler or behavior blocks the event
+loop.
+
+1. Call Profiler:
+   - Attached to agents, it times every handler and behavior call and keeps per-callable stats.
+   - A watchdog thread samples the stack of the event loop thread while a call runs longer than
+     the threshold, slow calls are recorded with their message type, agent id and stack sample.
+   - report() returns the top-N callables on demand.
+
+2. Loop Lag Monitor:
+   - Continuously measures how late the event loop wakes up from a short sleep.
+   - Optionally runs a cProfile capture of the event loop thread when the lag spikes.
+"""
+
+import asyncio
+import cProfile
+import io
+import itertools
+import logging
+import pstats
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from configs.config import (
+    LOOP_LAG_CAPTURE,
+    LOOP_LAG_INTERVAL,
+    LOOP_LAG_SPIKE,
+    PROFILER_SLOW_THRESHOLD,
+    PROFILER_STACK_SAMPLES,
+    PROFILER_TOP_N,
+)
+from lib.metrics import LatencyHistogram
+
+
+def _callable_name(func):
+    func = getattr(func, "__func__", func)
+    return getattr(func, "__qualname__", None) or repr(func)
+
+
+def _callable_code(func):
+    func = getattr(func, "__func__", func)
+    return getattr(func, "__code__", None)
+
+
+class CallStats:
+    """
+    Timing stats of a single handler or behavior.
+
+    Attributes:
+        name (str): Qualified name of the callable.
+        count (int): Number of calls.
+        total (float): Total run time in sec.
+        max (float): Longest run time in sec.
+        slow (int): Number of calls over the threshold.
+        samples (deque): Last slow calls with message type, agent id, run time and stack.
+    """
+
+    def __init__(self, name, max_samples):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+        self.samples = deque(maxlen=max_samples)
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "slow": self.slow,
+            "samples": list(self.samples),
+        }
+
+
+class CallProfiler:
+    """
+    Times handler and behavior calls of the attached agents and records the slow ones.
+
+    Attributes:
+        threshold (float): Run time in sec from which a call is recorded as slow.
+        top_n (int): Default number of callables in a report.
+        max_samples (int): Slow calls kept per callable.
+
+    Methods:
+        attach(agent): Starts profiling the calls of an agent.
+        detach(agent): Stops profiling the calls of an agent.
+        enter(func, message, agent): Marks the start of a call, returns a token.
+        exit(token): Marks the end of a call.
+        report(top_n, sort_by): Returns the stats of the top-N callables.
+        stop(): Stops the watchdog thread.
+    """
+
+    def __init__(
+        self,
+        threshold=PROFILER_SLOW_THRESHOLD,
+        top_n=PROFILER_TOP_N,
+        max_samples=PROFILER_STACK_SAMPLES,
+    ):
+        self.threshold = threshold
+        self.top_n = top_n
+        self.max_samples = max_samples
+        self._stats = {}
+        self._running = {}
+        self._stacks = {}
+        self._tokens = itertools.count()
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def attach(self, agent):
+        agent.profiler = self
+        self._loop_thread = threading.get_ident()
+        if self._watchdog is None:
+            self._stop.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="agent-profiler", daemon=True
+            )
+            self._watchdog.start()
+
+    def detach(self, agent):
+        if getattr(agent, "profiler", None) is self:
+            agent.profiler = None
+
+    def stop(self):
+        self._stop.set()
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    def enter(self, func, message=None, agent=None):
+        token = next(self._tokens)
+        self._running[token] = (func, message, agent, time.perf_counter())
+        return token
+
+    def exit(self, token):
+        func, message, agent, started = self._running.pop(token)
+        elapsed = time.perf_counter() - started
+        stack = self._stacks.pop(token, None)
+
+        name = _callable_name(func)
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = CallStats(name, self.max_samples)
+        stats.count += 1
+        stats.total += elapsed
+        if elapsed > stats.max:
+            stats.max = elapsed
+        if elapsed >= self.threshold:
+            stats.slow += 1
+            stats.samples.append(
+                {
+                    "elapsed": elapsed,
+                    "message_type": getattr(message, "type", None),
+                    "agent_id": getattr(agent, "agent_id", None),
+                    "stack": stack,
+                }
+            )
+        return elapsed
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            now = time.perf_counter()
+            overdue = [
+                (token, func)
+                for token, (func, _, _, started) in list(self._running.items())
+                if now - started >= self.threshold and token not in self._stacks
+            ]
+            if not overdue:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            codes = set()
+            cursor = frame
+            while cursor is not None:
+                codes.add(cursor.f_code)
+                cursor = cursor.f_back
+            stack = "".join(traceback.format_stack(frame))
+            # Note: the stack is attributed to the calls whose code is on it, if any.
+            for token, func in overdue:
+                if _callable_code(func) in codes or len(overdue) == 1:
+                    self._stacks[token] = stack
+
+    def report(self, top_n=None, sort_by="total"):
+        """
+        Returns the stats of the callables with the highest 'sort_by' value.
+
+        Args:
+            top_n (int): Number of callables, by default 'top_n' of the profiler.
+            sort_by (str): 'total', 'max', 'mean', 'count' or 'slow'.
+
+        Returns:
+            list: Stats dict per callable.
+        """
+        stats = [entry.as_dict() for entry in self._stats.values()]
+        stats.sort(key=lambda entry: entry[sort_by], reverse=True)
+        return stats[: top_n or self.top_n]
+
+
+class LoopLagMonitor:
+    """
+    Measures the lag of the event loop, the time it wakes up late from a short sleep.
+
+    Attributes:
+        interval (float): Time in sec between two measurements.
+        spike (float): Lag in sec which triggers a cProfile capture, None to disable captures.
+        capture_duration (float): Length of a capture in sec.
+        lag (LatencyHistogram): Measured lags.
+        captures (deque): pstats reports of the last captures.
+
+    Methods:
+        run(): Measures the lag until cancelled.
+    """
+
+    def __init__(
+        self,
+        interval=LOOP_LAG_INTERVAL,
+        spike=LOOP_LAG_SPIKE,
+        capture_duration=LOOP_LAG_CAPTURE,
+        max_captures=3,
+    ):
+        self.interval = interval
+        self.spike = spike
+        self.capture_duration = capture_duration
+        self.lag = LatencyHistogram()
+        self.last_lag = 0.0
+        self.captures = deque(maxlen=max_captures)
+        self._capture_task = None
+
+    async def run(self):
+        """
+        Measures the lag until cancelled.
+
+        Returns:
+            None
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                self.last_lag = max(0.0, loop.time() - expected)
+                self.lag.record(self.last_lag)
+                if self.spike is not None and self.last_lag >= self.spike:
+                    logging.warning("Event loop lag spike of %.3f sec.", self.last_lag)
+                    if self._capture_task is None or self._capture_task.done():
+                        self._capture_task = asyncio.create_task(self._capture())
+            except asyncio.CancelledError:
+                logging.info("Loop lag monitor task cancelled.")
+                if self._capture_task is not None:
+                    self._capture_task.cancel()
+                break
+            except Exception as e:
+                logging.exception(f"Error monitoring loop lag: {e}")
+
+    async def _capture(self):
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            await asyncio.sleep(self.capture_duration)
+        finally:
+            profile.disable()
+            output = io.StringIO()
+            pstats.Stats(profile, stream=output).sort_stats("cumulative").print_stats(20)
+            self.captures.append(output.getvalue())
+
+    def snapshot(self):
+        snapshot = self.lag.snapshot()
+        snapshot["last"] = self.last_lag
+        return snapshot
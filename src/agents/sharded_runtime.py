@@ -0,0 +1,421 @@
+"""
+agents/sharded_runtime.py
+
+This module holds a runtime which splits agents across a pool of worker processes (shards),
+each running its own event loop, so CPU-heavy handlers can use all cores.
+
+1. Sharding:
+   - Every agent gets a global index, shard 's' hosts the indexes
+     [s * agents_per_shard, (s + 1) * agents_per_shard).
+   - A topology function maps the global index of an agent to the global index of its peer.
+
+2. Transparent Routing:
+   - The outbox of every agent is replaced with a ShardOutbox, so emit_message() is unchanged.
+     Messages for a local peer go straight into its inbox, messages for a remote peer are
+     buffered per shard and sent in batched frames.
+   - Handlers are registered by the agents themselves inside the worker, so
+     register_message_handler() works the same as in a single process.
+
+3. IPC:
+   - Every ordered pair of shards is connected by a pipe driven by asyncio streams, with
+     flow control through StreamWriter.drain().
+   - Frames carry the target indexes followed by a MessageCodec batch, no pickling is
+     involved on the data path.
+   - The buffer of every remote shard holds at most 'max_buffered' messages, further messages
+     are dropped and counted like messages dropped by a full inbox. A frame which cannot be
+     sent is logged and its messages counted as dropped, the flusher keeps running.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import time
+from multiprocessing.connection import Connection
+
+from configs.config import (
+    MAILBOX_SIZE,
+    SHARD_FLUSH_INTERVAL,
+    SHARD_FRAME_BATCH_SIZE,
+    SHARD_ID_SPAN,
+)
+from lib.id_allocator import IdAllocator
+from models.codec import MessageCodec
+from models.message import Message
+from models.message_batch import MessageBatch
+
+from .behavior_scheduler import BehaviorScheduler
+from .mailbox import message_count
+
+FRAME_HEADER = struct.Struct("!II")
+CODEC = MessageCodec()
+
+
+def ring_peer(global_index, total):
+    """
+    Topology function wiring agents in a ring across all shards.
+
+    Args:
+        global_index (int): Global index of the emitting agent.
+        total (int): Total number of agents.
+
+    Returns:
+        int: Global index of the peer.
+    """
+    return (global_index + 1) % total
+
+
+def encode_frame(entries):
+    """
+    Packs (target local index, message) pairs into a single frame, the targets are followed by
+    the messages encoded as one MessageCodec batch.
+
+    Args:
+        entries (list): The (int, Message) pairs.
+
+    Returns:
+        bytes: The frame.
+    """
+    targets = struct.pack(f"!{len(entries)}I", *(target for target, _ in entries))
+    messages = CODEC.encode_batch([message for _, message in entries])
+    return FRAME_HEADER.pack(len(targets) + len(messages), len(entries)) + targets + messages
+
+
+def decode_frame(count, payload):
+    """
+    Unpacks the payload of a frame produced by encode_frame().
+
+    Args:
+        count (int): Number of entries in the frame.
+        payload (bytes): The frame without its header.
+
+    Returns:
+        list: The (target local index, Message) pairs.
+    """
+    view = memoryview(payload)
+    targets = struct.unpack_from(f"!{count}I", view)
+    messages = CODEC.decode_batch(view[4 * count :])
+    return list(zip(targets, messages, strict=True))
+
+
+class ShardOutbox:
+    """
+    Queue-like outbox which hands every message to the ShardRouter for a fixed peer.
+
+    Attributes:
+        router (ShardRouter): The router of the shard.
+        peer (int): Global index of the peer agent.
+    """
+
+    def __init__(self, router, peer):
+        self.router = router
+        self.peer = peer
+
+    def full(self):
+        return False
+
+    def empty(self):
+        return True
+
+    def qsize(self):
+        return 0
+
+    def put_nowait(self, message):
+        self.router.route(self.peer, message)
+
+    async def put(self, message):
+        self.put_nowait(message)
+
+
+class ShardRouter:
+    """
+    Routes messages of a shard to local inboxes or to the pipes of remote shards.
+
+    Attributes:
+        shard_id (int): Index of this shard.
+        agents_per_shard (int): Number of agents hosted by every shard.
+        agents (list): Agents hosted by this shard, by local index.
+        max_buffered (int): Max messages buffered per remote shard.
+        local (int): Number of messages delivered to local inboxes.
+        sent (int): Number of messages sent to remote shards.
+        received (int): Number of messages received from remote shards.
+        dropped (int): Number of messages dropped as the target inbox or the buffer of the
+            target shard was full, or as their frame could not be sent.
+    """
+
+    def __init__(self, shard_id, agents_per_shard, writers, max_buffered=MAILBOX_SIZE):
+        self.shard_id = shard_id
+        self.agents_per_shard = agents_per_shard
+        self.max_buffered = max_buffered
+        self.agents = []
+        self.local = 0
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self._writers = writers
+        self._buffers = {shard: [] for shard in writers}
+        self._flush_event = asyncio.Event()
+
+    def route(self, global_index, message):
+        """
+        Delivers a message to the agent with the given global index.
+
+        Args:
+            global_index (int): Global index of the target agent.
+            message (class Message or MessageBatch): The message, a batch is delivered as a whole
+                to a local inbox and split into messages for a remote shard.
+
+        Returns:
+            None
+        """
+        shard, local_index = divmod(global_index, self.agents_per_shard)
+        if shard == self.shard_id:
+            if self._deliver(local_index, message):
+                self.local += message_count(message)
+            return
+        buffer = self._buffers[shard]
+        if isinstance(message, MessageBatch):
+            room = max(self.max_buffered - len(buffer), 0)
+            buffer.extend((local_index, item) for item in itertools.islice(message, room))
+            self.dropped += max(len(message) - room, 0)
+        elif len(buffer) < self.max_buffered:
+            buffer.append((local_index, message))
+        else:
+            self.dropped += 1
+        if len(buffer) >= SHARD_FRAME_BATCH_SIZE:
+            self._flush_event.set()
+
+    def _deliver(self, local_index, message):
+        try:
+            self.agents[local_index].inbox.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += message_count(message)
+            return False
+
+    async def run_flusher(self):
+        """
+        Sends buffered messages to remote shards every SHARD_FLUSH_INTERVAL sec or as soon as
+        a buffer reaches SHARD_FRAME_BATCH_SIZE messages.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), SHARD_FLUSH_INTERVAL)
+            except TimeoutError:
+                pass
+            self._flush_event.clear()
+            for shard, buffer in self._buffers.items():
+                if not buffer:
+                    continue
+                self._buffers[shard] = []
+                writer = self._writers[shard]
+                try:
+                    writer.write(encode_frame(buffer))
+                    await writer.drain()
+                    self.sent += len(buffer)
+                except Exception as e:
+                    # Note: the frame may have been partly written, its messages count as lost.
+                    self.dropped += len(buffer)
+                    logging.error(f"Error sending frame to shard {shard}: {e}")
+
+    async def run_reader(self, reader):
+        """
+        Delivers the messages of frames received from a remote shard.
+
+        Args:
+            reader (asyncio.StreamReader): Stream of the pipe from the remote shard.
+        """
+        while True:
+            size, count = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+            for local_index, message in decode_frame(count, await reader.readexactly(size)):
+                self._deliver(local_index, message)
+            self.received += count
+
+    def stats(self):
+        return {
+            "shard": self.shard_id,
+            "agents": len(self.agents),
+            "local": self.local,
+            "sent": self.sent,
+            "received": self.received,
+            "dropped": self.dropped,
+        }
+
+
+async def _open_pipes(read_ends, write_ends):
+    # Note: Connection objects are only used to hand the pipe fds over to the worker process,
+    # the data path uses asyncio streams on duplicated fds.
+    loop = asyncio.get_running_loop()
+    readers = {}
+    for shard, connection in read_ends.items():
+        reader = asyncio.StreamReader()
+        pipe = os.fdopen(os.dup(connection.fileno()), "rb", 0)
+        await loop.connect_read_pipe(
+            lambda reader=reader: asyncio.StreamReaderProtocol(reader), pipe
+        )
+        readers[shard] = reader
+    writers = {}
+    for shard, connection in write_ends.items():
+        pipe = os.fdopen(os.dup(connection.fileno()), "wb", 0)
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, pipe)
+        writers[shard] = asyncio.StreamWriter(transport, protocol, None, loop)
+    return readers, writers
+
+
+async def _run_shard(
+    shard_id, num_shards, agents_per_shard, agent_factory, topology, pipes, control
+):
+    readers, writers = await _open_pipes(*pipes)
+    router = ShardRouter(shard_id, agents_per_shard, writers)
+    scheduler = BehaviorScheduler()
+    total = num_shards * agents_per_shard
+
+    Message.ID_ALLOCATOR = IdAllocator(start=shard_id * SHARD_ID_SPAN + 1)
+    for local_index in range(agents_per_shard):
+        agent = agent_factory()
+        global_index = shard_id * agents_per_shard + local_index
+        agent.outbox = ShardOutbox(router, topology(global_index, total))
+        agent.schedule_behaviors(scheduler)
+        router.agents.append(agent)
+
+    tasks = [asyncio.create_task(agent.consume_messages()) for agent in router.agents]
+    tasks.append(asyncio.create_task(scheduler.run()))
+    tasks.append(asyncio.create_task(router.run_flusher()))
+    tasks.extend(asyncio.create_task(router.run_reader(reader)) for reader in readers.values())
+
+    # Wait: for the stop request of the parent process.
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    loop.add_reader(control.fileno(), stop.set)
+    started = time.perf_counter()
+    await stop.wait()
+    loop.remove_reader(control.fileno())
+    control.recv_bytes()
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    stats = router.stats()
+    stats["elapsed"] = time.perf_counter() - started
+    control.send_bytes(json.dumps(stats).encode())
+
+
+def _shard_main(*args):
+    logging.getLogger().setLevel(logging.WARNING)
+    asyncio.run(_run_shard(*args))
+
+
+class ShardedRuntime:
+    """
+    Runs agents across a pool of worker processes, each with its own event loop.
+
+    Attributes:
+        agent_factory (callable): Creates an agent, called inside the worker process.
+        num_shards (int): Number of worker processes.
+        agents_per_shard (int): Number of agents hosted by every worker process.
+        topology (callable): Maps (global index, total) of an agent to the index of its peer.
+
+    Methods:
+        start(): Starts the worker processes.
+        stop(): Stops the worker processes, returns their stats.
+        run(duration): Runs the workers for 'duration' sec, returns their stats.
+    """
+
+    def __init__(
+        self,
+        agent_factory,
+        num_shards=None,
+        agents_per_shard=1,
+        topology=ring_peer,
+        mp_context=None,
+    ):
+        self.agent_factory = agent_factory
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.agents_per_shard = agents_per_shard
+        self.topology = topology
+        self._context = multiprocessing.get_context(mp_context)
+        self._processes = []
+        self._controls = []
+
+    def start(self):
+        """
+        Starts the worker processes, every ordered pair of shards is connected by a pipe.
+
+        Returns:
+            None
+        """
+        read_ends = [{} for _ in range(self.num_shards)]
+        write_ends = [{} for _ in range(self.num_shards)]
+        for source in range(self.num_shards):
+            for target in range(self.num_shards):
+                if source != target:
+                    read_fd, write_fd = os.pipe()
+                    read_ends[target][source] = Connection(read_fd, writable=False)
+                    write_ends[source][target] = Connection(write_fd, readable=False)
+
+        for shard_id in range(self.num_shards):
+            control, child_control = self._context.Pipe()
+            process = self._context.Process(
+                target=_shard_main,
+                args=(
+                    shard_id,
+                    self.num_shards,
+                    self.agents_per_shard,
+                    self.agent_factory,
+                    self.topology,
+                    (read_ends[shard_id], write_ends[shard_id]),
+                    child_control,
+                ),
+                daemon=True,
+            )
+            process.start()
+            self._processes.append(process)
+            self._controls.append(control)
+
+        # Close: pipe ends owned by the workers.
+        for ends in read_ends + write_ends:
+            for connection in ends.values():
+                connection.close()
+        logging.info(f"Started {self.num_shards} shards of {self.agents_per_shard} agents.")
+
+    def stop(self, timeout=10):
+        """
+        Stops the worker processes.
+
+        Args:
+            timeout (float): Max time in sec to wait for every worker.
+
+        Returns:
+            list: Stats dict of every shard.
+        """
+        stats = []
+        for control in self._controls:
+            control.send_bytes(b"stop")
+        for control, process in zip(self._controls, self._processes, strict=True):
+            if control.poll(timeout):
+                stats.append(json.loads(control.recv_bytes()))
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes, self._controls = [], []
+        return stats
+
+    def run(self, duration):
+        """
+        Runs the worker processes for 'duration' sec.
+
+        Args:
+            duration (float): Run time in sec.
+
+        Returns:
+            list: Stats dict of every shard.
+        """
+        self.start()
+        try:
+            time.sleep(duration)
+        finally:
+            stats = self.stop()
+        return stats
@@ -0,0 +1,171 @@
+"""
+agents/simulation.py
+
+This module holds a deterministic simulation runtime in which agents run against a virtual
+clock instead of the wall clock.
+
+1. Virtual Time:
+   - The event loop reads its time from a VirtualClock. Whenever the loop has nothing ready to
+     run, i.e. all agents are idle in asyncio.sleep() or waiting on empty inboxes, the clock
+     jumps straight to the next timer instead of waiting for it.
+   - Simulating an hour of traffic therefore takes as long as the CPU needs to handle it.
+   - Calls offloaded to threads or processes still take real time while the virtual clock may
+     advance, they are not part of the deterministic guarantees.
+
+2. Reproducibility:
+   - Agents get seeded random.Random instances derived from the simulation seed, and the
+     BehaviorScheduler jitter is seeded too, so two runs with the same seed are identical.
+"""
+
+import asyncio
+import random
+import selectors
+
+from .behavior_scheduler import BehaviorScheduler
+
+
+class VirtualClock:
+    """
+    Clock which only moves when advanced.
+
+    Attributes:
+        now (float): Current virtual time in sec.
+    """
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+
+class _VirtualSelector(selectors.BaseSelector):
+    """
+    Selector which advances the virtual clock by the timeout instead of blocking, as long as no
+    I/O is ready. Without any timer pending it blocks on real I/O, e.g. thread wake-ups.
+    """
+
+    def __init__(self, clock, selector=None):
+        self._clock = clock
+        self._selector = selector or selectors.DefaultSelector()
+
+    def register(self, fileobj, events, data=None):
+        return self._selector.register(fileobj, events, data)
+
+    def unregister(self, fileobj):
+        return self._selector.unregister(fileobj)
+
+    def modify(self, fileobj, events, data=None):
+        return self._selector.modify(fileobj, events, data)
+
+    def get_map(self):
+        return self._selector.get_map()
+
+    def close(self):
+        self._selector.close()
+
+    def select(self, timeout=None):
+        ready = self._selector.select(0)
+        if ready or timeout is not None and timeout <= 0:
+            return ready
+        if timeout is None:
+            return self._selector.select(None)
+        self._clock.advance(timeout)
+        return []
+
+
+class VirtualTimeEventLoop(asyncio.SelectorEventLoop):
+    """
+    Event loop running on a VirtualClock.
+
+    Attributes:
+        clock (VirtualClock): The clock.
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or VirtualClock()
+        super().__init__(selector=_VirtualSelector(self.clock))
+
+    def time(self):
+        return self.clock.time()
+
+
+class Simulation:
+    """
+    Runs agents deterministically on a virtual clock.
+
+    Attributes:
+        seed (int): Seed all randomness of the simulation is derived from.
+        clock (VirtualClock): The virtual clock, shared by every run of the simulation.
+        scheduler (BehaviorScheduler): Scheduler driving the behaviors on the virtual clock.
+
+    Methods:
+        seed_agent(agent): Gives an agent a seeded source of randomness.
+        run(main): Runs a coroutine on the virtual clock, returns its result.
+        run_agents(agents, duration): Runs agents for 'duration' virtual sec.
+    """
+
+    def __init__(self, seed=0, start=0.0, tick=None):
+        self.seed = seed
+        self.clock = VirtualClock(start)
+        kwargs = {"tick": tick} if tick is not None else {}
+        self.scheduler = BehaviorScheduler(seed=seed, clock=self.clock.time, **kwargs)
+        self._random = random.Random(seed)
+
+    def seed_agent(self, agent):
+        """
+        Gives an agent its own random.Random instance, seeded from the simulation seed in the
+        order agents are seeded.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+
+        Returns:
+            None
+        """
+        agent.random = random.Random(self._random.getrandbits(64))
+
+    def run(self, main):
+        """
+        Runs a coroutine on a VirtualTimeEventLoop.
+
+        Args:
+            main (coroutine): The coroutine.
+
+        Returns:
+            The result of the coroutine.
+        """
+        with asyncio.Runner(loop_factory=lambda: VirtualTimeEventLoop(self.clock)) as runner:
+            return runner.run(main)
+
+    def run_agents(self, agents, duration):
+        """
+        Seeds the agents, consumes their messages and runs their behaviors on the shared
+        scheduler for 'duration' virtual sec.
+
+        Args:
+            agents (list): The agents, already wired to each other.
+            duration (float): Virtual run time in sec.
+
+        Returns:
+            float: Virtual time at the end of the run.
+        """
+        for agent in agents:
+            self.seed_agent(agent)
+            agent.schedule_behaviors(self.scheduler)
+        return self.run(self._run_agents(agents, duration))
+
+    async def _run_agents(self, agents, duration):
+        tasks = [asyncio.create_task(agent.consume_messages()) for agent in agents]
+        tasks.append(asyncio.create_task(self.scheduler.run()))
+        await asyncio.sleep(duration)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for agent in agents:
+            agent.unschedule_behaviors()
+        return self.clock.time()
@@ -0,0 +1,485 @@
+"""
+agents/tcp_transport.py
+
+This module holds a TCP transport built on asyncio streams, so that agents running in different
+processes or on different hosts can exchange messages.
+
+1. Addressing:
+   - A transport exposes local inboxes under a name. remote(host, port, name) returns a
+     queue-like outbox for such an inbox, so emit_message() targets a remote agent unchanged.
+
+2. Connections:
+   - All outboxes towards the same host and port share one persistent connection of the pool of
+     the transport. A lost connection is re-established with exponential backoff and jitter,
+     buffered messages are kept meanwhile. Messages already written to a lost connection are
+     not resent, delivery is at-most-once.
+   - asyncio disables Nagle's algorithm on TCP sockets, the transport batches on its own:
+     messages are buffered per target and sent as one MessageCodec frame every
+     'flush_interval' sec or as soon as 'frame_batch_size' of them are pending.
+
+3. Flow Control:
+   - A sender requests credits for the messages it has buffered per target, the receiver grants
+     them out of the free capacity of the target inbox. A sender never sends more messages than
+     it holds credits for, the rest stays buffered and the outbox reports full() once
+     'max_pending' messages are buffered for a target. Messages of a MessageBatch beyond
+     'max_pending' are dropped and counted, as are messages which cannot be encoded.
+   - Credits are only held for buffered messages, so an idle sender cannot starve the others.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import struct
+
+from configs.config import (
+    TRANSPORT_BACKOFF_MAX,
+    TRANSPORT_BACKOFF_MIN,
+    TRANSPORT_CREDIT_INTERVAL,
+    TRANSPORT_FLUSH_INTERVAL,
+    TRANSPORT_FRAME_BATCH_SIZE,
+    TRANSPORT_MAX_PENDING,
+    TRANSPORT_WINDOW,
+)
+from models.codec import MessageCodec, decode_varint, encode_varint
+from models.message_batch import MessageBatch
+
+FRAME_HEADER = struct.Struct("!BI")
+CREDIT_HEADER = struct.Struct("!I")
+DATA = 1
+REQUEST = 2
+CREDIT = 3
+CODEC = MessageCodec()
+
+
+def pack_frame(kind, target, body=b""):
+    """
+    Packs a frame addressed to a named target.
+
+    Args:
+        kind (int): DATA, REQUEST or CREDIT.
+        target (str): Name of the target inbox.
+        body (bytes): Rest of the payload.
+
+    Returns:
+        bytes: The frame.
+    """
+    name = target.encode()
+    head = bytearray()
+    encode_varint(len(name), head)
+    head += name
+    return FRAME_HEADER.pack(kind, len(head) + len(body)) + head + body
+
+
+async def read_frame(reader):
+    """
+    Reads a frame packed by pack_frame().
+
+    Args:
+        reader (asyncio.StreamReader): The stream.
+
+    Returns:
+        tuple: The kind, the target and the rest of the payload as a memoryview.
+    """
+    kind, size = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+    payload = memoryview(await reader.readexactly(size))
+    length, offset = decode_varint(payload, 0)
+    return kind, str(payload[offset : offset + length], "utf-8"), payload[offset + length :]
+
+
+def _encodable(message):
+    try:
+        CODEC.encode_batch([message])
+    except Exception:
+        return False
+    return True
+
+
+class RemoteOutbox:
+    """
+    Queue-like outbox which sends everything put into it to a named inbox of a remote transport.
+
+    Attributes:
+        peer (RemotePeer): Connection to the remote transport.
+        target (str): Name of the remote inbox.
+    """
+
+    def __init__(self, peer, target):
+        self.peer = peer
+        self.target = target
+
+    def full(self):
+        return self.qsize() >= self.peer.transport.max_pending
+
+    def empty(self):
+        return not self.qsize()
+
+    def qsize(self):
+        return len(self.peer.pending.get(self.target, ()))
+
+    def put_nowait(self, message):
+        if self.full():
+            raise asyncio.QueueFull
+        self.peer.enqueue(self.target, message)
+
+    async def put(self, message):
+        self.put_nowait(message)
+
+
+class RemotePeer:
+    """
+    Persistent connection to a remote transport, shared by all outboxes towards it.
+
+    Attributes:
+        transport (TcpTransport): The local transport.
+        host (str): Host of the remote transport.
+        port (int): Port of the remote transport.
+        pending (dict): Messages buffered per target.
+        credits (dict): Messages which may still be sent per target.
+        requested (dict): Credits requested and not granted yet per target.
+        connected (bool): Whether the connection is currently established.
+        reconnects (int): Number of times the connection has been lost.
+        dropped (int): Number of messages dropped as their target buffer was full or as they
+            could not be encoded.
+    """
+
+    def __init__(self, transport, host, port):
+        self.transport = transport
+        self.host = host
+        self.port = port
+        self.pending = {}
+        self.credits = {}
+        self.requested = {}
+        self.connected = False
+        self.reconnects = 0
+        self.dropped = 0
+        self._writer = None
+        self._flush_event = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+
+    def enqueue(self, target, message):
+        """
+        Buffers a message for a target, it is sent once credits are available.
+
+        Args:
+            target (str): Name of the remote inbox.
+            message (class Message or MessageBatch): The message, a batch is sent message by
+                message and only as many of its messages as 'max_pending' allows are kept.
+
+        Returns:
+            int: Number of messages buffered.
+        """
+        pending = self.pending.get(target)
+        if pending is None:
+            pending = self.pending[target] = []
+            self.credits[target] = self.requested[target] = 0
+        room = max(self.transport.max_pending - len(pending), 0)
+        if isinstance(message, MessageBatch):
+            pending.extend(itertools.islice(message, room))
+            count = min(len(message), room)
+            self.dropped += len(message) - count
+        elif room:
+            pending.append(message)
+            count = 1
+        else:
+            self.dropped += 1
+            count = 0
+        if len(pending) >= self.transport.frame_batch_size and self.credits[target]:
+            self._flush_event.set()
+        return count
+
+    async def run(self):
+        """
+        Keeps the connection open, reconnecting with exponential backoff and jitter.
+        """
+        backoff = self.transport.backoff_min
+        while True:
+            try:
+                reader, writer = await asyncio.open_connection(self.host, self.port)
+            except OSError as e:
+                delay = random.uniform(backoff / 2, backoff)
+                logging.warning(
+                    "Cannot connect to %s:%s (%s), retrying in %.2f sec.",
+                    self.host,
+                    self.port,
+                    e,
+                    delay,
+                )
+                await asyncio.sleep(delay)
+                backoff = min(backoff * 2, self.transport.backoff_max)
+                continue
+
+            backoff = self.transport.backoff_min
+            self.connected = True
+            self._writer = writer
+            self.credits = dict.fromkeys(self.pending, 0)
+            self.requested = dict.fromkeys(self.pending, 0)
+            credit_task = asyncio.create_task(self._read_credits(reader))
+            try:
+                await self._send(writer, credit_task)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                logging.warning("Connection to %s:%s lost (%s).", self.host, self.port, e)
+            except Exception as e:
+                logging.exception("Error on connection to %s:%s: %s", self.host, self.port, e)
+            finally:
+                self.connected = False
+                self._writer = None
+                credit_task.cancel()
+                writer.close()
+            self.reconnects += 1
+
+    async def _read_credits(self, reader):
+        while True:
+            kind, target, body = await read_frame(reader)
+            if kind == CREDIT and target in self.credits:
+                (granted,) = CREDIT_HEADER.unpack(body)
+                self.credits[target] += granted
+                self.requested[target] -= granted
+                self._flush_event.set()
+
+    async def _send(self, writer, credit_task):
+        while True:
+            if credit_task.done():
+                # Check: the reader ends only when the connection is lost, re-raise its error.
+                credit_task.result()
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.transport.flush_interval)
+            except TimeoutError:
+                pass
+            self._flush_event.clear()
+            for target, pending in self.pending.items():
+                missing = len(pending) - self.credits[target] - self.requested[target]
+                if missing > 0:
+                    writer.write(pack_frame(REQUEST, target, CREDIT_HEADER.pack(missing)))
+                    self.requested[target] += missing
+                count = min(len(pending), self.credits[target])
+                if not count:
+                    continue
+                messages = pending[:count]
+                del pending[:count]
+                try:
+                    body = CODEC.encode_batch(messages)
+                except Exception as e:
+                    logging.error(f"Error encoding messages for '{target}': {e}")
+                    messages = [message for message in messages if _encodable(message)]
+                    # Skip: messages which cannot be encoded, they would fail on every send.
+                    self.dropped += count - len(messages)
+                    if not messages:
+                        continue
+                    body = CODEC.encode_batch(messages)
+                writer.write(pack_frame(DATA, target, body))
+                self.credits[target] -= len(messages)
+                self.transport.sent += len(messages)
+            await writer.drain()
+
+    async def close(self):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+
+class TcpTransport:
+    """
+    Exposes local inboxes over TCP and sends messages to inboxes of remote transports.
+
+    Attributes:
+        host (str): Host the server listens on.
+        port (int): Port the server listens on, 0 picks a free port on start().
+        endpoints (dict): Local inboxes by name.
+        peers (dict): Connections to remote transports by (host, port).
+        sent (int): Number of messages sent.
+        received (int): Number of messages received.
+        dropped (int): Number of received messages dropped as the target inbox was full.
+
+    Methods:
+        start(): Starts the server.
+        expose(name, queue): Makes a local inbox reachable under a name.
+        remote(host, port, name): Returns an outbox for a remote inbox.
+        connect(agent, host, port, name): Replaces the outbox of an agent with a remote outbox.
+        stats(): Returns the counters of the transport.
+        close(): Closes the server and all connections.
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        frame_batch_size=TRANSPORT_FRAME_BATCH_SIZE,
+        flush_interval=TRANSPORT_FLUSH_INTERVAL,
+        max_pending=TRANSPORT_MAX_PENDING,
+        window=TRANSPORT_WINDOW,
+        backoff_min=TRANSPORT_BACKOFF_MIN,
+        backoff_max=TRANSPORT_BACKOFF_MAX,
+    ):
+        """
+        Args:
+            host (str): Host the server listens on.
+            port (int): Port the server listens on, 0 picks a free port.
+            frame_batch_size (int): Pending messages of a target which trigger a send.
+            flush_interval (float): Max time in sec a message is buffered while credits allow.
+            max_pending (int): Max messages buffered per target before the outbox is full.
+            window (int): Credits granted for an unbounded inbox.
+            backoff_min (float): First delay in sec before reconnecting.
+            backoff_max (float): Max delay in sec before reconnecting.
+        """
+        self.host = host
+        self.port = port
+        self.frame_batch_size = frame_batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.window = window
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.endpoints = {}
+        self.peers = {}
+        self.sent = 0
+        self.received = 0
+        self.dropped = 0
+        self._server = None
+        self._outstanding = {}
+        self._connections = {}
+
+    async def start(self):
+        """
+        Starts the server.
+
+        Returns:
+            int: The port the server listens on.
+        """
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    def expose(self, name, queue):
+        """
+        Makes a local inbox reachable under a name.
+
+        Args:
+            name (str): The name.
+            queue (asyncio.Queue): The inbox.
+
+        Returns:
+            None
+        """
+        self.endpoints[name] = queue
+        self._outstanding.setdefault(name, 0)
+
+    def remote(self, host, port, name):
+        """
+        Returns an outbox for a remote inbox, must be called with a running event loop.
+
+        Args:
+            host (str): Host of the remote transport.
+            port (int): Port of the remote transport.
+            name (str): Name the remote inbox is exposed under.
+
+        Returns:
+            RemoteOutbox: The outbox.
+        """
+        peer = self.peers.get((host, port))
+        if peer is None:
+            peer = self.peers[(host, port)] = RemotePeer(self, host, port)
+        return RemoteOutbox(peer, name)
+
+    def connect(self, agent, host, port, name):
+        """
+        Replaces the outbox of an agent with an outbox for a remote inbox.
+
+        Args:
+            agent (AutonomousAgent): The agent.
+            host (str): Host of the remote transport.
+            port (int): Port of the remote transport.
+            name (str): Name the remote inbox is exposed under.
+
+        Returns:
+            None
+        """
+        agent.outbox = self.remote(host, port, name)
+
+    def _capacity(self, queue):
+        return queue.maxsize if queue.maxsize > 0 else self.window
+
+    def _grant(self, target, demand, granted, writer):
+        """
+        Grants the credits requested for a target inbox out of its free capacity, minus the
+        credits already granted to any sender.
+        """
+        queue = self.endpoints[target]
+        capacity = self._capacity(queue)
+        count = min(demand[target], capacity - queue.qsize() - self._outstanding[target])
+        # Note: small grants are deferred while the sender still holds credits.
+        if count <= 0 or (granted[target] > 0 and count < min(demand[target], capacity // 4)):
+            return
+        writer.write(pack_frame(CREDIT, target, CREDIT_HEADER.pack(count)))
+        demand[target] -= count
+        granted[target] += count
+        self._outstanding[target] += count
+
+    async def _refresh_credits(self, demand, granted, writer):
+        while True:
+            await asyncio.sleep(TRANSPORT_CREDIT_INTERVAL)
+            for target in demand:
+                self._grant(target, demand, granted, writer)
+
+    async def _serve(self, reader, writer):
+        demand, granted = {}, {}
+        self._connections[asyncio.current_task()] = writer
+        credit_task = asyncio.create_task(self._refresh_credits(demand, granted, writer))
+        try:
+            while True:
+                kind, target, body = await read_frame(reader)
+                queue = self.endpoints.get(target)
+                if queue is None:
+                    logging.warning("Received a frame for unknown target '%s'.", target)
+                    continue
+                if target not in demand:
+                    demand[target] = granted[target] = 0
+                if kind == REQUEST:
+                    demand[target] += CREDIT_HEADER.unpack(body)[0]
+                elif kind == DATA:
+                    messages = CODEC.decode_batch(body)
+                    granted[target] -= len(messages)
+                    self._outstanding[target] -= len(messages)
+                    for message in messages:
+                        try:
+                            queue.put_nowait(message)
+                        except asyncio.QueueFull:
+                            self.dropped += 1
+                    self.received += len(messages)
+                self._grant(target, demand, granted, writer)
+                await writer.drain()
+        except (OSError, asyncio.IncompleteReadError):
+            pass  # Skip: the sender closed the connection
+        finally:
+            credit_task.cancel()
+            for target, count in granted.items():
+                self._outstanding[target] -= count
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "dropped": self.dropped,
+            "connected": sum(peer.connected for peer in self.peers.values()),
+            "reconnects": sum(peer.reconnects for peer in self.peers.values()),
+            "send_dropped": sum(peer.dropped for peer in self.peers.values()),
+        }
+
+    async def close(self):
+        """
+        Closes the server, the accepted connections and the connections to remote transports.
+
+        Returns:
+            None
+        """
+        if self._server is not None:
+            self._server.close()
+        for writer in self._connections.values():
+            writer.close()
+        # Wait: for the connection handlers, they end once their stream is closed.
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        for peer in self.peers.values():
+            await peer.close()
+        if self._server is not None:
+            await self._server.wait_closed()
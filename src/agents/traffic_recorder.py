@@ -0,0 +1,346 @@
+"""
+agents/traffic_recorder.py
+
+This module holds a recorder which streams the messages exchanged by agents to a trace file, and
+a replayer which feeds a recorded trace back into a set of agents.
+
+1. Recording:
+   - Once enabled on an agent with enable_recording(), every message it emits and every message
+     it starts handling is recorded along with a timestamp, the event kind and the id of the
+     recording agent. Several agents can share one recorder.
+   - record() only appends to in-memory buffers. Buffered events are encoded and written as one
+     chunk every 'flush_interval' sec or as soon as 'buffer_size' of them are pending, so the
+     recorder can be left enabled in production.
+
+2. Trace File:
+   - The file starts with a magic and a version and is only ever appended to, a recorder opened
+     on an existing trace continues it.
+   - A chunk is a header (payload length, crc32) followed by: the wall time of its first event
+     in microseconds, the event count, the kind column, the time deltas in microseconds from
+     event to event, a string table of recording agent ids, an index column into it and the
+     messages as one MessageCodec frame. Integer columns are packed with 'array' at the
+     narrowest width holding their largest value.
+   - A torn chunk at the end of the file, e.g. after a crash, ends the trace.
+
+3. Replay:
+   - replay() puts the recorded messages into the inboxes (handled events) or outboxes (emitted
+     events) of the agents with the recorded agent ids.
+   - Messages are released at their original times divided by 'speed', relative to the start of
+     the replay, so the inter-arrival distribution of the trace is kept at any speed. With
+     'speed' None messages are replayed as fast as the queues accept them.
+"""
+
+import asyncio
+import itertools
+import struct
+import sys
+import time
+import zlib
+from array import array
+
+from configs.config import RECORDER_BUFFER_SIZE, RECORDER_FLUSH_INTERVAL
+from models.codec import MessageCodec, decode_varint, encode_varint
+from models.message import Message
+from models.message_batch import MessageBatch
+
+FILE_HEADER = struct.Struct("!4sB")
+CHUNK_HEADER = struct.Struct("!II")
+MAGIC = b"AGTR"
+VERSION = 1
+EMITTED = 0
+HANDLED = 1
+_WIDTHS = {1: "B", 2: "H", 4: "I", 8: "Q"}
+
+
+def _packed_column(values):
+    """
+    Packs integers as a width byte followed by a little endian array of the narrowest width
+    holding them all.
+    """
+    largest = max(values, default=0)
+    width = 1 if largest < 1 << 8 else 2 if largest < 1 << 16 else 4 if largest < 1 << 32 else 8
+    column = array(_WIDTHS[width], values)
+    if sys.byteorder != "little":
+        column.byteswap()
+    return bytes((width,)) + column.tobytes()
+
+
+def _read_packed_column(view, offset, count):
+    width = view[offset]
+    offset += 1
+    end = offset + width * count
+    column = array(_WIDTHS[width])
+    column.frombytes(view[offset:end])
+    if sys.byteorder != "little":
+        column.byteswap()
+    return column.tolist(), end
+
+
+class TrafficRecorder:
+    """
+    Buffers message events and appends them to a trace file in chunks.
+
+    Attributes:
+        path (str): Path of the trace file.
+        buffer_size (int): Max number of buffered events before they are written.
+        flush_interval (float): Max time in sec an event stays buffered.
+        recorded (int): Number of events recorded.
+        skipped (int): Number of items which were not messages and were not recorded.
+        chunks (int): Number of chunks written.
+        bytes_written (int): Number of bytes written, file header included.
+
+    Methods:
+        record(kind, agent_id, message): Records an event.
+        flush(): Writes the buffered events.
+        stats(): Returns the counters.
+        close(): Flushes and closes the trace file.
+    """
+
+    def __init__(
+        self,
+        path,
+        buffer_size=RECORDER_BUFFER_SIZE,
+        flush_interval=RECORDER_FLUSH_INTERVAL,
+        clock=time.monotonic,
+        wall_clock=time.time,
+    ):
+        self.path = path
+        self.buffer_size = max(1, buffer_size)
+        self.flush_interval = flush_interval
+        self.recorded = 0
+        self.skipped = 0
+        self.chunks = 0
+        self.bytes_written = 0
+        self._clock = clock
+        self._codec = MessageCodec()
+        # Note: event times are taken from 'clock' and anchored once to the wall clock, so they
+        # stay monotonic within a recording and comparable across recordings.
+        self._epoch = wall_clock() - clock()
+        self._events = []
+        self._pending = 0
+        self._flush_handle = None
+        self._file = open(path, "ab")
+        if not self._file.tell():
+            self._write(FILE_HEADER.pack(MAGIC, VERSION))
+
+    def _write(self, data):
+        self._file.write(data)
+        self.bytes_written += len(data)
+
+    def record(self, kind, agent_id, message):
+        """
+        Records an event, a MessageBatch is recorded as one event per message.
+
+        Args:
+            kind (int): EMITTED or HANDLED.
+            agent_id (str): Id of the recording agent.
+            message (class Message or MessageBatch): The message.
+
+        Returns:
+            None
+        """
+        if isinstance(message, Message):
+            count = 1
+        elif isinstance(message, MessageBatch):
+            count = len(message)
+            if not count:
+                return  # Skip: nothing to record
+        else:
+            self.skipped += 1
+            return
+        self._events.append((self._clock(), kind, agent_id, message))
+        self._pending += count
+        self.recorded += count
+        if self._pending >= self.buffer_size:
+            self.flush()
+        elif len(self._events) == 1:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Skip: without a loop events are written by flush() or close()
+        self._flush_handle = loop.call_later(self.flush_interval, self.flush)
+
+    def _encode_chunk(self):
+        messages, kinds, times, agent_indexes = [], bytearray(), [], []
+        agents = {}
+        for when, kind, agent_id, item in self._events:
+            index = agents.setdefault(agent_id, len(agents))
+            when = round(when * 1e6)
+            if isinstance(item, MessageBatch):
+                count = len(item)
+                messages.extend(item)
+                kinds += bytes((kind,)) * count
+                times += [when] * count
+                agent_indexes += [index] * count
+            else:
+                messages.append(item)
+                kinds.append(kind)
+                times.append(when)
+                agent_indexes.append(index)
+
+        deltas = [current - previous for previous, current in itertools.pairwise(times)]
+        payload = bytearray()
+        encode_varint(round(self._epoch * 1e6) + times[0], payload)
+        encode_varint(len(messages), payload)
+        payload += kinds
+        payload += _packed_column(deltas)
+        encode_varint(len(agents), payload)
+        for agent_id in agents:
+            data = ("" if agent_id is None else str(agent_id)).encode()
+            encode_varint(len(data), payload)
+            payload += data
+        payload += _packed_column(agent_indexes)
+        payload += self._codec.encode_batch(messages)
+        return payload
+
+    def flush(self):
+        """
+        Encodes the buffered events and writes them as one chunk.
+
+        Returns:
+            None
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._events or self._file.closed:
+            return
+        payload = self._encode_chunk()
+        self._events = []
+        self._pending = 0
+        self._write(CHUNK_HEADER.pack(len(payload), zlib.crc32(payload)))
+        self._write(payload)
+        # Note: the chunk is handed to the OS, it survives a crash of the process.
+        self._file.flush()
+        self.chunks += 1
+
+    def stats(self):
+        return {
+            "recorded": self.recorded,
+            "skipped": self.skipped,
+            "buffered": self._pending,
+            "chunks": self.chunks,
+            "bytes_written": self.bytes_written,
+        }
+
+    def close(self):
+        """
+        Flushes and closes the trace file, the recorder must not be used afterwards.
+
+        Returns:
+            None
+        """
+        self.flush()
+        self._file.close()
+
+
+class TrafficReplayer:
+    """
+    Reads a trace file and feeds its messages back into agents.
+
+    Attributes:
+        path (str): Path of the trace file.
+
+    Methods:
+        events(): Yields the recorded events.
+        replay(agents, speed, kind): Puts the recorded messages into the agents.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._codec = MessageCodec()
+
+    def _chunks(self):
+        # Note: the trace is read one chunk at a time, only one chunk is held in memory.
+        with open(self.path, "rb") as trace:
+            header = trace.read(FILE_HEADER.size)
+            if len(header) < FILE_HEADER.size or FILE_HEADER.unpack(header) != (MAGIC, VERSION):
+                raise ValueError(f"'{self.path}' is not a trace file.")
+            while len(header := trace.read(CHUNK_HEADER.size)) == CHUNK_HEADER.size:
+                length, checksum = CHUNK_HEADER.unpack(header)
+                payload = trace.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    # Check: a torn chunk at the end of the trace ends it.
+                    return
+                yield memoryview(payload)
+
+    def _decode_chunk(self, payload):
+        started, offset = decode_varint(payload, 0)
+        count, offset = decode_varint(payload, offset)
+        kinds = payload[offset : offset + count].tolist()
+        offset += count
+        deltas, offset = _read_packed_column(payload, offset, count - 1)
+        times = list(itertools.accumulate(deltas, initial=started))
+        size, offset = decode_varint(payload, offset)
+        agents = []
+        for _ in range(size):
+            length, offset = decode_varint(payload, offset)
+            agents.append(str(payload[offset : offset + length], "utf-8"))
+            offset += length
+        agent_indexes, offset = _read_packed_column(payload, offset, count)
+        messages = self._codec.decode_batch(payload[offset:])
+        return zip(
+            [when / 1e6 for when in times],
+            kinds,
+            [agents[index] for index in agent_indexes],
+            messages,
+            strict=True,
+        )
+
+    def events(self):
+        """
+        Yields the recorded events in recording order.
+
+        Yields:
+            tuple: Wall time in sec, kind (EMITTED or HANDLED), recording agent id and message.
+        """
+        for payload in self._chunks():
+            yield from self._decode_chunk(payload)
+
+    async def replay(self, agents, speed=1.0, kind=HANDLED):
+        """
+        Puts the recorded messages of one kind into the agents with the recorded agent ids,
+        handled messages into their inbox and emitted messages into their outbox.
+
+        Args:
+            agents (iterable or dict): The agents, or agents by agent id.
+            speed (float): Replay speed, 2.0 replays twice as fast as recorded, None as fast as
+                possible.
+            kind (int): HANDLED or EMITTED.
+
+        Returns:
+            dict: Number of messages replayed, of messages skipped as their agent is not among
+            'agents', and duration of the replay in sec.
+        """
+        if not isinstance(agents, dict):
+            agents = {str(agent.agent_id): agent for agent in agents}
+        queues = {
+            agent_id: agent.inbox if kind == HANDLED else agent.outbox
+            for agent_id, agent in agents.items()
+        }
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        first = None
+        replayed = skipped = 0
+        for when, event_kind, agent_id, message in self.events():
+            if event_kind != kind:
+                continue
+            queue = queues.get(agent_id)
+            if queue is None:
+                skipped += 1
+                continue
+            if first is None:
+                first = when
+            if speed:
+                delay = started + (when - first) / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            elif not replayed % RECORDER_BUFFER_SIZE:
+                # Yield: to the consumers now and then when replaying at max speed.
+                await asyncio.sleep(0)
+            await queue.put(message)
+            replayed += 1
+        return {"replayed": replayed, "skipped": skipped, "duration": loop.time() - started}
@@ -0,0 +1,240 @@
+"""benchmarks/agent_benchmark.py
+Measures throughput, end-to-end latency, peak RSS and event loop lag of agents wired in a
+configurable topology and driven at a configurable message rate.
+
+Results are written as JSON, together with the git commit they were measured on, so that they
+can be compared across commits.
+
+Usage:
+    python -m benchmarks.agent_benchmark --scenario hundred_agents --output results.json
+    python -m benchmarks.agent_benchmark --scenario two_agents --rate 5000 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from agents.behavior_scheduler import BehaviorScheduler
+from agents.concrete_agent import ConcreteAgent
+from agents.message_bus import MessageBus
+from agents.profiler import LoopLagMonitor
+from configs.config import ALPHABET
+from models.message import Message
+
+SCENARIOS = {
+    "two_agents": {"agents": 2, "topology": "ring", "rate": 1000, "duration": 5.0},
+    "hundred_agents": {"agents": 100, "topology": "ring", "rate": 10000, "duration": 5.0},
+    "ten_thousand_agents": {"agents": 10000, "topology": "ring", "rate": 20000, "duration": 10.0},
+    "fan_out": {"agents": 101, "topology": "fan_out", "rate": 500, "duration": 5.0},
+}
+TOPOLOGIES = ("ring", "full_mesh", "star", "fan_out")
+CONSUME_INTERVAL = 0.001
+SCHEDULER_TICK = 0.01
+LATENCY_SAMPLES = 100000
+
+
+class LatencyRecorder:
+    """
+    Keeps the send time of messages in flight and a reservoir sample of end-to-end latencies.
+
+    Attributes:
+        delivered (int): Number of deliveries handled by receivers.
+        latencies (list): Sampled latencies in sec.
+    """
+
+    def __init__(self, max_samples=LATENCY_SAMPLES, seed=0):
+        self.delivered = 0
+        self.latencies = []
+        self.max_samples = max_samples
+        self._in_flight = {}
+        self._random = random.Random(seed)
+
+    def sent(self, message, deliveries):
+        self._in_flight[id(message)] = [time.perf_counter(), deliveries, message]
+
+    def received(self, message):
+        entry = self._in_flight.get(id(message))
+        if entry is None:
+            return
+        latency = time.perf_counter() - entry[0]
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._in_flight[id(message)]
+
+        self.delivered += 1
+        if len(self.latencies) < self.max_samples:
+            self.latencies.append(latency)
+        else:
+            index = self._random.randrange(self.delivered)
+            if index < self.max_samples:
+                self.latencies[index] = latency
+
+    def percentiles(self, *quantiles):
+        ordered = sorted(self.latencies)
+        if not ordered:
+            return [0.0] * len(quantiles)
+        return [ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)] for q in quantiles]
+
+
+class BenchAgent(ConcreteAgent):
+    """
+    ConcreteAgent which emits 'burst' messages per behavior run and records their latency.
+    """
+
+    def __init__(self, recorder, burst=1, deliveries=1, emitting=True):
+        super().__init__()
+        self.recorder = recorder
+        self.burst = burst
+        self.deliveries = deliveries
+        self.emitting = emitting
+        self.consume_interval = CONSUME_INTERVAL
+        self.register_message_handler(self.msg_type, self.handle_bench_message)
+
+    async def handle_bench_message(self, message):
+        # Note: messages containing "hello" are still logged by the inherited content handler.
+        self.recorder.received(message)
+
+    async def generate_random_message(self):
+        if not self.emitting:
+            return
+        for _ in range(self.burst):
+            content = " ".join(random.sample(ALPHABET, 2))
+            message = Message(self.agent_id, type=self.msg_type, content=content)
+            self.recorder.sent(message, self.deliveries)
+            await self.emit_message(message)
+
+
+def _wire(bus, agents, topology):
+    if topology == "ring":
+        bus.ring(agents)
+    elif topology == "full_mesh":
+        bus.full_mesh(agents)
+    else:
+        bus.star(agents[0], agents[1:])
+
+
+def _deliveries(topology, agents, index):
+    if topology == "full_mesh":
+        return agents - 1
+    if topology in ("star", "fan_out") and index == 0:
+        return agents - 1
+    return 1
+
+
+async def run_scenario(agents, topology, rate, duration):
+    """
+    Runs a scenario.
+
+    Args:
+        agents (int): Number of agents.
+        topology (str): One of TOPOLOGIES, with 'fan_out' only the hub of a star emits.
+        rate (float): Total number of messages emitted per sec.
+        duration (float): Run time in sec.
+
+    Returns:
+        dict: The measurements.
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology '{topology}'.")
+    emitters = 1 if topology == "fan_out" else agents
+    per_emitter = rate / emitters
+    interval = max(SCHEDULER_TICK, 1.0 / per_emitter)
+    burst = max(1, round(per_emitter * interval))
+
+    recorder = LatencyRecorder()
+    setup_started = time.perf_counter()
+    population = [
+        BenchAgent(
+            recorder,
+            burst=burst,
+            deliveries=_deliveries(topology, agents, index),
+            emitting=topology != "fan_out" or index == 0,
+        )
+        for index in range(agents)
+    ]
+    _wire(MessageBus(), population, topology)
+    scheduler = BehaviorScheduler(tick=SCHEDULER_TICK)
+    for agent in population:
+        agent.behavior_interval = interval
+        agent.schedule_behaviors(scheduler, jitter=interval)
+    setup_time = time.perf_counter() - setup_started
+
+    monitor = LoopLagMonitor(interval=0.01, spike=None)
+    tasks = [asyncio.create_task(agent.consume_messages()) for agent in population]
+    tasks.append(asyncio.create_task(scheduler.run()))
+    tasks.append(asyncio.create_task(monitor.run()))
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - started
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    for agent in population:
+        agent.close()
+
+    p50, p99, p999 = recorder.percentiles(0.5, 0.99, 0.999)
+    lag = monitor.snapshot()
+    return {
+        "setup_sec": setup_time,
+        "elapsed_sec": elapsed,
+        "delivered": recorder.delivered,
+        "msgs_per_sec": recorder.delivered / elapsed,
+        "latency_p50_ms": p50 * 1000,
+        "latency_p99_ms": p99 * 1000,
+        "latency_p999_ms": p999 * 1000,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "loop_lag_p99_ms": lag["p99"] * 1000,
+        "loop_lag_max_ms": lag["max"] * 1000,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="two_agents")
+    parser.add_argument("--agents", type=int)
+    parser.add_argument("--topology", choices=TOPOLOGIES)
+    parser.add_argument("--rate", type=float)
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--output", help="JSON file the result is appended to.")
+    args = parser.parse_args()
+
+    config = dict(SCENARIOS[args.scenario])
+    for name in ("agents", "topology", "rate", "duration"):
+        if getattr(args, name) is not None:
+            config[name] = getattr(args, name)
+
+    logging.basicConfig(level=logging.WARNING)
+    result = {
+        "scenario": args.scenario,
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "config": config,
+        "results": asyncio.run(run_scenario(**config)),
+    }
+    print(json.dumps(result, indent=2))
+    if args.output:
+        with open(args.output, "a") as output:
+            output.write(json.dumps(result) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
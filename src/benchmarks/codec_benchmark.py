@@ -0,0 +1,88 @@
+"""benchmarks/codec_benchmark.py
+Compares the MessageCodec with pickle and JSON on a batch of random messages.
+
+Reports encode and decode time along with the encoded size of the whole batch.
+
+Usage:
+    python -m benchmarks.codec_benchmark --messages 100000
+"""
+
+import argparse
+import json
+import pickle
+import random
+import sys
+import time
+
+from configs.config import ALPHABET
+from models.codec import MessageCodec
+from models.message import Message
+
+
+def _messages(count, agents, seed):
+    rng = random.Random(seed)
+    agent_ids = [f"agent_{index}" for index in range(1, agents + 1)]
+    return [
+        Message(
+            agent_id=rng.choice(agent_ids),
+            type=rng.choice(("custom", "default")),
+            content=" ".join(rng.sample(ALPHABET, 2)),
+        )
+        for _ in range(count)
+    ]
+
+
+def _timed(function, argument):
+    started = time.perf_counter()
+    result = function(argument)
+    return result, time.perf_counter() - started
+
+
+def _as_json(messages):
+    return json.dumps([[m.agent_id, m.type, m.content] for m in messages]).encode()
+
+
+def _from_json(data):
+    return [Message.from_fields(*fields) for fields in json.loads(data)]
+
+
+def run(count, agents=8, seed=0):
+    """
+    Encodes and decodes the same batch with every format.
+
+    Args:
+        count (int): Number of messages.
+        agents (int): Number of distinct agent ids.
+        seed (int): Seed of the message generator.
+
+    Returns:
+        dict: Per format, encode and decode time in seconds and size in bytes.
+    """
+    messages = _messages(count, agents, seed)
+    codec = MessageCodec()
+    formats = {
+        "codec": (codec.encode_batch, codec.decode_batch),
+        "pickle": (pickle.dumps, pickle.loads),
+        "json": (_as_json, _from_json),
+    }
+    results = {}
+    for name, (encode, decode) in formats.items():
+        data, encode_time = _timed(encode, messages)
+        decoded, decode_time = _timed(decode, data)
+        assert len(decoded) == count
+        results[name] = {"encode_sec": encode_time, "decode_sec": decode_time, "bytes": len(data)}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--agents", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.messages, args.agents, args.seed), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""benchmarks/mailbox_benchmark.py
+Compares the put, get and commit throughput of the in-memory Mailbox with the DurableMailbox.
+
+Every round puts 'batch' messages, either one by one or as a single MessageBatch, then takes
+them all and commits, the way an agent drains and commits its inbox. The log is synced after
+each put and each commit, so every round pays the group commit of the DurableMailbox once.
+
+Usage:
+    python -m benchmarks.mailbox_benchmark --messages 100000 --batch 256
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+
+from agents.durable_mailbox import DurableMailbox
+from agents.mailbox import Mailbox, message_count
+from configs.config import ALPHABET
+from models.message import Message
+from models.message_batch import MessageBatch
+
+MODES = ("memory", "durable_messages", "durable_batch")
+
+
+def _messages(count, seed):
+    rng = random.Random(seed)
+    return [
+        Message(agent_id="agent_1", type="custom", content=" ".join(rng.sample(ALPHABET, 2)))
+        for _ in range(count)
+    ]
+
+
+def _open(mode, directory):
+    if mode == "memory":
+        return Mailbox(maxsize=0)
+    return DurableMailbox(directory, maxsize=0)
+
+
+def _sync(mailbox):
+    if isinstance(mailbox, DurableMailbox):
+        mailbox.sync()
+
+
+def run_mode(mode, messages, batch):
+    """
+    Puts, takes and commits all messages through a mailbox.
+
+    Args:
+        mode (str): One of MODES.
+        messages (list): The messages.
+        batch (int): Number of messages per round.
+
+    Returns:
+        dict: Put and get/commit time in sec and the overall message rate.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}'.")
+    rounds = [messages[start : start + batch] for start in range(0, len(messages), batch)]
+    put_time = get_time = 0.0
+    taken = 0
+    with tempfile.TemporaryDirectory() as directory:
+        mailbox = _open(mode, directory)
+        for chunk in rounds:
+            started = time.perf_counter()
+            if mode == "durable_batch":
+                mailbox.put_nowait(MessageBatch(chunk))
+            else:
+                for message in chunk:
+                    mailbox.put_nowait(message)
+            _sync(mailbox)
+            put_time += time.perf_counter() - started
+
+            started = time.perf_counter()
+            while not mailbox.empty():
+                taken += message_count(mailbox.get_nowait())
+            if isinstance(mailbox, DurableMailbox):
+                mailbox.commit()
+            _sync(mailbox)
+            get_time += time.perf_counter() - started
+        if isinstance(mailbox, DurableMailbox):
+            mailbox.close()
+    assert taken == len(messages)
+    return {
+        "put_sec": put_time,
+        "get_commit_sec": get_time,
+        "msgs_per_sec": len(messages) / (put_time + get_time),
+    }
+
+
+def run(count, batch, seed=0):
+    """
+    Runs every mode on the same messages.
+
+    Args:
+        count (int): Number of messages.
+        batch (int): Number of messages per round.
+        seed (int): Seed of the message generator.
+
+    Returns:
+        dict: The measurements per mode.
+    """
+    messages = _messages(count, seed)
+    return {mode: run_mode(mode, messages, batch) for mode in MODES}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=100000)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.messages, args.batch, args.seed), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
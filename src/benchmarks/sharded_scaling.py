@@ -0,0 +1,91 @@
+"""benchmarks/sharded_scaling.py
+Measures how the throughput of the ShardedRuntime scales with the number of worker processes.
+
+Every agent relays the messages it receives to the next agent of a ring spanning all shards,
+burning a fixed amount of CPU per message, with a constant number of messages in flight.
+
+Usage:
+    python -m benchmarks.sharded_scaling --agents 64 --duration 5
+"""
+
+import argparse
+import hashlib
+import json
+import os
+
+from agents.concrete_agent import ConcreteAgent
+from agents.sharded_runtime import ShardedRuntime
+
+CPU_ROUNDS = 200
+IN_FLIGHT = 8
+
+
+class RelayAgent(ConcreteAgent):
+    """
+    Agent which seeds a few messages once and then relays every received message to its peer.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.consume_interval = 0
+        self.seeded = False
+        self.content_matcher.remove(self.handle_custom_message)
+        self.register_message_handler(self.msg_type, self.relay_message)
+
+    async def relay_message(self, message):
+        digest = message.content.encode()
+        for _ in range(CPU_ROUNDS):
+            digest = hashlib.sha256(digest).digest()
+        await self.emit_message(message)
+
+    async def generate_random_message(self):
+        if not self.seeded:
+            self.seeded = True
+            for _ in range(IN_FLIGHT):
+                await super().generate_random_message()
+
+
+def run(total_agents, duration, shard_counts):
+    """
+    Runs the benchmark for every shard count.
+
+    Args:
+        total_agents (int): Number of agents, split evenly across the shards.
+        duration (float): Run time in sec per shard count.
+        shard_counts (list): Numbers of worker processes to measure.
+
+    Returns:
+        list: Result dict per shard count.
+    """
+    results = []
+    for num_shards in shard_counts:
+        runtime = ShardedRuntime(RelayAgent, num_shards, max(1, total_agents // num_shards))
+        stats = runtime.run(duration)
+        delivered = sum(shard["local"] + shard["received"] for shard in stats)
+        elapsed = max(shard["elapsed"] for shard in stats)
+        results.append(
+            {
+                "shards": num_shards,
+                "agents": sum(shard["agents"] for shard in stats),
+                "messages": delivered,
+                "msgs_per_sec": round(delivered / elapsed, 1),
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--agents", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--shards", type=int, nargs="+")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    shard_counts = args.shards or sorted({2**i for i in range(cpus.bit_length())} | {cpus})
+    for result in run(args.agents, args.duration, shard_counts):
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -18,4 +18,61 @@ ALPHABET = [
 ]
 BEHAVIOUR_INTERVAL = 2
 CONSUME_INTERVAL = 0.2
+CONSUME_BATCH_SIZE = 100
+BULK_BATCH_SIZE = None
+MAILBOX_SIZE = 10000
+BACKPRESSURE_POLICY = "drop_newest"
+BACKPRESSURE_TIMEOUT = 1.0
+BACKPRESSURE_SAMPLE_RATE = 10
+BACKPRESSURE_HIGH_WATERMARK = 0.8
+DEDUP_MAX_ENTRIES = 100000
+DEDUP_TTL = 60.0
+PRIORITY_LANES = None
+PRIORITY_POLICY = "strict"
+PRIORITY_AGING = 1.0
+DURABLE_SEGMENT_SIZE = 16 * 1024 * 1024
+DURABLE_SYNC_INTERVAL = 0.01
+DURABLE_WRITE_BATCH = 1024
+RECORDER_BUFFER_SIZE = 4096
+RECORDER_FLUSH_INTERVAL = 1.0
+HANDLER_CONCURRENCY = 1
+HANDLER_ORDERING_KEY = "agent_id"
+HANDLER_MAX_PENDING = 1024
+OFFLOAD_THREADS = 8
+OFFLOAD_PROCESSES = None
+OFFLOAD_MAX_PENDING = 1000
+LOG_FORMAT = "[%(asctime)s] %(levelname)s - %(message)s"
+LOG_RATE_LIMIT = 10
+LOG_RATE_INTERVAL = 1.0
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9464
+PROFILER_SLOW_THRESHOLD = 0.05
+PROFILER_TOP_N = 10
+PROFILER_STACK_SAMPLES = 5
+LOOP_LAG_INTERVAL = 0.1
+LOOP_LAG_SPIKE = 0.25
+LOOP_LAG_CAPTURE = 1.0
+PACING_INTERVAL = 1.0
+PACING_TARGET_LATENCY = 0.1
+PACING_BEHAVIOR_BOUNDS = (0.01, 10.0)
+PACING_CONSUME_BOUNDS = (0.001, 1.0)
+PACING_RATE_INCREASE = 1.0
+PACING_RATE_DECREASE = 0.5
+PACING_GAIN_P = 0.5
+PACING_GAIN_I = 0.5
 MAX_AGENT = 1000
+SCHEDULER_TICK = 0.05
+SCHEDULER_WHEEL_SIZE = 512
+POOL_DRAIN_TIMEOUT = 5.0
+POOL_DRAIN_POLL = 0.01
+POOL_RESTART_DELAY = 0.1
+SHARD_FRAME_BATCH_SIZE = 256
+SHARD_FLUSH_INTERVAL = 0.005
+SHARD_ID_SPAN = 1000000
+TRANSPORT_FRAME_BATCH_SIZE = 256
+TRANSPORT_FLUSH_INTERVAL = 0.005
+TRANSPORT_MAX_PENDING = 10000
+TRANSPORT_WINDOW = 1024
+TRANSPORT_CREDIT_INTERVAL = 0.01
+TRANSPORT_BACKOFF_MIN = 0.05
+TRANSPORT_BACKOFF_MAX = 5.0
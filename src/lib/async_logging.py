@@ -0,0 +1,110 @@
+"""lib/async_logging.py
+Holds a non-blocking logging setup so that per-message log calls never wait on log I/O.
+
+Records are put on an in-process queue by a QueueHandler and written by a QueueListener running
+in a background thread. Records are not formatted before they are queued, so the cost of
+building log messages is paid by the listener thread, and only for records which are emitted.
+Repeated records below ERROR are rate limited per call site, suppressed records are reported as
+a count on the next record which passes.
+"""
+
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from configs.config import LOG_FORMAT, LOG_RATE_INTERVAL, LOG_RATE_LIMIT
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler which queues records as they are, leaving formatting to the listener thread.
+    Safe because the queue never leaves the process, so records are not pickled.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most 'rate' records per 'interval' sec for every call site, identified by
+    logger name, level and message template. Records at ERROR and above are never limited.
+
+    Attributes:
+        rate (int): Max records per key and interval.
+        interval (float): Length of the window in sec.
+        suppressed (int): Total number of records suppressed.
+    """
+
+    def __init__(self, rate=LOG_RATE_LIMIT, interval=LOG_RATE_INTERVAL):
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self.suppressed = 0
+        self._windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.ERROR:
+            return True
+
+        template = record.msg if isinstance(record.msg, str) else type(record.msg).__name__
+        key = (record.name, record.levelno, template)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            suppressed = window[2] if window is not None else 0
+            window = self._windows[key] = [now, 0, 0]
+            if suppressed:
+                self._annotate(record, suppressed)
+
+        if window[1] >= self.rate:
+            window[2] += 1
+            self.suppressed += 1
+            return False
+        window[1] += 1
+        return True
+
+    @staticmethod
+    def _annotate(record, suppressed):
+        suffix = f" (suppressed {suppressed} similar messages)"
+        if isinstance(record.msg, str) and record.args:
+            record.msg = record.msg + suffix.replace("%", "%%")
+        else:
+            record.msg = str(record.msg) + suffix
+            record.args = None
+
+
+def setup_async_logging(level=logging.INFO, handlers=None, rate_limit=True):
+    """
+    Routes all records of the root logger through a queue to a background listener thread.
+
+    Args:
+        level (int): Level of the root logger.
+        handlers (list): Handlers writing the records, by default the handlers already attached
+            to the root logger or a StreamHandler using LOG_FORMAT.
+        rate_limit (bool): Whether to rate limit repeated records with a RateLimitFilter.
+
+    Returns:
+        QueueListener: The started listener, stop() it on shutdown to flush pending records.
+    """
+    root = logging.getLogger()
+    if handlers is None:
+        handlers = list(root.handlers)
+        if not handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter(LOG_FORMAT))
+            handlers = [handler]
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = LazyQueueHandler(log_queue)
+    if rate_limit:
+        queue_handler.addFilter(RateLimitFilter())
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,144 @@
+"""lib/content_matcher.py
+Holds a multi-pattern content matcher which routes messages to handlers by keywords or regexes.
+
+All keywords of all routes are compiled into a single regex, an alternation wrapped in a
+lookahead so that a match is reported at every position where any keyword starts. The longest
+keyword wins at a position, and since every other keyword matching there is a prefix of it, the
+routes of those prefixes are folded into the longest one at compile time. Every keyword has its
+own group, the routes of a match are looked up by the index of the group which matched rather
+than by the matched text, whose case may differ from the keyword. A batch of contents is matched
+in one scan over their concatenation.
+"""
+
+import bisect
+import re
+
+SEPARATOR = "\x00"
+
+
+class ContentMatcher:
+    """
+    Matches contents against the keyword and regex sets of many routes at once.
+
+    Attributes:
+        ignore_case (bool): Whether matching is case insensitive.
+
+    Methods:
+        add(route, keywords, patterns): Adds keywords and regexes for a route.
+        remove(route): Removes a route.
+        match(content): Returns the routes matching a content.
+        match_batch(contents): Returns the routes matching each content of a batch.
+    """
+
+    def __init__(self, ignore_case=False):
+        self.ignore_case = ignore_case
+        self._keywords = {}
+        self._patterns = {}
+        self._routes = set()
+        self._compiled = None
+
+    def __len__(self):
+        return len(self._routes)
+
+    def add(self, route, keywords=(), patterns=()):
+        """
+        Adds keywords and regexes for a route, a content matches the route if it contains any of
+        the keywords or any of the regexes matches it.
+
+        Args:
+            route (hashable): The route, e.g. a handler.
+            keywords (iterable): Plain substrings.
+            patterns (iterable): Regular expressions.
+
+        Returns:
+            None
+        """
+        self._routes.add(route)
+        for keyword in keywords:
+            if keyword:
+                keyword = keyword.lower() if self.ignore_case else keyword
+                self._keywords.setdefault(keyword, set()).add(route)
+        flags = re.IGNORECASE if self.ignore_case else 0
+        for pattern in patterns:
+            self._patterns.setdefault(route, []).append(re.compile(pattern, flags))
+        self._compiled = None
+
+    def remove(self, route):
+        """
+        Removes a route with all its keywords and regexes.
+
+        Args:
+            route (hashable): The route.
+
+        Returns:
+            None
+        """
+        for keyword in list(self._keywords):
+            self._keywords[keyword].discard(route)
+            if not self._keywords[keyword]:
+                del self._keywords[keyword]
+        self._patterns.pop(route, None)
+        self._routes.discard(route)
+        self._compiled = None
+
+    def _compile(self):
+        keywords = sorted(self._keywords, key=len, reverse=True)
+        # Note: routes[i] belongs to the keyword of group i + 1.
+        routes = [
+            frozenset().union(
+                *(self._keywords[prefix] for prefix in keywords if keyword.startswith(prefix))
+            )
+            for keyword in keywords
+        ]
+        regex = None
+        if keywords:
+            flags = re.IGNORECASE if self.ignore_case else 0
+            groups = "|".join(f"({re.escape(keyword)})" for keyword in keywords)
+            regex = re.compile(f"(?=(?:{groups}))", flags)
+        self._compiled = (regex, routes)
+        return self._compiled
+
+    def match(self, content):
+        """
+        Returns the routes matching a content.
+
+        Args:
+            content (str): The content.
+
+        Returns:
+            set: The matching routes.
+        """
+        return self.match_batch([content])[0]
+
+    def match_batch(self, contents):
+        """
+        Returns the routes matching each content of a batch, keywords are matched in a single
+        scan over all contents.
+
+        Args:
+            contents (list): The contents.
+
+        Returns:
+            list: Set of matching routes per content.
+        """
+        regex, routes = self._compiled or self._compile()
+        results = [set() for _ in contents]
+        if not contents or not self._routes:
+            return results
+
+        text = SEPARATOR.join(contents)
+        if regex is not None:
+            starts = []
+            offset = 0
+            for content in contents:
+                starts.append(offset)
+                offset += len(content) + 1
+            for match in regex.finditer(text):
+                index = bisect.bisect_right(starts, match.start()) - 1
+                results[index].update(routes[match.lastindex - 1])
+
+        for route, patterns in self._patterns.items():
+            for index, content in enumerate(contents):
+                if route not in results[index] and any(p.search(content) for p in patterns):
+                    results[index].add(route)
+        return results
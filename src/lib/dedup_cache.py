@@ -0,0 +1,109 @@
+"""lib/dedup_cache.py
+Holds a bounded LRU/TTL cache which tells whether a message has already been seen.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+
+def content_key(message):
+    """
+    Default deduplication key: a 16 byte digest of the agent_id, type and content of a message,
+    so every cache entry has the same small size whatever the size of the message.
+
+    Args:
+        message (class Message): The message.
+
+    Returns:
+        bytes: The digest.
+    """
+    fields = f"{message.agent_id}\x00{message.type}\x00{message.content}"
+    return hashlib.blake2b(fields.encode(), digest_size=16).digest()
+
+
+class DedupCache:
+    """
+    Remembers recently seen keys with O(1) lookups, bounded by a number of entries and a TTL.
+
+    Keys are kept in last-seen order, so the least recently seen key is both the first to be
+    evicted once 'max_entries' is reached and the first to expire.
+
+    Attributes:
+        max_entries (int): Max number of remembered keys.
+        ttl (float): Time in sec a key is remembered after it was last seen, None for no expiry.
+        key (callable): Maps a message to its key, content_key() by default.
+        hits (int): Number of duplicates detected.
+        misses (int): Number of first sightings.
+        evictions (int): Keys evicted to stay within 'max_entries'.
+        expirations (int): Keys dropped as their TTL elapsed.
+
+    Methods:
+        seen(message): Records a message, returns whether it is a duplicate.
+        stats(): Returns the counters.
+        clear(): Forgets all keys.
+    """
+
+    def __init__(self, max_entries, ttl=None, key=content_key, clock=time.monotonic):
+        if max_entries < 1:
+            raise ValueError("A dedup cache needs room for at least one entry.")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._clock = clock
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def seen(self, message):
+        """
+        Records a message and tells whether its key has been seen within the TTL.
+
+        Args:
+            message (class Message): The message.
+
+        Returns:
+            bool: True for a duplicate.
+        """
+        key = self.key(message)
+        entries = self._entries
+        now = self._clock()
+        if self.ttl is not None:
+            # Note: entries are in last-seen order, expired ones are all at the front.
+            expired_before = now - self.ttl
+            while entries:
+                oldest, seen_at = next(iter(entries.items()))
+                if seen_at > expired_before:
+                    break
+                del entries[oldest]
+                self.expirations += 1
+
+        if key in entries:
+            entries[key] = now
+            entries.move_to_end(key)
+            self.hits += 1
+            return True
+
+        entries[key] = now
+        self.misses += 1
+        if len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return False
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def clear(self):
+        self._entries.clear()
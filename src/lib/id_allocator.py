@@ -0,0 +1,81 @@
+"""lib/id_allocator.py
+Holds a thread-safe integer ID allocator with O(1) allocate and release.
+"""
+
+import threading
+from collections import deque
+
+
+class IdAllocator:
+    """
+    Allocates unique positive integer IDs, recycling released ones through a free-list.
+
+    IDs are handed out sequentially from 'start' until released IDs become available, which are
+    then reused in the order they were released. The pool grows past 'capacity' on demand, so
+    allocation never spins or blocks.
+
+    Attributes:
+        start (int): The first ID handed out.
+        capacity (int): Expected number of live IDs, informational only as the pool can grow.
+
+    Methods:
+        allocate(): Returns a free ID.
+        release(id_): Returns an ID to the pool.
+        in_use(id_): Checks whether an ID is currently allocated.
+    """
+
+    def __init__(self, start=1, capacity=None):
+        self.start = start
+        self.capacity = capacity
+        self._next = start
+        self._free = deque()
+        self._allocated = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._allocated)
+
+    def allocate(self):
+        """
+        Returns a free ID, reusing the oldest released ID when there is one.
+
+        Returns:
+            int: The allocated ID.
+        """
+        with self._lock:
+            if self._free:
+                id_ = self._free.popleft()
+            else:
+                id_ = self._next
+                self._next += 1
+            self._allocated.add(id_)
+            return id_
+
+    def release(self, id_):
+        """
+        Returns an ID to the pool so that it can be allocated again.
+
+        Args:
+            id_ (int): The ID to release.
+
+        Returns:
+            bool: True if the ID was released, False if it was not allocated.
+        """
+        with self._lock:
+            if id_ not in self._allocated:
+                return False
+            self._allocated.remove(id_)
+            self._free.append(id_)
+            return True
+
+    def in_use(self, id_):
+        """
+        Checks whether an ID is currently allocated.
+
+        Args:
+            id_ (int): The ID to check.
+
+        Returns:
+            bool: True if the ID is allocated.
+        """
+        return id_ in self._allocated
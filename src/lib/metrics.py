@@ -0,0 +1,231 @@
+"""lib/metrics.py
+Holds the runtime instrumentation of agents: counters, latency histograms, a snapshot API and
+a Prometheus text endpoint served by a local asyncio HTTP server.
+"""
+
+import asyncio
+import bisect
+import logging
+import time
+
+from configs.config import METRICS_HOST, METRICS_PORT
+
+# Note: bucket bounds in sec, powers of 2 from ~1us to ~67s.
+LATENCY_BOUNDS = tuple(2.0**exponent for exponent in range(-20, 7))
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket latency histogram, recording a value costs one bisect and a few additions.
+
+    Attributes:
+        bounds (tuple): Upper bounds of the buckets in sec, the last bucket is unbounded.
+        counts (list): Number of values per bucket.
+        count (int): Number of values recorded.
+        total (float): Sum of the values recorded.
+        max (float): Largest value recorded.
+    """
+
+    def __init__(self, bounds=LATENCY_BOUNDS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        """
+        Records a value.
+
+        Args:
+            value (float): Latency in sec.
+
+        Returns:
+            None
+        """
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket holding it.
+
+        Args:
+            q (float): The quantile, between 0.0 and 1.0.
+
+        Returns:
+            float: The estimate, 0.0 if nothing has been recorded.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                return min(self.bounds[index], self.max) if index < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+        }
+
+
+class AgentMetrics:
+    """
+    Counters and latency histograms of a single agent.
+
+    Attributes:
+        emitted (int): Messages emitted.
+        consumed (int): Messages taken from the inbox.
+        dropped (int): Messages the agent failed to emit as the outbox was full.
+        rejected (int): Messages rejected by a validator of the middleware pipeline.
+        filtered (int): Messages dropped by a filter of the middleware pipeline.
+        duplicates (int): Messages skipped as duplicates.
+        handler_latency (LatencyHistogram): Run time of message handlers.
+        behavior_latency (LatencyHistogram): Run time of behaviors.
+        started (float): Time the metrics were enabled, from time.monotonic().
+    """
+
+    COUNTERS = ("emitted", "consumed", "dropped", "rejected", "filtered", "duplicates")
+    HISTOGRAMS = ("handler_latency", "behavior_latency")
+
+    def __init__(self):
+        self.emitted = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.filtered = 0
+        self.duplicates = 0
+        self.handler_latency = LatencyHistogram()
+        self.behavior_latency = LatencyHistogram()
+        self.started = time.monotonic()
+
+    def snapshot(self):
+        uptime = max(time.monotonic() - self.started, 1e-9)
+        snapshot = {name: getattr(self, name) for name in self.COUNTERS}
+        snapshot["uptime"] = uptime
+        snapshot["consumed_per_sec"] = self.consumed / uptime
+        for name in self.HISTOGRAMS:
+            snapshot[name] = getattr(self, name).snapshot()
+        return snapshot
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def render_prometheus(agents):
+    """
+    Renders the metrics of agents in the Prometheus text exposition format, agents without
+    metrics enabled are skipped.
+
+    Args:
+        agents (iterable): The agents.
+
+    Returns:
+        str: The exposition.
+    """
+    samples = {}
+    types = {}
+    for agent in agents:
+        if getattr(agent, "metrics", None) is None:
+            continue
+        metrics = agent.metrics
+        label = _labels(agent=getattr(agent, "agent_id", None) or id(agent))
+
+        for name in AgentMetrics.COUNTERS:
+            metric = f"agent_messages_{name}_total"
+            types[metric] = "counter"
+            samples.setdefault(metric, []).append(f"{metric}{{{label}}} {getattr(metrics, name)}")
+        for name, depth in agent.queue_depths().items():
+            metric = f"agent_{name}"
+            types[metric] = "gauge"
+            samples.setdefault(metric, []).append(f"{metric}{{{label}}} {depth}")
+        for name in ("behavior_interval", "consume_interval"):
+            metric = f"agent_{name}_seconds"
+            types[metric] = "gauge"
+            samples.setdefault(metric, []).append(f"{metric}{{{label}}} {getattr(agent, name)}")
+        for name in AgentMetrics.HISTOGRAMS:
+            histogram = getattr(metrics, name)
+            metric = f"agent_{name}_seconds"
+            types[metric] = "histogram"
+            lines = samples.setdefault(metric, [])
+            cumulative = 0
+            for bound, bucket_count in zip(
+                histogram.bounds + (float("inf"),), histogram.counts, strict=True
+            ):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{metric}_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {histogram.total}")
+            lines.append(f"{metric}_count{{{label}}} {histogram.count}")
+
+    output = []
+    for metric, lines in samples.items():
+        output.append(f"# TYPE {metric} {types[metric]}")
+        output.extend(lines)
+    return "\n".join(output) + "\n"
+
+
+class MetricsServer:
+    """
+    Minimal asyncio HTTP server exposing the metrics of agents on GET /metrics.
+
+    Attributes:
+        agents (callable or iterable): The agents, or a callable returning them.
+        host (str): Address to bind to.
+        port (int): Port to bind to, 0 picks a free port.
+
+    Methods:
+        start(): Starts serving, returns the bound port.
+        stop(): Stops serving.
+    """
+
+    def __init__(self, agents, host=METRICS_HOST, port=METRICS_PORT):
+        self.agents = agents
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logging.info(f"Serving metrics on http://{self.host}:{self.port}/metrics.")
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                agents = self.agents() if callable(self.agents) else self.agents
+                status, body = "200 OK", render_prometheus(agents).encode()
+            else:
+                status, body = "404 Not Found", b"Not Found\n"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logging.exception(f"Error serving metrics: {e}")
+        finally:
+            writer.close()
@@ -0,0 +1,234 @@
+"""lib/middleware.py
+Holds a pipeline of message middleware stages which is compiled into one flat function.
+
+A stage is one of:
+   - validator: returns whether a message is valid, invalid messages are rejected.
+   - transform: returns the message passed on to the next stages, e.g. a normalized copy.
+   - filter: returns whether a message is kept, the others are dropped without complaint.
+
+The stages are compiled into the source of a single function which loops over a batch of
+messages and calls every stage inline, without a per-stage loop or dispatch on the stage kind.
+Rejections are returned along with the accepted messages instead of being raised, a stage which
+raises rejects the message as well. A Pipeline compiles its chain once and keeps it until its
+stages change, nothing is cached across pipelines so the callables of a removed agent are freed.
+"""
+
+import logging
+
+VALIDATOR = "validator"
+TRANSFORM = "transform"
+FILTER = "filter"
+KINDS = (VALIDATOR, TRANSFORM, FILTER)
+
+
+class Stage:
+    """
+    A named middleware stage.
+
+    Attributes:
+        name (str): Name of the stage, unique within a pipeline.
+        kind (str): One of KINDS.
+        func (callable): The check, transform or predicate, called with the message.
+        on_reject (callable): Called with a message the stage rejected, e.g. to log it.
+    """
+
+    __slots__ = ("name", "kind", "func", "on_reject")
+
+    def __init__(self, name, kind, func, on_reject=None):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown middleware kind '{kind}'.")
+        self.name = name
+        self.kind = kind
+        self.func = func
+        self.on_reject = on_reject
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {self.kind!r})"
+
+
+def validator(name, check, on_reject=None):
+    """
+    Returns a stage rejecting the messages for which 'check' returns False.
+    """
+    return Stage(name, VALIDATOR, check, on_reject)
+
+
+def transform(name, func):
+    """
+    Returns a stage replacing every message with the result of 'func'.
+    """
+    return Stage(name, TRANSFORM, func)
+
+
+def message_filter(name, predicate):
+    """
+    Returns a stage dropping the messages for which 'predicate' returns False.
+    """
+    return Stage(name, FILTER, predicate)
+
+
+_STEPS = {
+    VALIDATOR: (
+        "            if not f{0}(message):",
+        "                rejected.append((s{0}, message))",
+        "                continue",
+    ),
+    TRANSFORM: ("            message = f{0}(message)",),
+    FILTER: (
+        "            if not f{0}(message):",
+        "                filtered.append(s{0})",
+        "                continue",
+    ),
+}
+
+
+def compile_chain(stages):
+    """
+    Compiles stages into one function.
+
+    Args:
+        stages (tuple): The stages, in order.
+
+    Returns:
+        callable: Function taking an iterable of messages and returning the accepted messages,
+        the (stage, message) pairs rejected by validators and the stages which filtered a
+        message out.
+    """
+    lines = [
+        "def chain(messages):",
+        "    accepted, rejected, filtered = [], [], []",
+        "    accept = accepted.append",
+        "    for message in messages:",
+        "        stage = None",
+        "        try:",
+    ]
+    namespace = {"logging": logging}
+    for index, stage in enumerate(stages):
+        namespace[f"f{index}"] = stage.func
+        namespace[f"s{index}"] = stage
+        lines.append(f"            stage = s{index}")
+        lines.extend(line.format(index) for line in _STEPS[stage.kind])
+    lines += [
+        "        except Exception as e:",
+        "            logging.exception('Error in middleware stage %s: %s', stage.name, e)",
+        "            rejected.append((stage, message))",
+        "            continue",
+        "        accept(message)",
+        "    return accepted, rejected, filtered",
+    ]
+    # Note: the source only refers to stages by index, their callables live in the namespace.
+    exec(compile("\n".join(lines), "<middleware>", "exec"), namespace)
+    return namespace["chain"]
+
+
+class Pipeline:
+    """
+    Ordered, named middleware stages compiled into one function on first use.
+
+    Attributes:
+        rejected (dict): Number of messages rejected per stage name.
+        filtered (dict): Number of messages filtered out per stage name.
+
+    Methods:
+        add(stage, before): Adds a stage.
+        remove(name): Removes a stage.
+        run(message): Runs the chain on one message.
+        run_batch(messages): Runs the chain on a batch of messages.
+        stats(): Returns the rejection and filter counts.
+    """
+
+    def __init__(self, stages=()):
+        self._stages = []
+        self._compiled = None
+        self.rejected = {}
+        self.filtered = {}
+        for stage in stages:
+            self.add(stage)
+
+    def __len__(self):
+        return len(self._stages)
+
+    def __contains__(self, name):
+        return any(stage.name == name for stage in self._stages)
+
+    @property
+    def stages(self):
+        return tuple(self._stages)
+
+    def add(self, stage, before=None):
+        """
+        Adds a stage at the end of the pipeline or before another one.
+
+        Args:
+            stage (Stage): The stage.
+            before (str): Name of the stage to insert it before, None to append it.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If a stage with the same name exists or 'before' is unknown.
+        """
+        names = [existing.name for existing in self._stages]
+        if stage.name in names:
+            raise ValueError(f"Middleware stage '{stage.name}' already exists.")
+        if before is None:
+            self._stages.append(stage)
+        elif before in names:
+            self._stages.insert(names.index(before), stage)
+        else:
+            raise ValueError(f"Unknown middleware stage '{before}'.")
+        self._compiled = None
+
+    def remove(self, name):
+        """
+        Removes a stage.
+
+        Args:
+            name (str): Name of the stage.
+
+        Returns:
+            Stage: The removed stage, None if there was none with that name.
+        """
+        for index, stage in enumerate(self._stages):
+            if stage.name == name:
+                del self._stages[index]
+                self._compiled = None
+                return stage
+        return None
+
+    def run_batch(self, messages):
+        """
+        Runs the chain on a batch of messages and counts rejections and filtered messages.
+
+        Args:
+            messages (iterable): The messages.
+
+        Returns:
+            tuple: The accepted messages, in order, and the (stage, message) pairs rejected.
+        """
+        if self._compiled is None:
+            self._compiled = compile_chain(tuple(self._stages))
+        accepted, rejected, filtered = self._compiled(messages)
+        for stage, _ in rejected:
+            name = stage.name if stage is not None else None
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+        for stage in filtered:
+            self.filtered[stage.name] = self.filtered.get(stage.name, 0) + 1
+        return accepted, rejected
+
+    def run(self, message):
+        """
+        Runs the chain on one message.
+
+        Args:
+            message: The message.
+
+        Returns:
+            tuple: The message to handle or None, and the (stage, message) pairs rejected.
+        """
+        accepted, rejected = self.run_batch((message,))
+        return (accepted[0] if accepted else None), rejected
+
+    def stats(self):
+        return {"rejected": dict(self.rejected), "filtered": dict(self.filtered)}
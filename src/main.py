@@ -2,20 +2,24 @@
 main.py
 
 This script demonstrates the interaction between two concrete instances of an Autonomous Agent.
-The agents exchange messages through their outboxes and inboxes, running behaviors concurrently.
-Keyboard interrupts are handled and is one of the ways to stop the program execution.
+The agents exchange messages over a message bus wired as a ring, running behaviors concurrently.
+Keyboard interrupts are handled and is one of the ways to stop the program execution, queued
+messages are handled before the agents stop.
 """
 
 import asyncio
 import logging
 
-from agents.concrete_agent import ConcreteAgent
+from agents.agent_pool import AgentPool
+from agents.message_bus import MessageBus
+from lib.async_logging import setup_async_logging
 
 
 async def main():
     """
-    Creates two instances of ConcreteAgent, connects their outboxes to each other's inboxes,
-    and starts message consumption and behavior execution concurrently.
+    Creates two instances of ConcreteAgent in an agent pool, connects their outboxes to each
+    other's inboxes through a message bus, and runs message consumption and behavior execution
+    until interrupted. On interrupt the pool drains the inboxes before stopping the agents.
 
     Returns:
         None
@@ -23,12 +27,12 @@ async def main():
     try:
         # Create: two instances of ConcreteAgent
         logging.info("Preparing the agents.")
-        agent1 = ConcreteAgent()
-        agent2 = ConcreteAgent()
+        bus = MessageBus()
+        pool = AgentPool(bus=bus)
+        agents = pool.add(2)
 
         # Connect: the agents outboxes to each other's inboxes
-        agent1.outbox = agent2.inbox
-        agent2.outbox = agent1.inbox
+        bus.ring(agents)
 
         # Start: consuming messages and running behaviors for each agent
         logging.info("Starting the agents with:")
@@ -36,29 +40,21 @@ async def main():
         logging.info(
             "handler: to filters messages for the keyword 'hello' and then print it's content."
         )
-        tasks = [
-            asyncio.create_task(agent1.consume_messages()),
-            asyncio.create_task(agent2.consume_messages()),
-            asyncio.create_task(agent1.run_behaviors()),
-            asyncio.create_task(agent2.run_behaviors()),
-        ]
 
-        # Wait: for all tasks to complete
-        await asyncio.gather(*tasks)
+        # Wait: until cancelled, the pool then shuts down gracefully
+        await pool.run()
 
-    except KeyboardInterrupt:
-        logging.info("Stopping the agents.")
-        for task in tasks:
-            task.cancel()
     except Exception as e:
         logging.exception(f"Oops! Our agents are down as: {e}")
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, format="[%(asctime)s] %(levelname)s - %(message)s")
+    listener = setup_async_logging(level=logging.INFO)
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
         logging.info("Stopping the agents.")
     except Exception as e:
         logging.exception(f"Oops! Our agents are down as: {e}")
+    finally:
+        listener.stop()
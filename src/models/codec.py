@@ -0,0 +1,271 @@
+"""models/codec.py
+This module holds a compact binary codec for Message with batch framing.
+
+A frame holds any number of messages in a columnar layout:
+
+    magic (1 byte) | version (1 byte) | count (varint)
+    string table: size (varint), then per string: length (varint) + utf-8 bytes
+    index width (1 byte), then the agent_id and type columns as table indexes
+    content kind column: 1 byte per message, 0 for vocabulary tokens, 1 for utf-8 text
+    content length column: token count or byte length per message, index width wide
+    token column: 1 byte per token, indexes into the vocabulary (ALPHABET by default)
+    text blob: utf-8 bytes of the contents which are not made of vocabulary words
+
+Agent ids and types are interned in the string table, so each distinct value is stored once per
+frame. Columns are packed and unpacked with 'array' and read through memoryview slices of the
+input buffer, without copying it. Several frames can be concatenated, see iter_frames().
+"""
+
+import sys
+from array import array
+
+from configs.config import ALPHABET
+from models.message import Message
+
+MAGIC = 0xA7
+VERSION = 1
+TOKENS = 0
+TEXT = 1
+_WIDTHS = {1: "B", 2: "H", 4: "I"}
+
+
+def encode_varint(value, buffer):
+    """
+    Appends an unsigned integer to a buffer as a LEB128 varint.
+
+    Args:
+        value (int): The integer, >= 0.
+        buffer (bytearray): The buffer.
+
+    Returns:
+        None
+    """
+    while value >= 0x80:
+        buffer.append((value & 0x7F) | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def decode_varint(view, offset):
+    """
+    Reads a LEB128 varint.
+
+    Args:
+        view (memoryview or bytes): The buffer.
+        offset (int): Offset of the varint.
+
+    Returns:
+        tuple: The integer and the offset after it.
+    """
+    value = shift = 0
+    while True:
+        byte = view[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _column(typecode, values):
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def _read_column(view, offset, typecode, count):
+    size = array(typecode).itemsize * count
+    raw = view[offset : offset + size]
+    if sys.byteorder == "big" and size:
+        column = array(typecode, raw.tobytes())
+        column.byteswap()
+        return column, offset + size
+    return raw.cast(typecode), offset + size
+
+
+class MessageCodec:
+    """
+    Encodes and decodes batches of messages as frames.
+
+    Attributes:
+        vocabulary (list): Words contents are tokenized with, at most 256.
+
+    Methods:
+        encode_batch(messages): Encodes messages into one frame.
+        decode_batch(buffer): Decodes the messages of one frame.
+        encode(message): Encodes a single message.
+        decode(buffer): Decodes a single message.
+        iter_frames(buffer): Yields the frames of a buffer of concatenated frames.
+    """
+
+    def __init__(self, vocabulary=ALPHABET):
+        if len(vocabulary) > 256:
+            raise ValueError("Vocabulary can hold at most 256 words.")
+        self.vocabulary = list(vocabulary)
+        self._token_ids = {word: index for index, word in enumerate(self.vocabulary)}
+        self._encoded_contents = {}
+        self._decoded_contents = {}
+
+    def _encode_content(self, content):
+        words = content.split(" ") if content else []
+        if all(word in self._token_ids for word in words):
+            return TOKENS, bytes(self._token_ids[word] for word in words)
+        return TEXT, content.encode()
+
+    def encode_batch(self, messages):
+        """
+        Encodes messages into one frame.
+
+        Args:
+            messages (list): The messages.
+
+        Returns:
+            bytearray: The frame.
+        """
+        strings = {}
+        agent_ids, types, kinds, lengths = [], [], [], []
+        tokens, texts = bytearray(), bytearray()
+        encoded_contents = self._encoded_contents
+        for message in messages:
+            agent_id = str(message.agent_id)
+            agent_ids.append(strings.setdefault(agent_id, len(strings)))
+            types.append(strings.setdefault(message.type, len(strings)))
+            encoded = encoded_contents.get(message.content)
+            if encoded is None:
+                encoded = self._encode_content(message.content)
+                if len(encoded_contents) < 65536:
+                    encoded_contents[message.content] = encoded
+            kind, data = encoded
+            kinds.append(kind)
+            lengths.append(len(data))
+            (tokens if kind == TOKENS else texts).extend(data)
+
+        largest = max(len(strings), max(lengths, default=0))
+        width = 1 if largest < 0x100 else 2 if largest < 0x10000 else 4
+        typecode = _WIDTHS[width]
+
+        frame = bytearray((MAGIC, VERSION))
+        encode_varint(len(agent_ids), frame)
+        encode_varint(len(strings), frame)
+        for string in strings:
+            data = string.encode()
+            encode_varint(len(data), frame)
+            frame += data
+        frame.append(width)
+        frame += _column(typecode, agent_ids)
+        frame += _column(typecode, types)
+        frame += bytes(kinds)
+        frame += _column(typecode, lengths)
+        encode_varint(len(tokens), frame)
+        frame += tokens
+        encode_varint(len(texts), frame)
+        frame += texts
+        return frame
+
+    def _frame_end(self, view, offset=0):
+        """
+        Returns the offset after the frame starting at 'offset', along with its parsed header.
+        """
+        if view[offset] != MAGIC or view[offset + 1] != VERSION:
+            raise ValueError("Buffer does not start with a message frame.")
+        count, offset = decode_varint(view, offset + 2)
+        size, offset = decode_varint(view, offset)
+        strings = []
+        for _ in range(size):
+            length, offset = decode_varint(view, offset)
+            strings.append(sys.intern(str(view[offset : offset + length], "utf-8")))
+            offset += length
+        typecode = _WIDTHS[view[offset]]
+        offset += 1
+        agent_ids, offset = _read_column(view, offset, typecode, count)
+        types, offset = _read_column(view, offset, typecode, count)
+        kinds = view[offset : offset + count]
+        offset += count
+        lengths, offset = _read_column(view, offset, typecode, count)
+        token_size, offset = decode_varint(view, offset)
+        tokens = view[offset : offset + token_size]
+        offset += token_size
+        text_size, offset = decode_varint(view, offset)
+        texts = view[offset : offset + text_size]
+        offset += text_size
+        return offset, (strings, agent_ids, types, kinds, lengths, tokens, texts)
+
+    def decode_batch(self, buffer):
+        """
+        Decodes the messages of one frame.
+
+        Args:
+            buffer (bytes, bytearray or memoryview): Buffer starting with the frame.
+
+        Returns:
+            list: The messages.
+        """
+        view = memoryview(buffer)
+        _, (strings, agent_ids, types, kinds, lengths, tokens, texts) = self._frame_end(view)
+
+        # Note: columns are turned into lists in one C call each, which makes the loop below
+        # faster than indexing the memoryview casts item by item.
+        decoded_contents = self._decoded_contents
+        vocabulary = self.vocabulary
+        from_fields = Message.from_fields
+        tokens = tokens.tobytes()
+        messages = []
+        token_offset = text_offset = 0
+        for agent_id, type_, kind, length in zip(
+            agent_ids.tolist(), types.tolist(), kinds.tolist(), lengths.tolist(), strict=True
+        ):
+            if kind == TOKENS:
+                key = tokens[token_offset : token_offset + length]
+                token_offset += length
+                content = decoded_contents.get(key)
+                if content is None:
+                    content = " ".join(vocabulary[token] for token in key)
+                    if len(decoded_contents) < 65536:
+                        decoded_contents[key] = content
+            else:
+                content = str(texts[text_offset : text_offset + length], "utf-8")
+                text_offset += length
+            messages.append(from_fields(strings[agent_id], strings[type_], content))
+        return messages
+
+    def encode(self, message):
+        """
+        Encodes a single message as a frame of one.
+
+        Args:
+            message (class Message): The message.
+
+        Returns:
+            bytearray: The frame.
+        """
+        return self.encode_batch([message])
+
+    def decode(self, buffer):
+        """
+        Decodes the first message of a frame.
+
+        Args:
+            buffer (bytes, bytearray or memoryview): Buffer starting with the frame.
+
+        Returns:
+            class Message: The message.
+        """
+        return self.decode_batch(buffer)[0]
+
+    def iter_frames(self, buffer):
+        """
+        Yields the frames of a buffer holding concatenated frames, as memoryview slices.
+
+        Args:
+            buffer (bytes, bytearray or memoryview): The buffer.
+
+        Yields:
+            memoryview: One frame.
+        """
+        view = memoryview(buffer)
+        offset = 0
+        while offset < len(view):
+            end, _ = self._frame_end(view, offset)
+            yield view[offset:end]
+            offset = end
@@ -1,23 +1,63 @@
 """models/message.py
 This module holds the message class and its attributes for proper Message handling.
+
+Message is slotted, FrozenMessage is its immutable and hashable variant which interns agent_id and
+type so that large backlogs share one string object per agent and per type.
+
+The optional 'priority' of a message selects its lane in a PriorityMailbox, it is local to the
+process and not part of the wire format.
 """
 
-import random
+import sys
 
 from configs.config import MAX_AGENT
-from lib.utility import process_data
+from lib.exception import IncorrectAgentIdentifierException
+from lib.id_allocator import IdAllocator
 
 
 class Message:
+    __slots__ = ("agent_id", "type", "content", "priority")
+
     AGENT_ID_PREFIX = "agent"
     DEFAULT_TYPE = "default"
     DEFAULT_CONTENT = ""
     AGENT_IDS = set()
+    ID_ALLOCATOR = IdAllocator(start=1, capacity=MAX_AGENT)
 
-    def __init__(self, agent_id=None, type=None, content=None):
-        self.agent_id = agent_id if agent_id else self.generate_agent_id()
-        self.type = type if process_data(type) else self.DEFAULT_TYPE
-        self.content = content if content else self.DEFAULT_CONTENT
+    def __init__(self, agent_id=None, type=None, content=None, priority=None):
+        self.agent_id, self.type, self.content = self._normalize(agent_id, type, content)
+        self.priority = priority
+
+    @classmethod
+    def _normalize(cls, agent_id, type, content):
+        return (
+            agent_id if agent_id else cls.generate_agent_id(),
+            type if type and not type.isspace() else cls.DEFAULT_TYPE,
+            content if content else cls.DEFAULT_CONTENT,
+        )
+
+    @classmethod
+    def from_fields(cls, agent_id, type, content, priority=None):
+        """
+        Build a message from fields which are already valid, e.g. decoded from the wire, skipping
+        the processing done by __init__.
+
+        Returns:
+            Message: The message.
+        """
+        message = cls.__new__(cls)
+        message.agent_id = agent_id
+        message.type = type
+        message.content = content
+        message.priority = priority
+        return message
+
+    def freeze(self):
+        """
+        Returns:
+            FrozenMessage: An immutable copy of this message.
+        """
+        return FrozenMessage.from_fields(self.agent_id, self.type, self.content, self.priority)
 
     @staticmethod
     def generate_agent_id():
@@ -25,12 +65,110 @@ class Message:
         Generate a unique agent ID.
 
         Returns:
-            str: A unique agent ID generated using the AGENT_ID_PREFIX
-            followed by a random integer between 1 and MAX_AGENT + 1.
+            str: A unique agent ID generated using the AGENT_ID_PREFIX followed by an integer
+            taken from the ID_ALLOCATOR, released IDs are reused before new ones are issued.
+
+        """
+        name = f"{Message.AGENT_ID_PREFIX}_{Message.ID_ALLOCATOR.allocate()}"
+        Message.AGENT_IDS.add(name)
+        return name
 
+    @staticmethod
+    def release_agent_id(agent_id):
         """
-        while True:
-            name = f"{Message.AGENT_ID_PREFIX}_{random.randint(1, MAX_AGENT + 1)}"
-            if name not in Message.AGENT_IDS:
-                Message.AGENT_IDS.add(name)
-                return name
+        Release an agent ID generated by generate_agent_id() so that it can be reused.
+
+        Args:
+            agent_id (str): The agent ID to release.
+
+        Returns:
+            bool: True if the ID was released, False if it was not in use.
+
+        Raises:
+            IncorrectAgentIdentifierException: If the agent ID is not in the expected format.
+        """
+        prefix, _, number = agent_id.rpartition("_") if agent_id else ("", "", "")
+        if prefix != Message.AGENT_ID_PREFIX or not number.isdigit():
+            raise IncorrectAgentIdentifierException(f"Incorrect agent identifier: '{agent_id}'.")
+
+        Message.AGENT_IDS.discard(agent_id)
+        return Message.ID_ALLOCATOR.release(int(number))
+
+
+class FrozenMessage(Message):
+    """
+    Immutable Message, its fields are set once by the constructor. Instances compare equal and
+    hash by their fields, agent_id and type are interned.
+
+    Methods:
+        replace(**changes): Returns a copy with some fields replaced.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, agent_id=None, type=None, content=None, priority=None):
+        agent_id, type, content = self._normalize(agent_id, type, content)
+        self._set(self, agent_id, type, content, priority)
+
+    @staticmethod
+    def _set(message, agent_id, type, content, priority):
+        setter = object.__setattr__
+        setter(message, "agent_id", sys.intern(agent_id) if isinstance(agent_id, str) else agent_id)
+        setter(message, "type", sys.intern(type) if isinstance(type, str) else type)
+        setter(message, "content", content)
+        setter(message, "priority", priority)
+
+    @classmethod
+    def from_fields(cls, agent_id, type, content, priority=None):
+        message = cls.__new__(cls)
+        cls._set(message, agent_id, type, content, priority)
+        return message
+
+    def freeze(self):
+        return self
+
+    def replace(self, **changes):
+        """
+        Returns a copy of this message with some fields replaced.
+
+        Args:
+            **changes: New values of 'agent_id', 'type', 'content' or 'priority'.
+
+        Returns:
+            FrozenMessage: The copy.
+        """
+        fields = {
+            "agent_id": self.agent_id,
+            "type": self.type,
+            "content": self.content,
+            "priority": self.priority,
+        }
+        fields.update(changes)
+        return FrozenMessage(**fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"'{type(self).__name__}' is immutable, cannot set '{name}'.")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"'{type(self).__name__}' is immutable, cannot delete '{name}'.")
+
+    def __reduce__(self):
+        return self.from_fields, (self.agent_id, self.type, self.content, self.priority)
+
+    def __eq__(self, other):
+        if not isinstance(other, FrozenMessage):
+            return NotImplemented
+        return (self.agent_id, self.type, self.content) == (
+            other.agent_id,
+            other.type,
+            other.content,
+        )
+
+    def __hash__(self):
+        return hash((self.agent_id, self.type, self.content))
+
+    def __repr__(self):
+        return (
+            f"FrozenMessage(agent_id={self.agent_id!r}, type={self.type!r}, "
+            f"content={self.content!r})"
+        )
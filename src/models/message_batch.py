@@ -0,0 +1,199 @@
+"""models/message_batch.py
+This module holds MessageBatch, a columnar container for many messages.
+
+Instead of one object per message the batch keeps:
+   - a table of interned agent ids and types, stored once per batch,
+   - 'array' columns of table indexes for agent_id and type,
+   - a content blob with an end offset per message, contents made of vocabulary words are stored
+     as one token id byte per word, any other content as utf-8.
+
+Messages are materialized as FrozenMessage instances only when the batch is indexed or iterated,
+so a queue or a handler can carry millions of messages at a few bytes each.
+
+A batch does not keep the 'priority' of its messages: materialized messages have none, and a
+PriorityMailbox queues the whole batch in its default lane. A Mailbox counts a batch as len(batch)
+messages against its capacity.
+"""
+
+import sys
+from array import array
+
+from configs.config import ALPHABET
+from models.codec import TEXT, TOKENS
+from models.message import FrozenMessage
+
+
+class MessageBatch:
+    """
+    Append-only, array-backed batch of messages.
+
+    Attributes:
+        vocabulary (list): Words contents are tokenized with, at most 256.
+        agent_ids (array): Index of the agent_id of every message in the string table.
+        types (array): Index of the type of every message in the string table.
+        kinds (bytearray): TOKENS or TEXT for every message.
+        offsets (array): End offset of the content of every message in the content blob.
+
+    Methods:
+        append(message): Adds a message.
+        extend(messages): Adds several messages.
+        extend_tokens(agent_id, type, tokens, width): Adds messages given as token ids.
+        contents(): Returns the decoded contents of all messages.
+        nbytes(): Returns the size of the columns and of the content blob.
+    """
+
+    __slots__ = (
+        "vocabulary",
+        "agent_ids",
+        "types",
+        "kinds",
+        "offsets",
+        "_blob",
+        "_strings",
+        "_string_ids",
+        "_token_ids",
+    )
+
+    _DEFAULT_TOKEN_IDS = {word: index for index, word in enumerate(ALPHABET)}
+
+    def __init__(self, messages=(), vocabulary=ALPHABET):
+        if len(vocabulary) > 256:
+            raise ValueError("Vocabulary can hold at most 256 words.")
+        self.vocabulary = vocabulary
+        if vocabulary is ALPHABET:
+            self._token_ids = self._DEFAULT_TOKEN_IDS
+        else:
+            self._token_ids = {word: index for index, word in enumerate(vocabulary)}
+        self.agent_ids = array("I")
+        self.types = array("I")
+        self.kinds = bytearray()
+        self.offsets = array("I")
+        self._blob = bytearray()
+        self._strings = []
+        self._string_ids = {}
+        self.extend(messages)
+
+    def _string_id(self, value):
+        index = self._string_ids.get(value)
+        if index is None:
+            index = self._string_ids[value] = len(self._strings)
+            self._strings.append(sys.intern(value))
+        return index
+
+    def append(self, message):
+        """
+        Adds a message to the batch, the message itself is not kept.
+
+        Args:
+            message (class Message): The message.
+
+        Returns:
+            None
+        """
+        self.agent_ids.append(self._string_id(str(message.agent_id)))
+        self.types.append(self._string_id(message.type))
+        content = message.content
+        words = content.split(" ") if content else []
+        token_ids = self._token_ids
+        if all(word in token_ids for word in words):
+            self.kinds.append(TOKENS)
+            self._blob += bytes(token_ids[word] for word in words)
+        else:
+            self.kinds.append(TEXT)
+            self._blob += content.encode()
+        self.offsets.append(len(self._blob))
+
+    def extend(self, messages):
+        """
+        Adds several messages to the batch.
+
+        Args:
+            messages (iterable): The messages.
+
+        Returns:
+            None
+        """
+        for message in messages:
+            self.append(message)
+
+    def extend_tokens(self, agent_id, type, tokens, width):
+        """
+        Adds messages of the same agent_id and type whose contents are already tokenized, one
+        column operation each instead of one append() per message.
+
+        Args:
+            agent_id (str): Agent id of all messages.
+            type (str): Type of all messages.
+            tokens (bytes): Vocabulary indexes of all contents, 'width' per message.
+            width (int): Number of words per content.
+
+        Returns:
+            None
+        """
+        count, rest = divmod(len(tokens), width)
+        if rest:
+            raise ValueError(f"Token count is not a multiple of {width}.")
+        if tokens and max(tokens) >= len(self.vocabulary):
+            raise ValueError("Token id out of vocabulary.")
+        start = len(self._blob)
+        self.agent_ids.extend(array("I", [self._string_id(str(agent_id))]) * count)
+        self.types.extend(array("I", [self._string_id(type)]) * count)
+        self.kinds += bytes((TOKENS,)) * count
+        self.offsets.extend(range(start + width, start + width * count + 1, width))
+        self._blob += tokens
+
+    def _content(self, index, cache=None):
+        start = self.offsets[index - 1] if index else 0
+        data = bytes(self._blob[start : self.offsets[index]])
+        if self.kinds[index] == TEXT:
+            return data.decode()
+        if cache is not None:
+            content = cache.get(data)
+            if content is None:
+                content = cache[data] = " ".join(self.vocabulary[token] for token in data)
+            return content
+        return " ".join(self.vocabulary[token] for token in data)
+
+    def contents(self):
+        """
+        Returns:
+            list: The content of every message, in order.
+        """
+        cache = {}
+        return [self._content(index, cache) for index in range(len(self))]
+
+    def nbytes(self):
+        """
+        Returns:
+            int: Bytes used by the columns and the content blob, the string table excluded.
+        """
+        columns = (self.agent_ids, self.types, self.offsets)
+        return (
+            sum(column.itemsize * len(column) for column in columns)
+            + len(self.kinds)
+            + len(self._blob)
+        )
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("MessageBatch index out of range.")
+        strings = self._strings
+        return FrozenMessage.from_fields(
+            strings[self.agent_ids[index]], strings[self.types[index]], self._content(index)
+        )
+
+    def __iter__(self):
+        strings = self._strings
+        from_fields = FrozenMessage.from_fields
+        for agent_id, type_, content in zip(
+            self.agent_ids, self.types, self.contents(), strict=True
+        ):
+            yield from_fields(strings[agent_id], strings[type_], content)
+
+    def __repr__(self):
+        return f"MessageBatch(<{len(self)} messages>)"
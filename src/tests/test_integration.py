@@ -3,9 +3,18 @@ This module does integration testing using standard library unittest.
 """
 
 import asyncio
+import multiprocessing
 import unittest
 
+from agents.autonomous_agent import AutonomousAgent
 from agents.concrete_agent import ConcreteAgent
+from agents.mailbox import Mailbox
+from agents.message_bus import MessageBus
+from agents.sharded_runtime import ShardedRuntime
+from agents.simulation import Simulation
+from agents.tcp_transport import TcpTransport
+from benchmarks.agent_benchmark import run_scenario
+from benchmarks.mailbox_benchmark import run as run_mailbox_benchmark
 from models.message import Message
 
 
@@ -79,6 +88,167 @@ class TestIntegration(unittest.IsolatedAsyncioTestCase):
         for task in tasks:
             task.cancel()
 
+    async def test_agents_communication_over_bus(self):
+        """
+        This method does integration testing of agents wired in a full mesh over a message bus.
+        """
+        agents = [ConcreteAgent() for _ in range(3)]
+        bus = MessageBus()
+        bus.full_mesh(agents)
+
+        message = Message(agent_id=agents[0].agent_id, type="custom", content="hello world")
+        await agents[0].emit_message(message)
+
+        self.assertTrue(agents[0].inbox.empty())
+        for agent in agents[1:]:
+            # Check: the same message object is fanned out to every other agent
+            self.assertIs(await agent.inbox.get(), message)
+
+        tasks = [asyncio.create_task(agent.run_behaviors()) for agent in agents]
+        await asyncio.sleep(0.1)
+        for agent in agents:
+            self.assertEqual(agent.inbox.qsize(), len(agents) - 1)
+
+        for task in tasks:
+            task.cancel()
+        for agent in agents:
+            agent.close()
+
+
+class TestAgentBenchmark(unittest.IsolatedAsyncioTestCase):
+    async def test_run_scenario(self):
+        """
+        This method does a smoke run of the agent benchmark.
+        """
+        for topology in ("full_mesh", "fan_out"):
+            results = await run_scenario(agents=4, topology=topology, rate=200, duration=0.3)
+            self.assertGreater(results["delivered"], 0)
+            self.assertGreater(results["msgs_per_sec"], 0)
+            self.assertLessEqual(results["latency_p50_ms"], results["latency_p999_ms"])
+            self.assertGreater(results["peak_rss_mb"], 0)
+
+    def test_mailbox_benchmark(self):
+        """
+        This method does a smoke run of the mailbox benchmark.
+        """
+        results = run_mailbox_benchmark(count=500, batch=64)
+        self.assertEqual(set(results), {"memory", "durable_messages", "durable_batch"})
+        for result in results.values():
+            self.assertGreater(result["msgs_per_sec"], 0)
+
+
+class TestSimulation(unittest.TestCase):
+    def simulate(self, seed, duration):
+        agents = [ConcreteAgent(), ConcreteAgent()]
+        MessageBus().ring(agents)
+        received = []
+
+        async def record(message):
+            received.append(message.content)
+
+        for agent in agents:
+            agent.register_message_handler(agent.msg_type, record)
+        end = Simulation(seed=seed).run_agents(agents, duration=duration)
+        for agent in agents:
+            agent.close()
+        return end, received
+
+    def test_hour_of_traffic_is_simulated_deterministically(self):
+        """
+        This method does integration testing of an hour of agent traffic on the virtual clock.
+        """
+        end, received = self.simulate(seed=1, duration=3600)
+        self.assertEqual(end, 3600)
+        # Check: each agent emits one message per behavior interval
+        self.assertEqual(len(received), 2 * 3600 // ConcreteAgent().behavior_interval)
+
+        # Check: runs with the same seed replay the same traffic
+        replayed = self.simulate(seed=1, duration=60)[1]
+        self.assertEqual(replayed, received[: len(replayed)])
+        self.assertNotEqual(self.simulate(seed=2, duration=60)[1], replayed)
+
+
+class TestShardedRuntime(unittest.TestCase):
+    def test_ring_across_shards(self):
+        """
+        This method does integration testing of a ring of agents spanning two worker processes.
+        """
+        runtime = ShardedRuntime(ConcreteAgent, num_shards=2, agents_per_shard=2)
+        stats = runtime.run(duration=0.5)
+
+        self.assertEqual(len(stats), 2)
+        for shard in stats:
+            # Check: every shard emits one message per agent, one of which crosses shards
+            self.assertEqual(shard["agents"], 2)
+            self.assertEqual(shard["local"], 1)
+            self.assertEqual(shard["sent"], 1)
+            self.assertEqual(shard["received"], 1)
+
+
+def serve_echo_node(name, reply_port, ready):
+    """
+    Runs an agent which sends every received message back to the 'replies' inbox of the
+    transport listening on 'reply_port', the port of its own transport is sent to 'ready'.
+    """
+
+    async def main():
+        transport = TcpTransport()
+        ready.send(await transport.start())
+        agent = AutonomousAgent()
+        agent.consume_interval = 0.01
+        transport.expose(name, agent.inbox)
+        transport.connect(agent, "127.0.0.1", reply_port, "replies")
+        agent.register_message_handler(Message.DEFAULT_TYPE, agent.emit_message)
+        await agent.consume_messages()
+
+    asyncio.run(main())
+
+
+class TestTcpTransport(unittest.TestCase):
+    def test_echo_across_processes(self):
+        """
+        This method does integration testing of agents in two processes echoing messages over
+        localhost TCP.
+        """
+        asyncio.run(self.echo_across_processes(nodes=2, messages=500))
+
+    async def echo_across_processes(self, nodes, messages):
+        transport = TcpTransport()
+        reply_port = await transport.start()
+        replies = Mailbox(maxsize=64)
+        transport.expose("replies", replies)
+
+        context = multiprocessing.get_context("spawn")
+        processes, outboxes = [], []
+        for index in range(nodes):
+            ready, child_ready = context.Pipe()
+            process = context.Process(
+                target=serve_echo_node, args=(f"echo_{index}", reply_port, child_ready), daemon=True
+            )
+            process.start()
+            processes.append(process)
+            port = await asyncio.get_running_loop().run_in_executor(None, ready.recv)
+            outboxes.append(transport.remote("127.0.0.1", port, f"echo_{index}"))
+
+        try:
+            for outbox in outboxes:
+                for number in range(messages):
+                    outbox.put_nowait(Message(agent_id="agent_1", content=f"hello {number}"))
+            received = []
+            async with asyncio.timeout(20):
+                while len(received) < nodes * messages:
+                    received.append((await replies.get()).content)
+
+            # Check: the small replies inbox was never overrun, flow control held the senders
+            self.assertEqual(replies.dropped, 0)
+            expected = [f"hello {number}" for number in range(messages)] * nodes
+            self.assertEqual(sorted(received), sorted(expected))
+        finally:
+            for process in processes:
+                process.terminate()
+                process.join()
+            await transport.close()
+
 
 if __name__ == "__main__":
     unittest.main()
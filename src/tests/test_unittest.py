@@ -4,14 +4,49 @@ and in one case utilizes parameterized library too.
 """
 
 import asyncio
+import gc
+import logging
+import os
+import pickle
+import random
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, patch
+import weakref
+from unittest.mock import AsyncMock, MagicMock, patch
 
 from parameterized import parameterized
 
+from agents.agent_pool import AgentPool
 from agents.autonomous_agent import AutonomousAgent
+from agents.behavior_scheduler import BehaviorScheduler
 from agents.concrete_agent import ConcreteAgent
-from models.message import Message
+from agents.durable_mailbox import DurableMailbox
+from agents.mailbox import Mailbox
+from agents.message_bus import MessageBus
+from agents.offload_executor import OffloadExecutor
+from agents.pacing_controller import PacingController
+from agents.priority_mailbox import PriorityMailbox
+from agents.profiler import CallProfiler, LoopLagMonitor
+from agents.sharded_runtime import FRAME_HEADER, ShardRouter, decode_frame, encode_frame
+from agents.simulation import Simulation
+from agents.tcp_transport import TcpTransport
+from agents.traffic_recorder import EMITTED, HANDLED, TrafficRecorder, TrafficReplayer
+from configs.config import ALPHABET, MAX_AGENT
+from lib.async_logging import RateLimitFilter, setup_async_logging
+from lib.content_matcher import ContentMatcher
+from lib.dedup_cache import DedupCache
+from lib.exception import IncorrectAgentIdentifierException
+from lib.metrics import LatencyHistogram, MetricsServer, render_prometheus
+from lib.middleware import Pipeline, message_filter, transform, validator
+from models.codec import MessageCodec, decode_varint, encode_varint
+from models.message import FrozenMessage, Message
+from models.message_batch import MessageBatch
+
+
+def cpu_bound_word_count(message):
+    return len(message.content.split())
 
 
 class TestConcreteAgent(unittest.IsolatedAsyncioTestCase):
@@ -40,12 +75,14 @@ class TestConcreteAgent(unittest.IsolatedAsyncioTestCase):
     async def test_handle_custom_message(self, message_data, expected_call):
         message = Message(**message_data)
         with patch("agents.concrete_agent.logging.info") as mock_logging_info:
-            await self.agent.handle_custom_message(message)
-            expected_message = (
-                f"Received '{message.type}' message '{message.content}' from '{message.agent_id}'."
-            )
+            await self.agent.handle_message(message)
             if expected_call:
-                mock_logging_info.assert_called_once_with(expected_message)
+                mock_logging_info.assert_called_once_with(
+                    "Received '%s' message '%s' from '%s'.",
+                    message.type,
+                    message.content,
+                    message.agent_id,
+                )
             else:
                 mock_logging_info.assert_not_called()
 
@@ -56,12 +93,71 @@ class TestConcreteAgent(unittest.IsolatedAsyncioTestCase):
             await self.agent.generate_random_message()
             mock_emit_message.assert_called_once()
 
+    async def test_generate_message_batch(self):
+        agent = ConcreteAgent(bulk_size=500)
+        agent.random = random.Random(7)
+        agent.enable_metrics()
+        self.assertEqual(agent.behaviors, [agent.generate_message_batch])
+
+        await agent.generate_message_batch()
+        self.assertEqual(agent.outbox.qsize(), 500)
+        batch = agent.outbox.get_nowait()
+        self.assertEqual(len(batch), 500)
+        self.assertEqual(agent.metrics.emitted, 500)
+        for message in batch:
+            first, second = message.content.split(" ")
+            self.assertNotEqual(first, second)
+            self.assertTrue({first, second} <= set(ALPHABET))
+            self.assertEqual((message.agent_id, message.type), (agent.agent_id, "custom"))
+        self.assertGreater(len({message.content for message in batch}), 80)
+        agent.close()
+
+    def test_close_releases_agent_id(self):
+        agent_id = self.agent.agent_id
+        self.agent.close()
+        self.assertNotIn(agent_id, Message.AGENT_IDS)
+        self.assertFalse(Message.release_agent_id(agent_id))
+
     async def test_emit_message(self):
         message = Message(type="custom", content="test message")
         await self.agent.emit_message(message)
         self.assertFalse(self.agent.outbox.empty())
 
 
+class TestMessage(unittest.TestCase):
+    def test_generate_agent_id_unique_past_max_agent(self):
+        agent_ids = [Message.generate_agent_id() for _ in range(MAX_AGENT + 10)]
+        self.assertEqual(len(set(agent_ids)), len(agent_ids))
+        for agent_id in agent_ids:
+            self.assertTrue(Message.release_agent_id(agent_id))
+
+    def test_release_agent_id(self):
+        agent_id = Message.generate_agent_id()
+        self.assertTrue(Message.release_agent_id(agent_id))
+        self.assertFalse(Message.release_agent_id(agent_id))
+        self.assertNotIn(agent_id, Message.AGENT_IDS)
+
+    def test_release_agent_id_incorrect_format(self):
+        with self.assertRaises(IncorrectAgentIdentifierException):
+            Message.release_agent_id("invalid")
+
+    def test_message_is_slotted(self):
+        message = Message(agent_id="agent_1", content="hello world")
+        self.assertFalse(hasattr(message, "__dict__"))
+        with self.assertRaises(AttributeError):
+            message.extra = 1
+
+    def test_frozen_message(self):
+        message = FrozenMessage(agent_id="agent_1", type="  ", content="hello world")
+        self.assertEqual(message.type, Message.DEFAULT_TYPE)
+        with self.assertRaises(AttributeError):
+            message.content = "other"
+        self.assertEqual(message, Message(agent_id="agent_1", content="hello world").freeze())
+        self.assertEqual(len({message, message.replace(), message.replace(content="sky moon")}), 2)
+        self.assertIs(FrozenMessage(agent_id="".join(["agent", "_1"])).agent_id, message.agent_id)
+        self.assertEqual(pickle.loads(pickle.dumps(message)), message)
+
+
 class TestAutonomousAgent(unittest.IsolatedAsyncioTestCase):
     async def test_handle_message_positive(self):
         agent = AutonomousAgent()
@@ -97,6 +193,108 @@ class TestAutonomousAgent(unittest.IsolatedAsyncioTestCase):
             await agent.emit_message(message)
             mock_logging_warning.assert_called_once()
 
+    async def test_consume_messages_drains_batch(self):
+        agent = AutonomousAgent()
+        agent.consume_batch_size = 3
+        for _ in range(5):
+            agent.inbox.put_nowait(Message(content="hello world"))
+        batches = []
+
+        async def record_batch(messages):
+            batches.append(len(messages))
+
+        with patch.object(agent, "handle_batch", side_effect=record_batch):
+            task = asyncio.create_task(agent.consume_messages())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            await task
+        self.assertEqual(batches, [3, 2])
+        self.assertTrue(agent.inbox.empty())
+
+    async def test_idle_during_backoff(self):
+        agent = AutonomousAgent()
+        agent.consume_interval = 10.0
+        agent.inbox.put_nowait(Message(content="hello world"))
+        task = asyncio.create_task(agent.consume_messages())
+        await asyncio.sleep(0.01)
+        self.assertTrue(agent.idle())
+        task.cancel()
+        await task
+
+    async def test_consume_message_batch(self):
+        agent = AutonomousAgent()
+        handled = []
+        agent.register_content_handler(handled.append, keywords=["hello"])
+        agent.inbox.put_nowait(Message(content="hello world"))
+        agent.inbox.put_nowait(MessageBatch([Message(content="hello sky")] * 3))
+        task = asyncio.create_task(agent.consume_messages())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+        self.assertEqual([m.content for m in handled], ["hello world"] + ["hello sky"] * 3)
+
+    async def test_emit_message_mailbox_full(self):
+        agent = AutonomousAgent(mailbox_size=1)
+        await agent.emit_message(Message())
+        await agent.emit_message(Message())
+        self.assertEqual(agent.outbox.dropped, 1)
+        self.assertEqual(agent.queue_pressure(), {"inbox": 0.0, "outbox": 1.0})
+
+    async def test_concurrent_dispatch_keeps_per_key_order(self):
+        agent = AutonomousAgent()
+        agent.handler_concurrency = 3
+        running, peak, handled = [0], [0], []
+
+        async def handler(message):
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+            await asyncio.sleep(0.01 if message.agent_id == "agent_a" else 0.001)
+            handled.append((message.agent_id, message.content))
+            running[0] -= 1
+
+        agent.register_message_handler("custom", handler)
+        messages = [
+            Message(agent_id=f"agent_{key}", type="custom", content=f"{key} {index}")
+            for index in range(4)
+            for key in ("a", "b", "c", "d")
+        ]
+        await agent.handle_batch(messages)
+        await agent.wait_for_handlers()
+
+        self.assertEqual(len(handled), len(messages))
+        self.assertLessEqual(peak[0], 3)
+        self.assertGreater(peak[0], 1)
+        for key in ("a", "b", "c", "d"):
+            contents = [content for agent_id, content in handled if agent_id == f"agent_{key}"]
+            self.assertEqual(contents, [f"{key} {index}" for index in range(4)])
+
+    async def test_hot_key_does_not_hold_handler_slots(self):
+        agent = AutonomousAgent()
+        agent.handler_concurrency = 2
+        handled = []
+
+        async def handler(message):
+            await asyncio.sleep(0.01 if message.agent_id == "agent_a" else 0)
+            handled.append(message.agent_id)
+
+        agent.register_message_handler("custom", handler)
+        messages = [Message(agent_id="agent_a", type="custom", content="a b")] * 10
+        messages.append(Message(agent_id="agent_b", type="custom", content="a b"))
+        await agent.handle_batch(messages)
+        await agent.wait_for_handlers()
+        self.assertEqual(handled.index("agent_b"), 0)
+
+    async def test_concurrent_dispatch_handler_error(self):
+        agent = AutonomousAgent()
+        agent.handler_concurrency = 2
+        agent.ordering_key = lambda message: message.type
+        handler = MagicMock(side_effect=Exception("boom"))
+        agent.register_message_handler("custom", handler)
+        with patch("agents.autonomous_agent.logging.exception") as mock_logging_exception:
+            await agent.handle_batch([Message(type="custom", content="hello world")] * 2)
+            await agent.wait_for_handlers()
+            self.assertEqual(mock_logging_exception.call_count, 2)
+
     def test_register_message_handler_positive(self):
         agent = AutonomousAgent()
         message_type = "custom"
@@ -112,5 +310,1188 @@ class TestAutonomousAgent(unittest.IsolatedAsyncioTestCase):
         self.assertIn(behavior, agent.behaviors)
 
 
+class TestBehaviorScheduler(unittest.IsolatedAsyncioTestCase):
+    async def test_behaviors_fire_periodically(self):
+        scheduler = BehaviorScheduler(tick=0.01, wheel_size=8)
+        calls = []
+
+        async def behavior():
+            calls.append(1)
+
+        handle = scheduler.register(behavior, interval=0.05)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.28)
+        task.cancel()
+        await task
+        self.assertGreaterEqual(len(calls), 5)
+        self.assertLessEqual(len(calls), 7)
+        self.assertEqual(handle.runs, len(calls))
+
+    async def test_cancelled_behavior_does_not_fire(self):
+        scheduler = BehaviorScheduler(tick=0.01, wheel_size=8)
+        behavior = MagicMock()
+        scheduler.register(behavior, interval=0.02).cancel()
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+        behavior.assert_not_called()
+
+    async def test_slow_behavior_is_skipped_not_stacked(self):
+        scheduler = BehaviorScheduler(tick=0.01, wheel_size=8)
+
+        async def behavior():
+            await asyncio.sleep(0.1)
+
+        handle = scheduler.register(behavior, interval=0.02)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.15)
+        task.cancel()
+        await task
+        self.assertLessEqual(handle.runs, 2)
+        self.assertGreater(handle.skipped, 0)
+
+    async def fire_ticks(self, interval, ticks, wheel_size=4, late=0.0):
+        now = [0.0]
+        scheduler = BehaviorScheduler(tick=1, wheel_size=wheel_size, clock=lambda: now[0])
+        handle = scheduler.register(AsyncMock(), interval=interval)
+        fired = []
+        for tick in range(ticks):
+            now[0] = tick + late
+            started = handle.runs + handle.skipped
+            scheduler._fire_slot()
+            scheduler._current_tick += 1
+            if handle.runs + handle.skipped > started:
+                fired.append(tick)
+            await asyncio.sleep(0)
+        return fired
+
+    async def test_interval_multiple_of_wheel_fires_once_per_period(self):
+        self.assertEqual(await self.fire_ticks(4, 25), [0, 4, 8, 12, 16, 20, 24])
+        self.assertEqual(await self.fire_ticks(8, 25), [0, 8, 16, 24])
+        self.assertEqual(await self.fire_ticks(5, 25), [0, 5, 10, 15, 20])
+
+    async def test_late_wakeup_does_not_skip_due_period(self):
+        self.assertEqual(await self.fire_ticks(1, 10, late=1.2), list(range(10)))
+        self.assertEqual(await self.fire_ticks(2, 10, late=0.5), [0, 2, 4, 6, 8])
+
+    async def test_schedule_agent_behaviors(self):
+        scheduler = BehaviorScheduler(tick=0.01)
+        agents = [ConcreteAgent() for _ in range(50)]
+        for agent in agents:
+            agent.behavior_interval = 0.05
+            agent.schedule_behaviors(scheduler, jitter=0.02)
+        task = asyncio.create_task(scheduler.run())
+        await asyncio.sleep(0.12)
+        task.cancel()
+        await task
+        for agent in agents:
+            self.assertFalse(agent.outbox.empty())
+            agent.unschedule_behaviors()
+            agent.close()
+        self.assertEqual(len(scheduler), 0)
+
+
+class TestMessageBus(unittest.TestCase):
+    def setUp(self):
+        self.bus = MessageBus()
+
+    def test_publish_routes_by_topic_type_and_agent_id(self):
+        by_topic, by_type, by_agent_id = asyncio.Queue(), asyncio.Queue(), asyncio.Queue()
+        self.bus.subscribe(by_topic, topic="news")
+        self.bus.subscribe(by_type, message_type="custom")
+        self.bus.subscribe(by_agent_id, agent_id="agent_7")
+
+        self.bus.publish(Message(agent_id="agent_7", type="custom", content="hello world"), "news")
+        self.bus.publish(Message(agent_id="agent_8", type="default", content="hello world"))
+        self.assertEqual(
+            [by_topic.qsize(), by_type.qsize(), by_agent_id.qsize()],
+            [1, 1, 1],
+        )
+
+    def test_publish_delivers_once_per_queue(self):
+        queue = asyncio.Queue()
+        self.bus.subscribe(queue, topic="news")
+        self.bus.subscribe(queue, message_type="custom")
+        self.assertEqual(self.bus.publish(Message(type="custom"), topic="news"), 1)
+
+    def test_unsubscribe(self):
+        queue = asyncio.Queue()
+        self.bus.subscribe(queue, topic="news")
+        self.bus.unsubscribe(queue, topic="news")
+        self.assertEqual(self.bus.publish(Message(), topic="news"), 0)
+
+    def test_subscribe_requires_single_key(self):
+        with self.assertRaises(ValueError):
+            self.bus.subscribe(asyncio.Queue(), topic="news", message_type="custom")
+
+    def test_publish_drops_on_full_queue(self):
+        queue = asyncio.Queue(maxsize=1)
+        self.bus.subscribe(queue, topic="news")
+        self.bus.publish(Message(), topic="news")
+        with patch("agents.message_bus.logging.warning") as mock_logging_warning:
+            self.bus.publish(Message(), topic="news")
+            mock_logging_warning.assert_called_once()
+        self.assertEqual(self.bus.dropped, 1)
+
+    def test_ring(self):
+        agents = [AutonomousAgent() for _ in range(3)]
+        self.bus.ring(agents)
+        for position, agent in enumerate(agents):
+            agent.outbox.put_nowait(Message(content=str(position)))
+        self.assertEqual(
+            [agent.inbox.get_nowait().content for agent in agents],
+            ["2", "0", "1"],
+        )
+
+    def test_star(self):
+        hub, agents = AutonomousAgent(), [AutonomousAgent() for _ in range(3)]
+        self.bus.star(hub, agents)
+        hub.outbox.put_nowait(Message())
+        agents[0].outbox.put_nowait(Message())
+        self.assertEqual(hub.inbox.qsize(), 1)
+        self.assertEqual([agent.inbox.qsize() for agent in agents], [1, 1, 1])
+
+    def test_disconnect(self):
+        agents = [AutonomousAgent(mailbox_size=5, backpressure="drop_oldest") for _ in range(2)]
+        outbox = agents[1].outbox
+        self.bus.full_mesh(agents)
+        self.bus.ring(agents)
+        self.bus.disconnect(agents[1])
+        agents[0].outbox.put_nowait(Message())
+        self.assertTrue(agents[1].inbox.empty())
+        self.assertIs(agents[1].outbox, outbox)
+        self.assertEqual((outbox.maxsize, outbox.policy), (5, "drop_oldest"))
+
+
+class TestMailbox(unittest.IsolatedAsyncioTestCase):
+    async def test_drop_newest(self):
+        mailbox = Mailbox(2, Mailbox.DROP_NEWEST)
+        results = [await mailbox.put(item) for item in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertEqual([mailbox.get_nowait(), mailbox.get_nowait()], [0, 1])
+        self.assertEqual(mailbox.dropped, 1)
+
+    async def test_drop_oldest(self):
+        mailbox = Mailbox(2, Mailbox.DROP_OLDEST)
+        for item in range(5):
+            mailbox.put_nowait(item)
+        self.assertEqual([mailbox.get_nowait(), mailbox.get_nowait()], [3, 4])
+        self.assertEqual(mailbox.dropped, 3)
+
+    async def test_block_with_timeout(self):
+        mailbox = Mailbox(1, Mailbox.BLOCK, timeout=0.01)
+        await mailbox.put(0)
+        self.assertFalse(await mailbox.put(1))
+        self.assertEqual(mailbox.dropped, 1)
+
+        asyncio.get_running_loop().call_later(0.005, mailbox.get_nowait)
+        mailbox.timeout = 1.0
+        self.assertTrue(await mailbox.put(2))
+        self.assertEqual(mailbox.get_nowait(), 2)
+
+    async def test_put_nowait_raises_queue_full(self):
+        mailbox = Mailbox(1, Mailbox.BLOCK)
+        mailbox.put_nowait(0)
+        with self.assertRaises(asyncio.QueueFull):
+            mailbox.put_nowait(1)
+
+    async def test_sample(self):
+        mailbox = Mailbox(100, Mailbox.SAMPLE, sample_rate=5, high_watermark=0.5)
+        for item in range(100):
+            await mailbox.put(item)
+        self.assertEqual(mailbox.qsize(), 60)
+        self.assertEqual(mailbox.dropped, 40)
+        self.assertEqual(mailbox.pressure(), 0.6)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            Mailbox(1, "unknown")
+
+    async def test_batches_count_as_messages(self):
+        def batch(count):
+            return MessageBatch([Message(agent_id="agent_1", content="a b")] * count)
+
+        mailbox = Mailbox(10, Mailbox.DROP_NEWEST)
+        self.assertTrue(await mailbox.put(batch(6)))
+        self.assertFalse(await mailbox.put(batch(5)))
+        self.assertFalse(await mailbox.put(batch(11)))
+        self.assertEqual((mailbox.qsize(), mailbox.dropped, mailbox.pressure()), (6, 16, 0.6))
+
+        mailbox = Mailbox(10, Mailbox.DROP_OLDEST)
+        for item in (batch(4), 0, batch(5), batch(3)):
+            mailbox.put_nowait(item)
+        self.assertEqual((mailbox.qsize(), mailbox.dropped), (9, 4))
+        self.assertEqual(mailbox.get_nowait(), 0)
+
+        mailbox = Mailbox(10, Mailbox.BLOCK, timeout=1.0)
+        await mailbox.put(batch(8))
+        asyncio.get_running_loop().call_later(0.005, mailbox.get_nowait)
+        self.assertTrue(await mailbox.put(batch(9)))
+        self.assertEqual(mailbox.qsize(), 9)
+
+    async def test_empty_batch_into_full_mailbox(self):
+        for policy in Mailbox.POLICIES:
+            mailbox = Mailbox(2, policy, timeout=0.01)
+            mailbox.put_nowait(MessageBatch([Message(agent_id="agent_1", content="a b")] * 2))
+            mailbox.put_nowait(MessageBatch())
+            self.assertTrue(await mailbox.put(MessageBatch()))
+            self.assertEqual((mailbox.qsize(), mailbox.dropped, len(mailbox._queue)), (2, 0, 1))
+
+
+class TestDurableMailbox(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def open(self, **kwargs):
+        kwargs.setdefault("maxsize", 0)
+        return DurableMailbox(self.directory.name, **kwargs)
+
+    def test_resumes_from_committed_offset(self):
+        mailbox = self.open(write_batch=10)
+        for index in range(25):
+            mailbox.put_nowait(Message(agent_id="agent_1", content=f"hello {index}"))
+        mailbox.put_nowait(MessageBatch([Message(agent_id="agent_2", content="sky moon")] * 2))
+        for _ in range(15):
+            mailbox.get_nowait()
+        mailbox.commit()
+        mailbox.close()
+
+        # Check: the record holding messages 10 to 19 was only partly consumed.
+        mailbox = self.open()
+        self.assertEqual(mailbox.recovered, 16)
+        self.assertEqual(mailbox.get_nowait().content, "hello 10")
+        self.assertEqual(len(list(mailbox._queue)[-1][0]), 2)
+        mailbox.close()
+
+    def test_truncates_consumed_segments(self):
+        mailbox = self.open(segment_size=1024, write_batch=1)
+        for index in range(200):
+            mailbox.put_nowait(Message(agent_id="agent_1", content=f"hello {index}"))
+        segments = [name for name in os.listdir(self.directory.name) if name.endswith(".log")]
+        self.assertGreater(len(segments), 2)
+        while mailbox.qsize() > 1:
+            mailbox.get_nowait()
+        mailbox.commit()
+        mailbox.sync()
+        segments = [name for name in os.listdir(self.directory.name) if name.endswith(".log")]
+        self.assertEqual(len(segments), 1)
+        mailbox.close()
+        self.assertEqual(self.open(segment_size=1024).get_nowait().content, "hello 199")
+
+    def test_durable_types_and_torn_tail(self):
+        mailbox = self.open(durable_types={"custom"})
+        mailbox.put_nowait(Message(agent_id="agent_1", type="custom", content="hello world"))
+        mailbox.put_nowait(Message(agent_id="agent_1", type="default", content="hello sky"))
+        mailbox.put_nowait("not a message")
+        mailbox.sync()
+        self.assertEqual(mailbox.qsize(), 3)
+        segment = mailbox._segments[-1]
+        # Check: a record whose payload does not match its checksum is not recovered.
+        segment.map[mailbox._position - segment.base - 1] ^= 0xFF
+        mailbox.close()
+        self.assertEqual(self.open().recovered, 0)
+
+    async def test_agent_commits_handled_messages(self):
+        agent = AutonomousAgent()
+        agent.inbox = self.open()
+        handled = []
+        agent.register_message_handler("default", handled.append)
+        for _ in range(3):
+            await agent.inbox.put(Message(agent_id="agent_1", content="hello world"))
+        task = asyncio.create_task(agent.consume_messages())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+        agent.inbox.close()
+        self.assertEqual(len(handled), 3)
+        self.assertEqual(self.open().recovered, 0)
+
+
+class TestPriorityMailbox(unittest.IsolatedAsyncioTestCase):
+    def fill(self, mailbox, count_per_lane):
+        for number in range(count_per_lane):
+            for lane in reversed(range(mailbox.lanes)):
+                message = Message(agent_id="agent_1", content=f"{lane} {number}", priority=lane)
+                mailbox.put_nowait(message)
+
+    def drain(self, mailbox):
+        return [int(mailbox.get_nowait().content.split(" ")[0]) for _ in range(mailbox.qsize())]
+
+    def test_strict_priority_and_lane_of(self):
+        mailbox = PriorityMailbox(maxsize=0, priorities={"control": 0})
+        self.fill(mailbox, 2)
+        self.assertEqual(mailbox.depths(), [2, 2, 2])
+        self.assertEqual(self.drain(mailbox), [0, 0, 1, 1, 2, 2])
+        self.assertEqual(mailbox.lane_of(Message(type="control")), 0)
+        self.assertEqual(mailbox.lane_of(Message(type="custom")), 1)
+        self.assertEqual(mailbox.lane_of(Message(type="custom", priority=9)), 2)
+
+    async def test_strict_priority_ages_low_lanes(self):
+        mailbox = PriorityMailbox(maxsize=0, aging=0.05)
+        mailbox.put_nowait(Message(agent_id="agent_1", content="2 old", priority=2))
+        await asyncio.sleep(0.12)
+        self.fill(mailbox, 1)
+        self.assertEqual(self.drain(mailbox), [0, 2, 1, 2])
+
+    def test_aged_backlog_does_not_outrank_control_lane(self):
+        now = [0.0]
+        mailbox = PriorityMailbox(maxsize=0, priorities={"control": 0})
+        with patch("agents.priority_mailbox.time.monotonic", lambda: now[0]):
+            for number in range(1000):
+                mailbox.put_nowait(Message(agent_id="agent_1", type="data", content=f"d {number}"))
+            now[0] = 5.0
+            mailbox.put_nowait(Message(agent_id="agent_1", type="control", content="stop now"))
+            mailbox.put_nowait(Message(agent_id="agent_1", content="2 new", priority=2))
+            served = [mailbox.get_nowait() for _ in range(mailbox.qsize())]
+        self.assertEqual(served[0].type, "control")
+        self.assertEqual(served[-1].content, "2 new")
+
+    def test_weighted_fair_shares(self):
+        mailbox = PriorityMailbox(maxsize=0, consumption="weighted", weights=[3, 2, 1])
+        self.fill(mailbox, 60)
+        served = self.drain(mailbox)[:60]
+        self.assertEqual([served.count(lane) for lane in range(3)], [30, 20, 10])
+
+    def test_drop_oldest_evicts_lowest_lane(self):
+        mailbox = PriorityMailbox(maxsize=3, policy="drop_oldest")
+        self.fill(mailbox, 1)
+        mailbox.put_nowait(Message(agent_id="agent_1", content="0 new", priority=0))
+        self.assertEqual((mailbox.dropped, mailbox.depths()), (1, [2, 1, 0]))
+
+    async def test_agent_handles_control_messages_first(self):
+        agent = AutonomousAgent(priority_lanes=3)
+        handled = []
+
+        async def record(message):
+            handled.append(message.type)
+
+        agent.register_message_handler("data", record)
+        agent.register_message_handler("shutdown", record, priority=0)
+        for _ in range(500):
+            agent.inbox.put_nowait(Message(agent_id="agent_1", type="data", content="hello world"))
+        agent.inbox.put_nowait(Message(agent_id="agent_1", type="shutdown", content="stop now"))
+        task = asyncio.create_task(agent.consume_messages())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+        self.assertEqual(handled[0], "shutdown")
+        self.assertEqual(len(handled), 501)
+
+
+class TestContentMatcher(unittest.IsolatedAsyncioTestCase):
+    def test_match_keywords_and_prefixes(self):
+        matcher = ContentMatcher()
+        matcher.add("greeting", keywords=["hello", "hell"])
+        matcher.add("short", keywords=["he"])
+        matcher.add("space", keywords=["moon", "sun"])
+        self.assertEqual(matcher.match("hello world"), {"greeting", "short"})
+        self.assertEqual(matcher.match("sun moon"), {"space"})
+        self.assertEqual(matcher.match("sky ocean"), set())
+
+    def test_match_batch(self):
+        matcher = ContentMatcher(ignore_case=True)
+        matcher.add("greeting", keywords=["Hello"])
+        matcher.add("digits", patterns=[r"\d+"])
+        self.assertEqual(
+            matcher.match_batch(["HELLO world", "agent 42", "", "lo he"]),
+            [{"greeting"}, {"digits"}, set(), set()],
+        )
+
+    def test_ignore_case_beyond_lower(self):
+        matcher = ContentMatcher(ignore_case=True)
+        matcher.add("i", keywords=["i"])
+        matcher.add("s", keywords=["s"])
+        self.assertEqual(
+            matcher.match_batch(["\u0130", "\u017f", "Is"]), [{"i"}, {"s"}, {"i", "s"}]
+        )
+
+    def test_remove(self):
+        matcher = ContentMatcher()
+        matcher.add("greeting", keywords=["hello"], patterns=["world"])
+        matcher.remove("greeting")
+        self.assertEqual(len(matcher), 0)
+        self.assertEqual(matcher.match("hello world"), set())
+
+    async def test_agent_content_handler(self):
+        agent = AutonomousAgent()
+        handled = []
+
+        async def handler(message):
+            handled.append(message.content)
+
+        agent.register_content_handler(handler, keywords=["hello", "moon"])
+        messages = [Message(content=content) for content in ("hello world", "sky sun", "moon sky")]
+        await agent.handle_batch(messages)
+        self.assertEqual(handled, ["hello world", "moon sky"])
+
+
+class TestAgentPool(unittest.IsolatedAsyncioTestCase):
+    async def test_remove_drains_inbox_and_releases_ids(self):
+        pool = AgentPool(drain_timeout=1.0)
+        agents = pool.add(3)
+        handled = []
+
+        async def handler(message):
+            await asyncio.sleep(0.001)
+            handled.append(message.content)
+
+        for agent in agents:
+            agent.consume_interval = 0.01
+            agent.register_message_handler("custom", handler)
+            for _ in range(10):
+                agent.inbox.put_nowait(Message(agent_id="agent_x", type="custom", content="a b"))
+        agents[0].inbox.put_nowait(Message(agent_id="agent_x", type="custom", content="c d"))
+        pool.start()
+        self.assertEqual(await pool.remove(agents[0]), 0)
+        self.assertIn("c d", handled)
+        self.assertEqual(len(pool), 2)
+        self.assertNotIn(agents[0].agent_id, Message.AGENT_IDS)
+
+        self.assertEqual(await pool.shutdown(), 0)
+        self.assertEqual(len(handled), 31)
+        self.assertFalse(Message.AGENT_IDS & {agent.agent_id for agent in agents})
+
+    async def test_messages_emitted_while_draining_are_published(self):
+        bus = MessageBus()
+        pool = AgentPool(bus=bus, drain_timeout=1.0)
+        leaving, staying = pool.add(2)
+        outbox = leaving.outbox
+        bus.ring([leaving, staying])
+        received = []
+
+        async def reply(message):
+            await leaving.emit_message(Message(agent_id=leaving.agent_id, content="re ply"))
+
+        async def record(message):
+            received.append(message.content)
+
+        leaving.register_message_handler("custom", reply)
+        staying.register_message_handler("default", record)
+        for _ in range(3):
+            leaving.inbox.put_nowait(Message(agent_id="agent_x", type="custom", content="a b"))
+        pool.start()
+        self.assertEqual(await pool.remove(leaving), 0)
+        self.assertIs(leaving.outbox, outbox)
+        await asyncio.sleep(0.05)
+        self.assertEqual(received, ["re ply"] * 3)
+        await pool.shutdown()
+
+    async def test_drain_timeout_counts_lost_messages(self):
+        pool = AgentPool(drain_timeout=0.05)
+        (agent,) = pool.add()
+        agent.consume_batch_size = 1
+
+        async def handler(message):
+            await asyncio.sleep(1)
+
+        agent.register_message_handler("custom", handler)
+        for _ in range(5):
+            agent.inbox.put_nowait(Message(agent_id="agent_x", type="custom", content="a b"))
+        pool.start()
+        await asyncio.sleep(0)
+        self.assertEqual(await pool.shutdown(), 4)
+        self.assertEqual(pool.stats()["lost"], 4)
+
+    async def test_hot_add_and_restart_of_crashed_loop(self):
+        class CrashingAgent(AutonomousAgent):
+            crashes = 1
+
+            async def consume_messages(self):
+                if CrashingAgent.crashes:
+                    CrashingAgent.crashes -= 1
+                    raise RuntimeError("crash")
+                await super().consume_messages()
+
+        pool = AgentPool(factory=CrashingAgent, restart_delay=0.01)
+        pool.start()
+        (agent,) = pool.add()
+        handler = AsyncMock()
+        agent.register_message_handler("custom", handler)
+        agent.inbox.put_nowait(Message(agent_id="agent_x", type="custom", content="a b"))
+        with patch("agents.agent_pool.logging.error") as mock_error:
+            await asyncio.sleep(0.05)
+        mock_error.assert_called_once()
+        handler.assert_awaited_once()
+        self.assertEqual(pool.restarts, 1)
+        await pool.shutdown()
+
+
+class TestTrafficRecorder(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "trace.bin")
+        self.now = [10.0]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def recorder(self, **kwargs):
+        return TrafficRecorder(
+            self.path, clock=lambda: self.now[0], wall_clock=lambda: 1000.0, **kwargs
+        )
+
+    def test_round_trip_and_torn_tail(self):
+        recorder = self.recorder(buffer_size=3)
+        recorder.record(EMITTED, "agent_1", Message(agent_id="agent_1", content="hello world"))
+        self.now[0] = 10.25
+        batch = MessageBatch([Message(agent_id="agent_1", content="sky moon")] * 2)
+        recorder.record(EMITTED, "agent_1", batch)
+        self.now[0] = 10.5
+        recorder.record(HANDLED, "agent_2", Message(agent_id="agent_1", content="hi öcean"))
+        recorder.record(HANDLED, "agent_2", "not a message")
+        recorder.close()
+        self.assertEqual((recorder.recorded, recorder.skipped, recorder.chunks), (4, 1, 2))
+
+        with open(self.path, "ab") as trace:
+            trace.write(b"\x00\x00\x00\x10torn")
+        events = [
+            (when, kind, agent_id, message.content)
+            for when, kind, agent_id, message in TrafficReplayer(self.path).events()
+        ]
+        self.assertEqual(
+            events,
+            [
+                (1000.0, EMITTED, "agent_1", "hello world"),
+                (1000.25, EMITTED, "agent_1", "sky moon"),
+                (1000.25, EMITTED, "agent_1", "sky moon"),
+                (1000.5, HANDLED, "agent_2", "hi öcean"),
+            ],
+        )
+
+    async def test_agent_records_emitted_and_handled_messages(self):
+        recorder = self.recorder()
+        agent = ConcreteAgent()
+        agent.enable_recording(recorder)
+        await agent.generate_random_message()
+        await agent.handle_message(Message(agent_id="agent_9", content="hello world"))
+        agent.disable_recording()
+        await agent.generate_random_message()
+        recorder.close()
+        events = list(TrafficReplayer(self.path).events())
+        self.assertEqual(
+            [(kind, agent_id) for _, kind, agent_id, _ in events],
+            [(EMITTED, agent.agent_id), (HANDLED, agent.agent_id)],
+        )
+        self.assertEqual(events[1][3].agent_id, "agent_9")
+        agent.close()
+
+    async def test_replay_keeps_inter_arrival_times(self):
+        recorder = self.recorder()
+        for number in range(3):
+            self.now[0] = 10.0 + number * 0.5
+            recorder.record(HANDLED, "agent_1", Message(agent_id="agent_2", content="sky moon"))
+        recorder.record(HANDLED, "agent_3", Message(agent_id="agent_2", content="sky moon"))
+        recorder.record(EMITTED, "agent_1", Message(agent_id="agent_1", content="sky sun"))
+        recorder.close()
+
+        agent = AutonomousAgent()
+        agent.agent_id = "agent_1"
+        arrivals = []
+        original_put = agent.inbox.put
+
+        async def put(message):
+            arrivals.append(time.monotonic())
+            return await original_put(message)
+
+        agent.inbox.put = put
+        result = await TrafficReplayer(self.path).replay([agent], speed=10)
+        self.assertEqual((result["replayed"], result["skipped"]), (3, 1))
+        self.assertEqual(agent.inbox.qsize(), 3)
+        self.assertAlmostEqual(arrivals[1] - arrivals[0], 0.05, delta=0.03)
+        self.assertAlmostEqual(arrivals[2] - arrivals[0], 0.1, delta=0.03)
+
+        result = await TrafficReplayer(self.path).replay({"agent_1": agent}, None, EMITTED)
+        self.assertEqual(result["replayed"], 1)
+        self.assertEqual(agent.outbox.get_nowait().content, "sky sun")
+
+
+class TestDedupCache(unittest.IsolatedAsyncioTestCase):
+    def message(self, content):
+        return Message(agent_id="agent_1", content=content)
+
+    def test_lru_eviction(self):
+        cache = DedupCache(max_entries=2)
+        self.assertEqual([cache.seen(self.message(c)) for c in ("a", "b", "a", "c")], [0, 0, 1, 0])
+        # Check: "b" was the least recently seen key, "a" was refreshed by its duplicate
+        self.assertFalse(cache.seen(self.message("b")))
+        self.assertTrue(cache.seen(self.message("c")))
+        self.assertEqual(
+            cache.stats(), {"entries": 2, "hits": 2, "misses": 4, "evictions": 2, "expirations": 0}
+        )
+
+    def test_ttl_and_custom_key(self):
+        now = [0.0]
+        cache = DedupCache(
+            10, ttl=5, key=lambda message: message.content.split(" ")[0], clock=lambda: now[0]
+        )
+        self.assertFalse(cache.seen(self.message("id1 hello")))
+        now[0] = 4
+        self.assertTrue(cache.seen(self.message("id1 world")))
+        now[0] = 9.5
+        self.assertFalse(cache.seen(self.message("id1 hello")))
+        self.assertEqual((cache.expirations, len(cache)), (1, 1))
+
+    async def test_agent_skips_duplicates(self):
+        agent = AutonomousAgent()
+        agent.enable_metrics()
+        agent.enable_dedup(max_entries=100)
+        handler = AsyncMock()
+        agent.register_message_handler("custom", handler)
+        message = Message(agent_id="agent_1", type="custom", content="hello world")
+        copy = Message(agent_id="agent_1", type="custom", content="hello world")
+        await agent.handle_batch([message, copy, message, Message(type="custom", content="a")])
+        self.assertEqual(handler.await_count, 1)
+        snapshot = agent.metrics_snapshot()
+        self.assertEqual((snapshot["duplicates"], snapshot["rejected"]), (2, 1))
+        self.assertEqual(snapshot["dedup"]["hits"], 2)
+
+
+class TestMiddleware(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.messages = [
+            Message(agent_id="agent_1", type="custom", content=content)
+            for content in ("hello world", "a b c", "sun moon", "skip me")
+        ]
+
+    def test_pipeline_runs_stages_in_order(self):
+        pipeline = Pipeline(
+            [
+                validator("two_words", lambda m: m.content.count(" ") == 1),
+                message_filter("no_skip", lambda m: not m.content.startswith("skip")),
+            ]
+        )
+        pipeline.add(transform("upper", lambda m: m.replace(content=m.content.upper())), "no_skip")
+        accepted, rejected = pipeline.run_batch([m.freeze() for m in self.messages])
+        self.assertEqual([m.content for m in accepted], ["HELLO WORLD", "SUN MOON", "SKIP ME"])
+        self.assertEqual([(s.name, m.content) for s, m in rejected], [("two_words", "a b c")])
+        self.assertEqual(pipeline.stats(), {"rejected": {"two_words": 1}, "filtered": {}})
+        with self.assertRaises(ValueError):
+            pipeline.add(transform("upper", str.upper))
+
+    def test_raising_stage_rejects_message(self):
+        pipeline = Pipeline([validator("broken", lambda m: 1 / len(m.content.split(" ")[2]))])
+        with patch("lib.middleware.logging.exception") as mock_logging_exception:
+            message, rejected = pipeline.run(self.messages[0])
+        self.assertIsNone(message)
+        self.assertEqual(rejected[0][0].name, "broken")
+        mock_logging_exception.assert_called_once()
+
+    async def test_removed_agent_stage_is_freed(self):
+        pool = AgentPool()
+        (agent,) = pool.add()
+        prefix = agent.agent_id
+
+        def own_messages(message):
+            return message.agent_id == prefix
+
+        agent.pipeline.add(message_filter("own", own_messages))
+        await agent.handle_batch(self.messages)
+        stage = weakref.ref(own_messages)
+        del own_messages
+        await pool.remove(agent)
+        del agent
+        gc.collect()
+        self.assertIsNone(stage())
+
+    async def test_agent_counts_rejected_and_filtered(self):
+        agent = AutonomousAgent()
+        agent.enable_metrics()
+        handler = AsyncMock()
+        agent.register_message_handler("custom", handler)
+        agent.pipeline.add(message_filter("no_sun", lambda m: "sun" not in m.content))
+        with patch("agents.autonomous_agent.logging.warning") as mock_logging_warning:
+            await agent.handle_batch(self.messages + ["invalid message"])
+        self.assertEqual(mock_logging_warning.call_count, 2)
+        self.assertEqual(handler.await_count, 2)
+        snapshot = agent.metrics_snapshot()
+        self.assertEqual((snapshot["rejected"], snapshot["filtered"]), (2, 1))
+        self.assertEqual(snapshot["pipeline"]["rejected"], {"format": 1, "two_words": 1})
+
+        agent.pipeline.remove("two_words")
+        await agent.handle_message(self.messages[1])
+        self.assertEqual(handler.await_count, 3)
+
+
+class TestAsyncLogging(unittest.TestCase):
+    def make_record(self, level=logging.WARNING, msg="wrong content '%s'", args=("foo",)):
+        return logging.LogRecord("agents", level, __file__, 1, msg, args, None)
+
+    def test_rate_limit_filter_suppresses_and_reports(self):
+        rate_filter = RateLimitFilter(rate=2, interval=60)
+        results = [rate_filter.filter(self.make_record()) for _ in range(5)]
+        self.assertEqual(results, [True, True, False, False, False])
+        self.assertEqual(rate_filter.suppressed, 3)
+        self.assertTrue(rate_filter.filter(self.make_record(level=logging.ERROR)))
+
+        with patch("lib.async_logging.time.monotonic", return_value=time.monotonic() + 61):
+            record = self.make_record()
+            self.assertTrue(rate_filter.filter(record))
+        self.assertEqual(record.getMessage(), "wrong content 'foo' (suppressed 3 similar messages)")
+
+    def test_setup_async_logging(self):
+        root = logging.getLogger()
+        saved_handlers, saved_level = list(root.handlers), root.level
+        handler = MagicMock(level=logging.NOTSET)
+        try:
+            listener = setup_async_logging(handlers=[handler])
+            logging.info("Invoking Agent: %s.", "agent_1")
+            listener.stop()
+        finally:
+            for queue_handler in list(root.handlers):
+                root.removeHandler(queue_handler)
+            for saved_handler in saved_handlers:
+                root.addHandler(saved_handler)
+            root.setLevel(saved_level)
+        record = handler.handle.call_args[0][0]
+        self.assertEqual(record.args, ("agent_1",))
+        self.assertEqual(record.getMessage(), "Invoking Agent: agent_1.")
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+    def test_latency_histogram(self):
+        histogram = LatencyHistogram(bounds=(0.001, 0.01, 0.1))
+        for value in [0.0005] * 98 + [0.05, 0.5]:
+            histogram.record(value)
+        self.assertEqual(histogram.counts, [98, 0, 1, 1])
+        self.assertEqual(histogram.quantile(0.5), 0.001)
+        self.assertEqual(histogram.quantile(0.99), 0.1)
+        self.assertEqual(histogram.quantile(1.0), 0.5)
+
+    async def test_agent_metrics(self):
+        agent = AutonomousAgent(mailbox_size=2)
+        self.assertIsNone(agent.metrics_snapshot())
+        agent.enable_metrics()
+
+        async def handler(message):
+            await agent.emit_message(message)
+
+        agent.register_message_handler("custom", handler)
+        agent.register_behavior(AsyncMock())
+        messages = [Message(type="custom", content="hello world")] * 3 + [Message(content="a")]
+        await agent.handle_batch(messages)
+        await agent._invoke_behavior(agent.behaviors[0])
+
+        snapshot = agent.metrics_snapshot()
+        self.assertEqual(
+            [snapshot[name] for name in ("consumed", "emitted", "dropped", "rejected")],
+            [4, 2, 1, 1],
+        )
+        self.assertEqual(snapshot["outbox_depth"], 2)
+        self.assertEqual(snapshot["handler_latency"]["count"], 3)
+        self.assertEqual(snapshot["behavior_latency"]["count"], 1)
+
+        text = render_prometheus([agent, AutonomousAgent()])
+        self.assertIn("# TYPE agent_messages_emitted_total counter", text)
+        self.assertIn("agent_outbox_depth{", text)
+        self.assertIn('le="+Inf"} 3', text)
+
+    async def test_metrics_server(self):
+        agent = ConcreteAgent()
+        agent.enable_metrics()
+        server = MetricsServer([agent], port=0)
+        port = await server.start()
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+        finally:
+            await server.stop()
+            agent.close()
+        self.assertTrue(response.startswith(b"HTTP/1.1 200 OK"))
+        sample = f'agent_messages_consumed_total{{agent="{agent.agent_id}"}} 0'
+        self.assertIn(sample, response.decode())
+
+
+class TestPacingController(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.controller = PacingController(target_latency=0.1, interval=1.0)
+        self.agent = AutonomousAgent(mailbox_size=10)
+        self.agent.behavior_interval = 1.0
+        self.agent.consume_interval = 0.001
+        self.controller.attach(self.agent)
+
+    def test_emission_rate_is_aimd(self):
+        self.controller.update()
+        self.assertAlmostEqual(self.agent.behavior_interval, 0.5)
+        for _ in range(10):
+            self.agent.outbox.put_nowait(Message())
+        self.controller.update()
+        self.assertAlmostEqual(self.agent.behavior_interval, 1.0)
+        self.assertTrue(self.controller.snapshot()[0]["congested"])
+
+        scheduler = BehaviorScheduler()
+        self.agent.register_behavior(AsyncMock())
+        self.agent.schedule_behaviors(scheduler)
+        self.agent.outbox = Mailbox(10)
+        self.controller.update()
+        self.assertAlmostEqual(self.agent.scheduled_behaviors[0].interval, 0.5)
+
+    def test_consume_interval_tracks_target_latency(self):
+        for _ in range(20):
+            self.controller.update()
+        idle = self.agent.consume_interval
+        self.assertAlmostEqual(idle, 0.1, delta=0.01)
+
+        # Check: a backlog of 10 messages taking 50 ms each is way over the target latency.
+        for _ in range(5):
+            self.agent.metrics.handler_latency.record(0.05)
+        for _ in range(10):
+            self.agent.inbox.put_nowait(Message())
+        for _ in range(3):
+            self.controller.update()
+        snapshot = self.controller.snapshot()[0]
+        self.assertEqual(self.agent.consume_interval, 0.001)
+        self.assertAlmostEqual(snapshot["estimated_latency"], 0.501)
+        self.assertEqual(self.agent.metrics_snapshot()["consume_interval"], 0.001)
+        self.assertIn("agent_consume_interval_seconds{", render_prometheus([self.agent]))
+
+
+class TestProfiler(unittest.IsolatedAsyncioTestCase):
+    async def test_call_profiler_records_slow_calls(self):
+        agent = ConcreteAgent()
+        profiler = CallProfiler(threshold=0.02)
+        profiler.attach(agent)
+
+        async def blocking_handler(message):
+            time.sleep(0.08)
+
+        agent.register_message_handler("custom", blocking_handler)
+        try:
+            await agent.handle_message(Message(type="custom", content="sun world"))
+            await agent._invoke_behavior(agent.behaviors[0])
+        finally:
+            profiler.stop()
+            profiler.detach(agent)
+            agent.close()
+
+        report = profiler.report(sort_by="max")
+        self.assertEqual(len(report), 2)
+        slow = report[0]
+        self.assertTrue(slow["name"].endswith("blocking_handler"))
+        self.assertEqual(slow["slow"], 1)
+        sample = slow["samples"][0]
+        self.assertEqual((sample["message_type"], sample["agent_id"]), ("custom", agent.agent_id))
+        self.assertIn("blocking_handler", sample["stack"])
+        self.assertIsNone(agent.profiler)
+
+    async def test_loop_lag_monitor_captures_spike(self):
+        monitor = LoopLagMonitor(interval=0.01, spike=0.03, capture_duration=0.02)
+        with patch("agents.profiler.logging.warning"):
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.02)
+            time.sleep(0.06)
+            await asyncio.sleep(0.08)
+            task.cancel()
+            await task
+        self.assertGreaterEqual(monitor.lag.max, 0.03)
+        self.assertEqual(len(monitor.captures), 1)
+        self.assertIn("function calls", monitor.captures[0])
+
+
+class TestOffloadExecutor(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.executor = OffloadExecutor(max_threads=2, max_processes=1, max_pending=2)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_resolve_mode(self):
+        async def coroutine_handler(message):
+            pass
+
+        self.assertEqual(OffloadExecutor.resolve_mode(coroutine_handler), OffloadExecutor.ASYNC)
+        self.assertEqual(OffloadExecutor.resolve_mode(print), OffloadExecutor.BLOCKING)
+        self.assertEqual(OffloadExecutor.resolve_mode(print, "cpu_bound"), "cpu_bound")
+        with self.assertRaises(ValueError):
+            OffloadExecutor.resolve_mode(print, "unknown")
+
+    async def test_async_callables_are_awaited(self):
+        calls = []
+
+        class Handler:
+            async def __call__(self, message):
+                calls.append(message.content)
+
+        async def coroutine_handler(message):
+            calls.append(message.agent_id)
+
+        agent = AutonomousAgent()
+        agent.executor = self.executor
+        handler = Handler()
+        agent.register_message_handler("custom", handler)
+        agent.register_message_handler("default", lambda message: coroutine_handler(message))
+        self.assertEqual(agent.execution_modes[handler], OffloadExecutor.ASYNC)
+        await agent.handle_message(Message(agent_id="agent_1", type="custom", content="a b"))
+        await agent.handle_message(Message(agent_id="agent_1", type="default", content="a b"))
+        self.assertEqual(calls, ["a b", "agent_1"])
+
+    async def test_blocking_handler_runs_off_loop(self):
+        agent = AutonomousAgent()
+        agent.executor = self.executor
+        threads = []
+
+        def handler(message):
+            time.sleep(0.1)
+            threads.append(threading.current_thread())
+
+        agent.register_message_handler("custom", handler)
+        self.assertEqual(agent.execution_modes[handler], OffloadExecutor.BLOCKING)
+
+        ticks = []
+
+        async def ticker():
+            while True:
+                ticks.append(1)
+                await asyncio.sleep(0.01)
+
+        ticker_task = asyncio.create_task(ticker())
+        await agent.handle_message(Message(type="custom", content="hello world"))
+        ticker_task.cancel()
+        self.assertGreater(len(ticks), 3)
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    async def test_cpu_bound_runs_in_process_pool(self):
+        result = await self.executor.run(
+            OffloadExecutor.CPU_BOUND, cpu_bound_word_count, Message(content="hello world")
+        )
+        self.assertEqual(result, 2)
+
+    async def test_max_pending(self):
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def blocking():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+
+        await asyncio.gather(
+            *(self.executor.run(OffloadExecutor.BLOCKING, blocking) for _ in range(6))
+        )
+        self.assertEqual(peak[0], 2)
+
+    async def test_blocking_behavior(self):
+        agent = AutonomousAgent()
+        agent.executor = self.executor
+        behavior = MagicMock(side_effect=asyncio.CancelledError)
+        agent.register_behavior(behavior)
+        await agent.run_behaviors()
+        behavior.assert_called_once()
+
+
+class TestSimulation(unittest.TestCase):
+    def test_virtual_sleep_does_not_wait(self):
+        simulation = Simulation()
+
+        async def sleep_an_hour():
+            await asyncio.sleep(1800)
+            await asyncio.gather(asyncio.sleep(900), asyncio.sleep(1800))
+            return asyncio.get_running_loop().time()
+
+        started = time.perf_counter()
+        self.assertEqual(simulation.run(sleep_an_hour()), 3600)
+        self.assertLess(time.perf_counter() - started, 1)
+
+    def test_seed_agent(self):
+        agents = [ConcreteAgent(), ConcreteAgent()]
+        first, second = Simulation(seed=3), Simulation(seed=3)
+        samples = []
+        for simulation in (first, second):
+            for agent in agents:
+                simulation.seed_agent(agent)
+                samples.append(agent.random.random())
+        self.assertEqual(samples[:2], samples[2:])
+        self.assertNotEqual(samples[0], samples[1])
+
+
+class TestTcpTransport(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = TcpTransport()
+        self.port = await self.server.start()
+        self.client = TcpTransport(backoff_min=0.01, backoff_max=0.05)
+
+    async def asyncTearDown(self):
+        await self.client.close()
+        await self.server.close()
+
+    async def test_flow_control_holds_messages_at_sender(self):
+        inbox = Mailbox(maxsize=10)
+        self.server.expose("agent_b", inbox)
+        outbox = self.client.remote("127.0.0.1", self.port, "agent_b")
+        for number in range(50):
+            outbox.put_nowait(Message(agent_id="agent_a", content=f"hello {number}"))
+        await asyncio.sleep(0.1)
+        self.assertEqual((inbox.qsize(), outbox.qsize(), inbox.dropped), (10, 40, 0))
+
+        received = [(await inbox.get()).content for _ in range(50)]
+        self.assertEqual(received, [f"hello {number}" for number in range(50)])
+
+    async def test_message_batch_is_sent_message_by_message(self):
+        inbox = Mailbox(maxsize=100)
+        self.server.expose("agent_b", inbox)
+        agent = AutonomousAgent()
+        self.client.connect(agent, "127.0.0.1", self.port, "agent_b")
+        batch = MessageBatch()
+        batch.extend_tokens("agent_a", "custom", bytes([0, 2]) * 20, 2)
+        await agent.emit_message(batch)
+        received = [await asyncio.wait_for(inbox.get(), 1) for _ in range(20)]
+        self.assertEqual([message.freeze() for message in received], list(batch))
+
+    async def test_max_pending_and_bad_items_are_dropped(self):
+        self.client.max_pending = 5
+        inbox = Mailbox(maxsize=100)
+        self.server.expose("agent_b", inbox)
+        outbox = self.client.remote("127.0.0.1", self.port, "agent_b")
+        outbox.put_nowait(MessageBatch([Message(agent_id="agent_a", content="a b")] * 8))
+        self.assertEqual((outbox.qsize(), self.client.stats()["send_dropped"]), (5, 3))
+        await asyncio.sleep(0.1)
+        self.assertEqual(inbox.qsize(), 5)
+
+        outbox.put_nowait(object())
+        outbox.put_nowait(Message(agent_id="agent_a", content="hello world"))
+        with patch("agents.tcp_transport.logging.error") as mock_logging_error:
+            await asyncio.sleep(0.1)
+        mock_logging_error.assert_called_once()
+        self.assertEqual(inbox.qsize(), 6)
+        self.assertEqual(self.client.stats()["send_dropped"], 4)
+        self.assertEqual(self.client.stats()["connected"], 1)
+
+    async def test_reconnects_with_backoff(self):
+        await self.server.close()
+        agent = AutonomousAgent()
+        self.client.connect(agent, "127.0.0.1", self.port, "agent_b")
+        with patch("agents.tcp_transport.logging.warning"):
+            await agent.emit_message(Message(agent_id="agent_a", content="hello world"))
+            await asyncio.sleep(0.1)
+
+            self.server = TcpTransport(port=self.port)
+            inbox = asyncio.Queue()
+            self.server.expose("agent_b", inbox)
+            await self.server.start()
+            message = await asyncio.wait_for(inbox.get(), 1)
+        self.assertEqual(message.content, "hello world")
+        self.assertEqual(self.client.stats()["connected"], 1)
+
+
+class TestShardFrame(unittest.TestCase):
+    def test_encode_decode_frame(self):
+        entries = [
+            (0, Message(agent_id="agent_1", type="custom", content="hello world")),
+            (7, Message(agent_id="agent_2", type="default", content="sky öcean")),
+        ]
+        frame = encode_frame(entries)
+        decoded = decode_frame(len(entries), frame[FRAME_HEADER.size :])
+        self.assertEqual(
+            [(t, m.agent_id, m.type, m.content) for t, m in decoded],
+            [(t, m.agent_id, m.type, m.content) for t, m in entries],
+        )
+
+
+class TestShardRouter(unittest.IsolatedAsyncioTestCase):
+    async def test_bounds_counts_and_failed_sends(self):
+        writer = MagicMock()
+        writer.write.side_effect = [BrokenPipeError("closed"), None]
+        writer.drain = AsyncMock()
+        router = ShardRouter(0, 2, {1: writer}, max_buffered=3)
+        router.agents = [AutonomousAgent(mailbox_size=1, backpressure="drop_newest")] * 2
+        message = Message(agent_id="agent_1", content="hello world")
+        for _ in range(3):
+            router.route(0, message)
+        router.route(2, MessageBatch([message] * 5))
+        self.assertEqual((router.local, router.dropped), (1, 4))
+
+        flusher = asyncio.create_task(router.run_flusher())
+        with patch("agents.sharded_runtime.logging.error") as mock_logging_error:
+            router._flush_event.set()
+            await asyncio.sleep(0.01)
+            router.route(3, message)
+            router._flush_event.set()
+            await asyncio.sleep(0.01)
+        flusher.cancel()
+        mock_logging_error.assert_called_once()
+        self.assertEqual((router.sent, router.dropped), (1, 7))
+
+
+class TestMessageCodec(unittest.TestCase):
+    def setUp(self):
+        self.codec = MessageCodec()
+        self.messages = [
+            Message(agent_id="agent_1", type="custom", content="hello world"),
+            Message(agent_id="agent_2", type="default", content="sky öcean"),
+            Message(agent_id="agent_1", type="custom", content=""),
+            Message(agent_id="agent_3", type="custom", content="x" * 300),
+        ]
+
+    def fields(self, messages):
+        return [(m.agent_id, m.type, m.content) for m in messages]
+
+    @parameterized.expand([(0,), (127,), (128,), (300,), (2**35,)])
+    def test_varint(self, value):
+        buffer = bytearray()
+        encode_varint(value, buffer)
+        self.assertEqual(decode_varint(buffer, 0), (value, len(buffer)))
+
+    def test_round_trip(self):
+        frame = self.codec.encode_batch(self.messages)
+        self.assertEqual(self.fields(self.codec.decode_batch(frame)), self.fields(self.messages))
+        single = self.codec.decode(self.codec.encode(self.messages[1]))
+        self.assertEqual(self.fields([single]), self.fields(self.messages[1:2]))
+
+    def test_iter_frames(self):
+        buffer = memoryview(
+            bytes(self.codec.encode_batch(self.messages[:2]) + self.codec.encode_batch([]))
+            + bytes(self.codec.encode_batch(self.messages[2:]))
+        )
+        frames = list(self.codec.iter_frames(buffer))
+        self.assertEqual([len(self.codec.decode_batch(frame)) for frame in frames], [2, 0, 2])
+
+    def test_rejects_other_data(self):
+        with self.assertRaises(ValueError):
+            self.codec.decode_batch(b"\x00\x01")
+
+
+class TestMessageBatch(unittest.TestCase):
+    def test_round_trip(self):
+        messages = [
+            Message(agent_id="agent_1", type="custom", content="hello world"),
+            Message(agent_id="agent_2", content="sky öcean"),
+            Message(agent_id="agent_1", type="custom", content=""),
+        ]
+        batch = MessageBatch(messages)
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(list(batch), [message.freeze() for message in messages])
+        self.assertEqual(batch[-2], messages[1].freeze())
+        self.assertEqual(list(batch.kinds), [0, 1, 0])
+        self.assertEqual(len(batch._strings), 4)
+        with self.assertRaises(IndexError):
+            batch[3]
+
+    def test_extend_tokens(self):
+        batch = MessageBatch([Message(agent_id="agent_1", content="sky öcean")])
+        batch.extend_tokens("agent_2", "custom", bytes([0, 2, 6, 7]), 2)
+        self.assertEqual(
+            list(batch)[1:],
+            [
+                FrozenMessage("agent_2", "custom", "hello world"),
+                FrozenMessage("agent_2", "custom", "sky ocean"),
+            ],
+        )
+        with self.assertRaises(ValueError):
+            batch.extend_tokens("agent_2", "custom", bytes([0, 2, 6]), 2)
+        with self.assertRaises(ValueError):
+            batch.extend_tokens("agent_2", "custom", bytes([0, 10]), 2)
+
+    def test_tokenized_contents_are_compact(self):
+        batch = MessageBatch([Message(agent_id="agent_1", content="hello world")] * 100)
+        self.assertEqual(batch.contents(), ["hello world"] * 100)
+        self.assertLess(batch.nbytes(), 100 * 16)
+
+
 if __name__ == "__main__":
     unittest.main()